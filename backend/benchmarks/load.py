@@ -0,0 +1,242 @@
+"""
+Load driver: concurrent simulated students against the exam API.
+
+    python manage.py seed_benchmark_data --users 200
+    python -m benchmarks.load [--students 50] [--iterations 5] [--concurrency 8]
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 --concurrency 16
+
+Each student session lists courses, opens an exam paper, starts an attempt, checks one
+answer, submits and reads their history. By default requests go through the Django
+stack in this process (one thread per concurrent student) and the SQL queries of each
+request are counted; with --base-url they go over HTTP to a running server instead.
+Either way the students and the exams they may take are read from the database the
+seeder wrote, so a --base-url server must use the same database.
+
+Prints throughput and p50/p95/p99 latency (and queries per request in-process) for each
+endpoint; --json prints the same report as JSON.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import threading
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = ('courses', 'exam', 'start_attempt', 'check_answer', 'submit_exam', 'history')
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values: return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {name: [] for name in ENDPOINTS}
+        self.lock = threading.Lock()
+
+    def add(self, name, status, seconds, queries):
+        with self.lock:
+            self.samples[name].append((status, seconds, queries))
+
+    def report(self, elapsed):
+        endpoints = {}
+        for name, samples in self.samples.items():
+            if not samples: continue
+            latencies = sorted(seconds * 1000 for _, seconds, _ in samples)
+            queries = [q for _, _, q in samples if q is not None]
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': sum(1 for status, _, _ in samples if status >= 400),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'queries_avg': round(sum(queries) / len(queries), 2) if queries else None,
+                'queries_max': max(queries) if queries else None,
+            }
+        total = sum(e['requests'] for e in endpoints.values())
+        return {
+            'requests': total,
+            'errors': sum(e['errors'] for e in endpoints.values()),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+# --- CLIENTS ---
+# request(method, path, data) -> (status, json body or None, seconds, queries or None)
+class InProcessClient:
+    def __init__(self, user):
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        # Same token the login view issues, minus the password check
+        refresh = RefreshToken.for_user(user)
+        refresh['token_version'] = user.token_version
+        self.client = APIClient(raise_request_exception=False)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {refresh.access_token}')
+
+    def request(self, method, path, data=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # connection is per thread, so this counts only this request's queries
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            if method == 'get':
+                response = self.client.get(f'/api/{path}')
+            else:
+                response = self.client.post(f'/api/{path}', data or {}, format='json')
+            seconds = perf_counter() - started
+        body = response.json() if response.get('Content-Type', '').startswith('application/json') else None
+        return response.status_code, body, seconds, len(queries)
+
+    def close(self):
+        from django.db import connections
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+class HTTPClient:
+    def __init__(self, base_url, user, password):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        res = self.session.post(f'{self.base_url}/api/auth/jwt/create/',
+                                json={'username': user.username, 'password': password, 'force_login': True})
+        res.raise_for_status()
+        self.session.headers['Authorization'] = f"JWT {res.json()['access']}"
+
+    def request(self, method, path, data=None):
+        started = perf_counter()
+        response = self.session.request(method.upper(), f'{self.base_url}/api/{path}', json=data)
+        seconds = perf_counter() - started
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body, seconds, None
+
+    def close(self):
+        self.session.close()
+
+
+# --- SESSIONS ---
+def load_students(prefix='bench', limit=None):
+    """[(user, [exam ids the user may take])] for the seeded students."""
+    from exams.models import User, Exam, Course, UserSubscription
+
+    users = list(User.objects.filter(username__startswith=f"{prefix}_").order_by('id')[:limit])
+    free = set(Course.objects.filter(is_paid=False).values_list('id', flat=True))
+    owned = {}
+    for user_id, course_id in UserSubscription.objects.filter(user__in=users, active=True).values_list('user_id', 'course_id'):
+        owned.setdefault(user_id, set()).add(course_id)
+    exams = [
+        (exam_id, course_id or chapter_course_id)
+        for exam_id, course_id, chapter_course_id in Exam.objects.filter(title__startswith=f"{prefix} ")
+        .values_list('id', 'course_id', 'chapter__subject__course_id').order_by('id')
+    ]
+    students = []
+    for user in users:
+        allowed = free | owned.get(user.id, set())
+        exam_ids = [exam_id for exam_id, course_id in exams if course_id in allowed]
+        if exam_ids: students.append((user, exam_ids))
+    return students
+
+
+def student_session(client, exam_ids, rng, recorder):
+    def call(name, method, path, data=None):
+        status, body, seconds, queries = client.request(method, path, data)
+        recorder.add(name, status, seconds, queries)
+        return body if status < 400 else None
+
+    call('courses', 'get', 'courses/')
+    exam_id = rng.choice(exam_ids)
+    paper = call('exam', 'get', f'exams/{exam_id}/')
+    started = call('start_attempt', 'post', f'exams/{exam_id}/start_attempt/')
+    if not paper or not started: return
+
+    questions = [q for q in paper['questions'] if q['options']]
+    if questions:
+        question = rng.choice(questions)
+        call('check_answer', 'post', f'exams/{exam_id}/check_answer/',
+             {'question_id': question['id'], 'option_id': rng.choice(question['options'])['id']})
+    answers = {str(q['id']): rng.choice(q['options'])['id'] for q in questions if rng.random() < 0.9}
+    call('submit_exam', 'post', f'exams/{exam_id}/submit_exam/', {'attempt_id': started['attempt_id'], 'answers': answers})
+    call('history', 'get', 'history/')
+
+
+def run_load(students, make_client, iterations=5, concurrency=8, seed=0):
+    """Runs `iterations` sessions per student, `concurrency` students at a time. Returns the report dict."""
+    recorder = Recorder()
+
+    def work(index):
+        user, exam_ids = students[index]
+        rng = random.Random(seed * 100003 + index)
+        client = make_client(user)
+        try:
+            for _ in range(iterations):
+                student_session(client, exam_ids, rng, recorder)
+        finally:
+            client.close()
+
+    started = perf_counter()
+    if concurrency <= 1:
+        for index in range(len(students)): work(index)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(work, range(len(students))))
+    return recorder.report(perf_counter() - started)
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['elapsed_s']:.2f} s -> {report['throughput_rps']:.1f} req/s, "
+          f"{report['errors']} errors")
+    print(f"{'endpoint':<14}{'reqs':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    for name, row in report['endpoints'].items():
+        queries = f"{row['queries_avg']:.1f}" if row['queries_avg'] is not None else '-'
+        print(f"{name:<14}{row['requests']:>7}{row['errors']:>8}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['p99_ms']:>10.1f}{queries:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=50, help="Seeded students to simulate.")
+    parser.add_argument('--iterations', type=int, default=5, help="Sessions per student.")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--prefix', default='bench')
+    parser.add_argument('--password', default='bench-pass', help="Seeded password (used with --base-url).")
+    parser.add_argument('--base-url', help="Drive a running server instead of the in-process stack.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+
+    students = load_students(args.prefix, args.students)
+    if not students:
+        sys.exit(f"No students with prefix '{args.prefix}'; run `manage.py seed_benchmark_data` first.")
+
+    if args.base_url:
+        make_client = lambda user: HTTPClient(args.base_url, user, args.password)
+    else:
+        make_client = InProcessClient
+    report = run_load(students, make_client, args.iterations, args.concurrency, args.seed)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    sys.exit(1 if report['errors'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Render benchmark: JSON encoding time and bytes on the wire for courses/ and exams/{id}/.
+
+    python manage.py seed_benchmark_data        # or any populated database
+    python -m benchmarks.render [--runs 20] [--exam ID]
+
+"before" is DRF's JSONRenderer sent uncompressed; "after" is the orjson renderer
+plus the compression CompressionMiddleware would negotiate (gzip and, if the brotli
+package is installed, br). Serializer work is done once up front, so the timings cover
+encoding and compression only.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+from time import perf_counter
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = perf_counter()
+        result = fn()
+        samples.append(perf_counter() - started)
+    return result, statistics.median(samples) * 1000
+
+
+def payloads(exam_id=None):
+    from django.db.models import Count
+    from exams.models import Exam
+    from exams.serializers import CourseSerializer, ExamSerializer
+    from exams.snapshots import course_tree_queryset
+
+    courses = CourseSerializer(course_tree_queryset().order_by('id'), many=True).data
+    exams = Exam.objects.annotate(n=Count('questions'))
+    exam = exams.get(id=exam_id) if exam_id else exams.order_by('-n', 'id').first()
+    if exam is None:
+        sys.exit("No exams in the database; run `manage.py seed_benchmark_data` first.")
+    paper = ExamSerializer(Exam.objects.prefetch_related('questions__options').get(id=exam.id)).data
+    return {'courses/': courses, f'exams/{exam.id}/': paper}
+
+
+def measure(data, runs):
+    from rest_framework.renderers import JSONRenderer
+    from exams.renderers import dumps
+    from exams.middleware import brotli, compress
+
+    before, before_ms = timed(lambda: JSONRenderer().render(data), runs)
+    after, after_ms = timed(lambda: dumps(data), runs)
+    assert json.loads(before) == json.loads(after), "renderers disagree"
+
+    row = {
+        'bytes': len(before),
+        'drf_json_ms': round(before_ms, 3),
+        'orjson_ms': round(after_ms, 3),
+        'codings': {},
+    }
+    for coding in (['br'] if brotli else []) + ['gzip']:
+        body, ms = timed(lambda: compress(after, coding), runs)
+        row['codings'][coding] = {'bytes': len(body), 'compress_ms': round(ms, 3)}
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--exam', type=int, help="Exam to render (default: the one with most questions).")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+
+    report = {path: measure(data, args.runs) for path, data in payloads(args.exam).items()}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for path, row in report.items():
+        speedup = row['drf_json_ms'] / row['orjson_ms'] if row['orjson_ms'] else float('inf')
+        print(f"{path}")
+        print(f"  before: JSONRenderer {row['drf_json_ms']:.2f} ms, {row['bytes']:,} bytes")
+        print(f"  after:  orjson       {row['orjson_ms']:.2f} ms ({speedup:.1f}x)")
+        for coding, sized in row['codings'].items():
+            ratio = row['bytes'] / sized['bytes'] if sized['bytes'] else 0
+            print(f"          + {coding:<4}     {sized['compress_ms']:.2f} ms, {sized['bytes']:,} bytes ({ratio:.1f}x smaller)")
+
+
+if __name__ == '__main__':
+    main()
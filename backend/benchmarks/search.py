@@ -0,0 +1,66 @@
+"""
+Search benchmark: latency of ranked, entitlement-filtered full-text queries.
+
+    python manage.py seed_benchmark_data --courses 50 --questions 500    # or any populated database
+    python -m benchmarks.search [--runs 20] [--user bench_00001] [QUERY ...]
+
+Queries run through exams.search.search() for one (non-admin) student, so the timings
+include the entitlement filter and snippet generation but not the HTTP stack. Reports
+the index size and the median / worst time per query for the first and a deep page.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+from time import perf_counter
+
+DEFAULT_QUERIES = ['constitution', 'monsoon river', 'fiscal budget inflation', 'parl', 'tribunal amendment census']
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = perf_counter()
+        result = fn()
+        samples.append(perf_counter() - started)
+    return result, statistics.median(samples) * 1000, max(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('queries', nargs='*', default=DEFAULT_QUERIES)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--user', default='bench_00001')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+    from exams.models import User, SearchDocument
+    from exams.search import search
+
+    user = User.objects.filter(username=args.user).first()
+    if user is None:
+        sys.exit(f"No user '{args.user}'; run `manage.py seed_benchmark_data` first.")
+
+    report = {'documents': SearchDocument.objects.count(), 'queries': {}}
+    for query in args.queries:
+        row = {}
+        for page in (1, 10):
+            (results, _, _), median_ms, max_ms = timed(lambda: search(user, query, page=page), args.runs)
+            row[f'page_{page}'] = {'results': len(results), 'median_ms': round(median_ms, 3), 'max_ms': round(max_ms, 3)}
+        report['queries'][query] = row
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['documents']:,} indexed documents")
+    for query, row in report['queries'].items():
+        cells = "  ".join(f"{page}: {r['median_ms']:.2f} ms (max {r['max_ms']:.2f}, {r['results']} hits)" for page, r in row.items())
+        print(f"  {query!r:<30} {cells}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Cold-start benchmark: django.setup() + URLconf import in fresh interpreters.
+
+    python -m benchmarks.startup [--runs 5] [--budget 2.5]
+
+Exits non-zero if the median exceeds the budget or if a lazily loaded module
+(google.generativeai, PIL) was imported during startup.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET = 2.5  # seconds, median of the runs
+LAZY_MODULES = ('google.generativeai', 'PIL')
+
+PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+setup_done = time.perf_counter()
+import config.urls
+finished = time.perf_counter()
+print(json.dumps({
+    'setup': setup_done - started,
+    'urls': finished - setup_done,
+    'total': finished - started,
+    'loaded': [m for m in %r if m in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def measure_startup(runs=5):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=BACKEND_DIR, env=os.environ.copy(),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return {
+        'runs': runs,
+        'setup': statistics.median(s['setup'] for s in samples),
+        'urls': statistics.median(s['urls'] for s in samples),
+        'total': statistics.median(s['total'] for s in samples),
+        'loaded': sorted({m for s in samples for m in s['loaded']}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=float(os.environ.get('STARTUP_BUDGET', DEFAULT_BUDGET)))
+    args = parser.parse_args()
+
+    result = measure_startup(args.runs)
+    print(f"django.setup(): {result['setup'] * 1000:.0f} ms | urls: {result['urls'] * 1000:.0f} ms | "
+          f"total: {result['total'] * 1000:.0f} ms (median of {result['runs']}, budget {args.budget * 1000:.0f} ms)")
+
+    failed = False
+    if result['loaded']:
+        print(f"FAIL: imported at startup: {', '.join(result['loaded'])}")
+        failed = True
+    if result['total'] > args.budget:
+        print("FAIL: startup over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
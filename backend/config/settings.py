@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', # CORS first
+    'exams.middleware.CompressionMiddleware', # Compresses what everything below produced
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -107,6 +108,23 @@ if config('DATABASE_URL', default=None):
     }
 
 
+# Cache (answer keys, etc.)
+# Local memory by default; point REDIS_URL at a shared Redis so every worker sees the same entries.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if config('REDIS_URL', default=None):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL'),
+        }
+    }
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator' },
@@ -160,8 +178,18 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny', # Default open, lock down specific views
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'exams.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Proxies in front of the app that append to X-Forwarded-For. 0 trusts only REMOTE_ADDR,
+    # so clients cannot pick their own IP for the per-IP rate limits
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
+# Responses smaller than this (bytes) are sent uncompressed
+COMPRESS_MIN_SIZE = config('COMPRESS_MIN_SIZE', default=1024, cast=int)
+
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),  
@@ -215,4 +243,23 @@ EMAIL_HOST_PASSWORD = config('SENDGRID_API_KEY', default='')
 DEFAULT_FROM_EMAIL = 'Bit By Bit <bytesofgyan@gmail.com>' 
 
 # --- AI KEY ---
-GEMINI_API_KEY = config('GEMINI_API_KEY', default=None)
\ No newline at end of file
+GEMINI_API_KEY = config('GEMINI_API_KEY', default=None)
+
+# --- AI JOB WORKER ---
+# 'fake' swaps Gemini for a deterministic local model (tests / offline dev)
+AI_MODEL_BACKEND = config('AI_MODEL_BACKEND', default='gemini')
+AI_WORKER_PROCESSES = config('AI_WORKER_PROCESSES', default=2, cast=int)
+# Concurrent model calls per subject/course-wide generation job
+AI_MAX_CONCURRENCY = config('AI_MAX_CONCURRENCY', default=4, cast=int)
+# Size bound for the AI result cache (bytes of stored results); least recently used go first
+AI_CACHE_MAX_BYTES = config('AI_CACHE_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+
+# --- OTP LOGIN ---
+OTP_TTL_SECONDS = config('OTP_TTL_SECONDS', default=300, cast=int)
+# Token buckets: each holds LIMIT requests and refills fully over OTP_LIMIT_WINDOW seconds
+OTP_LIMIT_WINDOW = config('OTP_LIMIT_WINDOW', default=600, cast=int)
+OTP_SEND_PHONE_LIMIT = config('OTP_SEND_PHONE_LIMIT', default=3, cast=int)
+OTP_VERIFY_PHONE_LIMIT = config('OTP_VERIFY_PHONE_LIMIT', default=5, cast=int)
+OTP_IP_LIMIT = config('OTP_IP_LIMIT', default=30, cast=int)
+# Shared by every phone without an account, whatever IP the requests come from
+OTP_NEW_PHONE_LIMIT = config('OTP_NEW_PHONE_LIMIT', default=100, cast=int)
@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from .models import Course, Subject, Chapter, Topic, Exam, Question, Option, UserSubscription, ExamAttempt, StudentResponse
-from .models import AdBanner
+from .models import AdBanner, AIGenerationJob, AIResultCache, QuestionStats, ExamScoreBucket
 
 class OptionInline(admin.TabularInline):
     model = Option
@@ -38,4 +40,36 @@ admin.site.register(Question, QuestionAdmin)
 admin.site.register(UserSubscription)
 admin.site.register(ExamAttempt)
 admin.site.register(StudentResponse)
-admin.site.register(AdBanner)
\ No newline at end of file
+admin.site.register(AdBanner)
+
+class AIGenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('result', 'error', 'attempts', 'started_at', 'finished_at')
+
+admin.site.register(AIGenerationJob, AIGenerationJobAdmin)
+
+class AIResultCacheAdmin(admin.ModelAdmin):
+    list_display = ('key', 'kind', 'model_name', 'hits', 'size', 'latency_ms', 'last_used_at')
+    list_filter = ('kind', 'model_name')
+
+admin.site.register(AIResultCache, AIResultCacheAdmin)
+
+class QuestionStatsAdmin(admin.ModelAdmin):
+    list_display = ('question', 'exam', 'attempts', 'answered', 'correct', 'p_correct')
+    list_filter = ('exam',)
+    list_select_related = ('question', 'exam')
+    readonly_fields = ('question', 'exam', 'attempts', 'answered', 'correct')
+
+    def get_queryset(self, request):
+        # Attempts are counted once per exam, by its score histogram
+        totals = ExamScoreBucket.objects.filter(exam_id=OuterRef('exam_id')).values('exam_id').annotate(n=Sum('count')).values('n')
+        return super().get_queryset(request).annotate(exam_attempts=Coalesce(Subquery(totals), 0))
+
+    def attempts(self, obj): return obj.exam_attempts
+
+    def p_correct(self, obj):
+        return f"{obj.correct / obj.exam_attempts:.0%}" if obj.exam_attempts else "-"
+    p_correct.short_description = "% correct"
+
+admin.site.register(QuestionStats, QuestionStatsAdmin)
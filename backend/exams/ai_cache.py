@@ -0,0 +1,94 @@
+import json
+import hashlib
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import AIResultCache, AICacheCounter
+
+# --- AI RESULT CACHE ---
+# Generation results keyed by what went into the prompt: the notes text or image bytes,
+# the generation params and the model name. Entries live in the DB so every web and
+# worker process shares them; total stored bytes are capped (AI_CACHE_MAX_BYTES) by
+# evicting the least recently used entries. Counters track hits, misses and what the
+# hits saved in model time and input size. The stored byte total is a counter too, so a
+# store checks the cap with one primary-key read; eviction recounts it from the table.
+COUNTERS = ('hits', 'misses', 'bypassed', 'saved_ms', 'saved_input_chars', 'evicted')
+BYTES_COUNTER = 'stored_bytes'
+
+
+def cache_key(kind, model_name, payload, **params):
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'kind': kind, 'model': model_name, **params}, sort_keys=True).encode())
+    digest.update(b'\0')
+    digest.update(payload if isinstance(payload, bytes) else payload.encode())
+    return digest.hexdigest()
+
+
+def bump(**amounts):
+    for name, amount in amounts.items():
+        if not amount: continue
+        if not AICacheCounter.objects.filter(name=name).update(value=F('value') + amount):
+            AICacheCounter.objects.get_or_create(name=name)
+            AICacheCounter.objects.filter(name=name).update(value=F('value') + amount)
+
+
+def lookup(keys):
+    """{key: result} for the cached keys; counts hits and misses."""
+    found = {entry.key: entry for entry in AIResultCache.objects.filter(key__in=set(keys))}
+    if found:
+        AIResultCache.objects.filter(key__in=found).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    hits = [found[key] for key in keys if key in found]
+    bump(
+        hits=len(hits),
+        misses=len(keys) - len(hits),
+        saved_ms=sum(entry.latency_ms for entry in hits),
+        saved_input_chars=sum(entry.input_chars for entry in hits),
+    )
+    return {key: entry.result for key, entry in found.items()}
+
+
+def stored_bytes():
+    return AICacheCounter.objects.filter(name=BYTES_COUNTER).values_list('value', flat=True).first() or 0
+
+
+def store(key, kind, model_name, result, latency_ms=0, input_chars=0):
+    size = len(json.dumps(result))
+    replaced = AIResultCache.objects.filter(key=key).values_list('size', flat=True).first() or 0
+    AIResultCache.objects.update_or_create(key=key, defaults={
+        'kind': kind, 'model_name': model_name, 'result': result, 'size': size,
+        'input_chars': input_chars, 'latency_ms': int(latency_ms), 'last_used_at': timezone.now(),
+    })
+    bump(**{BYTES_COUNTER: size - replaced})
+    evict()
+
+
+def evict(max_bytes=None):
+    max_bytes = settings.AI_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if stored_bytes() <= max_bytes: return
+
+    # Concurrent stores can leave the running total a little off: evict from the real one
+    total = AIResultCache.objects.aggregate(total=Sum('size'))['total'] or 0
+    victims = []
+    for key, size in AIResultCache.objects.order_by('last_used_at').values_list('key', 'size').iterator():
+        if total <= max_bytes: break
+        victims.append(key)
+        total -= size
+    AIResultCache.objects.filter(key__in=victims).delete()
+    AICacheCounter.objects.update_or_create(name=BYTES_COUNTER, defaults={'value': total})
+    bump(evicted=len(victims))
+
+
+def stats():
+    counters = dict.fromkeys(COUNTERS, 0)
+    counters.update(AICacheCounter.objects.filter(name__in=COUNTERS).values_list('name', 'value'))
+    lookups = counters['hits'] + counters['misses']
+    usage = AIResultCache.objects.aggregate(total=Sum('size'))
+    return {
+        **counters,
+        'hit_rate': round(counters['hits'] / lookups, 4) if lookups else 0.0,
+        'entries': AIResultCache.objects.count(),
+        'bytes': usage['total'] or 0,
+        'max_bytes': settings.AI_CACHE_MAX_BYTES,
+    }
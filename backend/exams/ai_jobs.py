@@ -0,0 +1,235 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import AIGenerationJob, AIJobImage, Chapter, Exam, Question, Option
+from .ai_service import generate_questions_map_reduce, generate_questions_from_images
+
+# --- AI GENERATION JOBS ---
+# The API only records a job row; `manage.py run_ai_worker` claims queued rows and runs
+# them in a process pool, so model latency never holds a web worker. Progress and the
+# generated questions are written back to the row for the status endpoint to poll.
+# The worker heartbeats the jobs it holds; a job is only requeued once its heartbeat
+# stops, and `attempts` doubles as the claim token, so a run that lost its job to a
+# requeue cannot save or overwrite anything.
+MAX_ATTEMPTS = 3
+MAX_BATCH_IMAGES = 60
+
+logger = logging.getLogger(__name__)
+
+
+class NoNotesFound(ValueError):
+    pass
+
+
+class JobLost(Exception):
+    pass
+
+
+def notes_queryset(source_type, source_id):
+    if source_type in ('topic', 'chapter'):
+        chapters = Chapter.objects.filter(id=source_id)
+    elif source_type == 'subject':
+        chapters = Chapter.objects.filter(subject_id=source_id)
+    elif source_type == 'course':
+        chapters = Chapter.objects.filter(subject__course_id=source_id)
+    else:
+        chapters = Chapter.objects.none()
+    return chapters.exclude(study_notes='')
+
+
+def collect_sections(source_type, source_id):
+    # [(chapter title, notes)] in syllabus order; every chapter, however many there are
+    chapters = notes_queryset(source_type, source_id).order_by('subject__order', 'subject_id', 'order', 'id')
+    return list(chapters.values_list('title', 'study_notes'))
+
+
+def save_generated_questions(questions_data, exam_id=None, new_exam_title=None, source_type=None, source_id=None, duration=None):
+    """Shared by save_bulk and auto-saving jobs. Returns (exam, added); exam is None if no target was given."""
+    exam = None
+
+    if exam_id:
+        exam = Exam.objects.filter(id=exam_id).first()
+    elif new_exam_title:
+        exam_defaults = {
+            'title': new_exam_title,
+            'duration_minutes': int(duration) if duration else 30,
+            'total_marks': len(questions_data) * 2,
+            'exam_type': 'SUBJECT_TEST'
+        }
+
+        if source_type == 'course' and source_id:
+            exam_defaults['course_id'] = source_id
+            exam_defaults['exam_type'] = 'MOCK_FULL'
+        elif source_type == 'subject' and source_id:
+            exam_defaults['subject_id'] = source_id
+            exam_defaults['exam_type'] = 'SUBJECT_TEST'
+        elif source_type == 'chapter' and source_id:
+            try:
+                # FIX: Link directly to Chapter
+                chapter = Chapter.objects.get(id=source_id)
+                exam_defaults['chapter'] = chapter
+                exam_defaults['exam_type'] = 'TOPIC_QUIZ' # or rename to CHAPTER_QUIZ
+            except Exception as e:
+                print(f"Error linking chapter: {e}")
+
+        exam = Exam.objects.create(**exam_defaults)
+
+    if not exam:
+        return None, 0
+
+    if duration:
+        exam.duration_minutes = int(duration)
+        exam.save()
+
+    count = 0
+    for q_data in questions_data:
+        question = Question.objects.create(
+            exam=exam,
+            text_content=q_data['question_text'],
+            marks=q_data.get('marks', 2),
+            explanation=q_data.get('explanation', '')
+        )
+        for idx, opt_text in enumerate(q_data['options']):
+            Option.objects.create(
+                question=question,
+                text=opt_text,
+                is_correct=(idx == q_data['correct_index'])
+            )
+        count += 1
+    return exam, count
+
+
+# --- ENQUEUE (API side) ---
+def enqueue_text_job(user, params):
+    if not notes_queryset(params['source_type'], params['source_id']).exists():
+        raise NoNotesFound("No notes found to generate from.")
+    return AIGenerationJob.objects.create(kind='text', params=params, created_by=user)
+
+
+def enqueue_image_job(user, image_files, params):
+    job = AIGenerationJob.objects.create(kind='image', params=params, created_by=user)
+    AIJobImage.objects.bulk_create([
+        AIJobImage(job=job, name=image.name or '', data=image.read(), order=i)
+        for i, image in enumerate(image_files)
+    ])
+    return job
+
+
+# --- CLAIM (worker side) ---
+def claim_jobs(limit):
+    """Flips up to `limit` queued jobs to running. The conditional UPDATE means two workers never claim one job."""
+    claimed = []
+    candidates = AIGenerationJob.objects.filter(status='queued').order_by('id').values_list('id', flat=True)[:limit * 2]
+    for job_id in candidates:
+        if len(claimed) >= limit: break
+        now = timezone.now()
+        flipped = AIGenerationJob.objects.filter(id=job_id, status='queued').update(
+            status='running', attempts=F('attempts') + 1, started_at=now, heartbeat_at=now, progress=0
+        )
+        if flipped: claimed.append(job_id)
+    return claimed
+
+
+def heartbeat(job_ids):
+    if job_ids: AIGenerationJob.objects.filter(id__in=list(job_ids), status='running').update(heartbeat_at=timezone.now())
+
+
+def requeue_stale(older_than):
+    # Jobs whose worker stopped heartbeating (died mid-run): retry a few times, then give up
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    stale = AIGenerationJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff), status='running'
+    )
+    stale.filter(attempts__lt=MAX_ATTEMPTS).update(status='queued')
+    for job_id, attempt in stale.filter(attempts__gte=MAX_ATTEMPTS).values_list('id', 'attempts'):
+        fail_job(job_id, "Worker stopped responding", attempt)
+
+
+def set_progress(job_id, progress, attempt=None):
+    jobs = AIGenerationJob.objects.filter(id=job_id)
+    if attempt is not None: jobs = jobs.filter(status='running', attempts=attempt)
+    jobs.update(progress=progress, heartbeat_at=timezone.now())
+
+
+def fail_job(job_id, error, attempt=None):
+    """Marks the job failed (final, so its images go too); with `attempt`, only if that claim still holds it."""
+    jobs = AIGenerationJob.objects.filter(id=job_id)
+    if attempt is not None: jobs = jobs.filter(status='running', attempts=attempt)
+    if jobs.update(status='failed', error=error, finished_at=timezone.now()):
+        AIJobImage.objects.filter(job_id=job_id).delete()
+
+
+# --- EXECUTE ---
+def run_text_job(job):
+    params = job.params
+    sections = collect_sections(params['source_type'], params['source_id'])
+    if not sections: raise NoNotesFound("No notes found to generate from.")
+    set_progress(job.id, 5, job.attempts)
+
+    def on_progress(done, total):
+        set_progress(job.id, 5 + int(85 * done / total), job.attempts)
+
+    questions, report = generate_questions_map_reduce(
+        sections, params.get('num_questions', 5), params.get('difficulty', 'Medium'),
+        params.get('custom_instructions', ''), on_progress=on_progress,
+        use_cache=not params.get('bypass_cache')
+    )
+    if report['chunks'] and report['failed_chunks'] == report['chunks']:
+        raise RuntimeError("AI generation failed for every chunk of notes")
+    return questions, report
+
+
+def run_image_job(job):
+    params = job.params
+    images = [(image.name or f"image {i + 1}", bytes(image.data)) for i, image in enumerate(job.images.all())]
+
+    def on_progress(done, total):
+        set_progress(job.id, int(90 * done / total), job.attempts)
+
+    questions, errors, report = generate_questions_from_images(
+        images, params.get('difficulty', 'Medium'), params.get('custom_instructions', ''),
+        on_progress=on_progress, use_cache=not params.get('bypass_cache')
+    )
+    if errors and len(errors) == len(images):
+        raise RuntimeError(f"AI generation failed for every image: {errors[0]['error']}")
+    return questions, errors, report
+
+
+def run_job(job_id):
+    """Runs one claimed job to completion. Never raises: failures are recorded on the row."""
+    job = AIGenerationJob.objects.filter(id=job_id, status='running').first()
+    if job is None: return
+    done = False
+    try:
+        if job.kind == 'text':
+            questions, report = run_text_job(job)
+            result = {"questions": questions, "generation": report}
+        else:
+            questions, errors, report = run_image_job(job)
+            result = {"questions": questions, "errors": errors, "generation": report}
+
+        with transaction.atomic():
+            # Still ours? A requeued job may already be running (or done) elsewhere
+            if not AIGenerationJob.objects.select_for_update().filter(id=job_id, status='running', attempts=job.attempts).exists():
+                raise JobLost
+            target = job.params.get('save')
+            if target and questions:
+                exam, added = save_generated_questions(
+                    questions, target.get('exam_id'), target.get('new_exam_title'),
+                    job.params.get('source_type'), job.params.get('source_id'), target.get('duration')
+                )
+                if exam: result["saved"] = {"exam_id": exam.id, "exam_title": exam.title, "added": added}
+            AIGenerationJob.objects.filter(id=job_id).update(status='done', progress=100, result=result, error='', finished_at=timezone.now())
+        done = True
+    except JobLost:
+        logger.warning("AI job #%s was requeued while attempt %s ran; dropping its result", job_id, job.attempts)
+    except Exception as e:
+        logger.exception("AI job #%s failed", job_id)
+        fail_job(job_id, str(e), job.attempts)
+    finally:
+        # Image bytes are only kept for a retry; fail_job drops them for failed jobs
+        if done: AIJobImage.objects.filter(job_id=job_id).delete()
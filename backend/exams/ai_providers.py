@@ -0,0 +1,82 @@
+import io
+import re
+import json
+import hashlib
+import threading
+
+from django.conf import settings
+
+# --- AI PROVIDERS ---
+# google.generativeai and PIL cost most of a cold start, so nothing here imports them at
+# module level: the Gemini client is built on the first generation call in each process.
+# AI_MODEL_BACKEND picks the provider ('gemini' or 'fake').
+
+
+class AIProvider:
+    name = ''
+
+    def generate_text(self, prompt):
+        """Returns the model's raw reply text."""
+        raise NotImplementedError
+
+    def generate_from_image(self, prompt, image_bytes):
+        raise NotImplementedError
+
+
+class GeminiProvider(AIProvider):
+    name = 'gemini-2.5-flash'
+
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=settings.GEMINI_API_KEY)
+                    self._model = genai.GenerativeModel(self.name)
+        return self._model
+
+    def generate_text(self, prompt):
+        return self.model().generate_content(prompt).text
+
+    def generate_from_image(self, prompt, image_bytes):
+        import PIL.Image
+        img = PIL.Image.open(io.BytesIO(image_bytes))
+        return self.model().generate_content([prompt, img]).text
+
+
+class FakeProvider(AIProvider):
+    # Deterministic stand-in for Gemini (tests / offline dev): answers the prompt's
+    # "Generate N" / "Create N" with N well-formed MCQs derived from the prompt text.
+    name = 'fake'
+
+    def generate_text(self, prompt):
+        match = re.search(r'(?:Generate|Create) (\d+)', prompt)
+        count = int(match.group(1)) if match else 1
+        seed = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        questions = [{
+            "question_text": f"Question {i + 1} ({seed})",
+            "options": [f"Option {letter}" for letter in "ABCD"],
+            "correct_index": i % 4,
+            "marks": 2,
+            "explanation": f"Option {'ABCD'[i % 4]} is correct.",
+        } for i in range(count)]
+        return json.dumps(questions)
+
+    def generate_from_image(self, prompt, image_bytes):
+        return self.generate_text(prompt)
+
+
+PROVIDERS = {'gemini': GeminiProvider, 'fake': FakeProvider}
+_instances = {}
+
+
+def get_provider():
+    # One instance per backend per process, so the client is configured once
+    backend = settings.AI_MODEL_BACKEND
+    if backend not in _instances:
+        _instances[backend] = PROVIDERS[backend]()
+    return _instances[backend]
@@ -1,12 +1,20 @@
-import google.generativeai as genai
 from django.conf import settings
 import json
-import PIL.Image
+import re
+import time
+import random
+import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-genai.configure(api_key=settings.GEMINI_API_KEY)
+from . import ai_cache
+from .ai_providers import get_provider
 
-def get_model():
-    return genai.GenerativeModel('gemini-2.5-flash')
+def model_name():
+    # Part of every result cache key
+    return get_provider().name
+
+def text_cache_key(text_content, num_questions, difficulty, custom_instructions):
+    return ai_cache.cache_key('text', model_name(), text_content, num_questions=int(num_questions), difficulty=difficulty, custom_instructions=custom_instructions)
 
 def clean_json_response(response_text):
     clean_text = response_text.replace("```json", "").replace("```", "").strip()
@@ -15,9 +23,8 @@ def clean_json_response(response_text):
     except json.JSONDecodeError:
         return []
 
-def generate_questions_from_text(text_content, num_questions=5, difficulty="Medium", custom_instructions=""):
-    model = get_model()
-    
+def request_questions(text_content, num_questions=5, difficulty="Medium", custom_instructions=""):
+    # One model call; raises on API errors and on an unusable reply so callers can retry
     style_guide = custom_instructions if custom_instructions else "General Competitive Exam standards"
 
     prompt = f"""
@@ -38,22 +45,140 @@ def generate_questions_from_text(text_content, num_questions=5, difficulty="Medi
     ]
     
     NOTES:
-    {text_content[:25000]} 
+    {text_content} 
     """
     
-    try:
-        response = model.generate_content(prompt)
-        return clean_json_response(response.text)
-    except Exception as e:
-        print(f"Text AI Error: {e}")
-        return []
+    questions = clean_json_response(get_provider().generate_text(prompt))
+    if not isinstance(questions, list) or not questions:
+        raise ValueError("Model returned no questions")
+    return questions
+
+# --- MAP-REDUCE GENERATION (subject / course wide notes) ---
+# Notes are split per chapter into chunks that fit one prompt, the requested question
+# count is spread over the chunks by size, chunks are generated concurrently (bounded
+# pool, retry with backoff) and the merged list is de-duplicated.
+CHUNK_TOKENS = 6000
+CHARS_PER_TOKEN = 4
+CHUNK_CHARS = CHUNK_TOKENS * CHARS_PER_TOKEN
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 1.0
+
+def split_notes(sections, chunk_chars=CHUNK_CHARS):
+    """[(chapter title, notes)] -> ["--- Chapter: title ---\n<notes>", ...], each chunk (header included) <= chunk_chars"""
+    chunks = []
+    for title, notes in sections:
+        notes = (notes or "").strip()
+        if not notes: continue
+        # The header comes out of the budget; sized for the longest "(part i/n)" label
+        budget = max(1, chunk_chars - len(f"--- Chapter: {title} (part 9999/9999) ---\n"))
+        parts, current = [], ""
+        for paragraph in notes.split("\n\n"):
+            # Oversized paragraphs are cut hard
+            while len(paragraph) > budget:
+                if current: parts.append(current); current = ""
+                parts.append(paragraph[:budget])
+                paragraph = paragraph[budget:]
+            if current and len(current) + len(paragraph) + 2 > budget:
+                parts.append(current); current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current: parts.append(current)
+
+        for i, part in enumerate(parts):
+            label = f"{title} (part {i + 1}/{len(parts)})" if len(parts) > 1 else title
+            chunks.append(f"--- Chapter: {label} ---\n{part}")
+    return chunks
+
+def allocate_questions(chunks, num_questions):
+    # Largest-remainder split by chunk length; chunks that get 0 are skipped
+    total = sum(len(c) for c in chunks)
+    if not total or num_questions <= 0: return [0] * len(chunks)
+    shares = [num_questions * len(c) / total for c in chunks]
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(chunks)), key=lambda i: shares[i] - counts[i], reverse=True)
+    for i in by_remainder[:num_questions - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+def call_with_retry(request, *args, retries=MAX_RETRIES):
+    # -> (result, latency_ms of the successful call); jittered exponential backoff between tries
+    for attempt in range(retries):
+        try:
+            started = time.monotonic()
+            return request(*args), (time.monotonic() - started) * 1000
+        except Exception as e:
+            if attempt == retries - 1: raise
+            delay = BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+            print(f"AI Error (attempt {attempt + 1}, retrying in {delay:.1f}s): {e}")
+            time.sleep(delay)
+
+def question_fingerprint(question):
+    text = str(question.get('question_text', '')).lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+def generate_questions_map_reduce(sections, num_questions=5, difficulty="Medium", custom_instructions="", max_workers=None, on_progress=None, use_cache=True):
+    """
+    Returns (questions, report). report = {chunks, failed_chunks, duplicates, cached_chunks}.
+    on_progress(done, total) is called from the caller's thread as chunks finish.
+    Cache reads/writes happen on the caller's thread too; pool threads only call the model.
+    """
+    chunks = split_notes(sections)
+    work = [(chunk, n) for chunk, n in zip(chunks, allocate_questions(chunks, num_questions)) if n]
+    keys = [text_cache_key(chunk, n, difficulty, custom_instructions) for chunk, n in work]
+    results = [[] for _ in work]
+    failed = 0
+
+    if use_cache:
+        cached = ai_cache.lookup(keys)
+    else:
+        cached = {}
+        ai_cache.bump(bypassed=len(work))
+    pending = []
+    for i, key in enumerate(keys):
+        if key in cached: results[i] = cached[key]
+        else: pending.append(i)
 
-def generate_question_from_image(image_file, difficulty="Medium", custom_instructions=""):
-    model = get_model()
-    img = PIL.Image.open(image_file)
+    done = len(work) - len(pending)
+    if done and on_progress: on_progress(done, len(work))
+    if pending:
+        max_workers = max_workers or settings.AI_MAX_CONCURRENCY
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            futures = {
+                pool.submit(call_with_retry, request_questions, work[i][0], work[i][1], difficulty, custom_instructions): i
+                for i in pending
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i], latency_ms = future.result()
+                    ai_cache.store(keys[i], 'text', model_name(), results[i], latency_ms, len(work[i][0]))
+                except Exception as e:
+                    failed += 1
+                    print(f"Text AI Error (chunk {i + 1} gave up): {e}")
+                done += 1
+                if on_progress: on_progress(done, len(work))
+
+    # Reduce: chunk order, first occurrence wins
+    questions, seen = [], set()
+    for chunk_questions in results:
+        for question in chunk_questions:
+            fingerprint = question_fingerprint(question)
+            if fingerprint in seen: continue
+            seen.add(fingerprint)
+            questions.append(question)
+    duplicates = sum(len(r) for r in results) - len(questions)
+    return questions, {"chunks": len(work), "failed_chunks": failed, "duplicates": duplicates, "cached_chunks": len(work) - len(pending)}
+
+# --- IMAGE GENERATION (single + batch) ---
+# Phone photos are downscaled and re-encoded as JPEG before they are sent, and a batch
+# runs its images concurrently (bounded pool, retry with backoff). Cache keys use the
+# original bytes plus the preprocessing settings, so cache hits skip the resize too.
+IMAGE_MAX_SIDE = 1600
+IMAGE_QUALITY = 85
+
+def image_prompt(difficulty, custom_instructions):
     style_guide = custom_instructions if custom_instructions else "standard exam pattern"
 
-    prompt = f"""
+    return f"""
     Analyze this image.
     TASK: Create 1 Multiple Choice Question (MCQ) based on it.
     CONTEXT: {style_guide}
@@ -71,9 +196,81 @@ def generate_question_from_image(image_file, difficulty="Medium", custom_instruc
     ]
     """
 
-    try:
-        response = model.generate_content([prompt, img])
-        return clean_json_response(response.text)
-    except Exception as e:
-        print(f"Vision AI Error: {e}")
-        return []
\ No newline at end of file
+def prepare_image(data, max_side=IMAGE_MAX_SIDE, quality=IMAGE_QUALITY):
+    """Any Pillow-readable upload -> upright RGB JPEG no larger than max_side on either edge."""
+    import PIL.Image
+    import PIL.ImageOps
+    with PIL.Image.open(io.BytesIO(data)) as img:
+        # JPEGs can decode straight at a reduced scale
+        img.draft('RGB', (max_side, max_side))
+        img = PIL.ImageOps.exif_transpose(img)
+        if img.mode != 'RGB': img = img.convert('RGB')
+        img.thumbnail((max_side, max_side))
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=quality, optimize=True)
+    return out.getvalue()
+
+def request_image_questions(prompt, image_bytes):
+    questions = clean_json_response(get_provider().generate_from_image(prompt, image_bytes))
+    if not isinstance(questions, list) or not questions:
+        raise ValueError("Model returned no questions")
+    return questions
+
+def process_image(prompt, data):
+    # Pool task: Pillow releases the GIL while decoding / resizing / encoding
+    prepared = prepare_image(data)
+    questions, latency_ms = call_with_retry(request_image_questions, prompt, prepared)
+    return questions, latency_ms, len(prepared)
+
+def image_cache_key(data, difficulty, custom_instructions):
+    return ai_cache.cache_key('image', model_name(), data, difficulty=difficulty, custom_instructions=custom_instructions, max_side=IMAGE_MAX_SIDE, quality=IMAGE_QUALITY)
+
+def generate_questions_from_images(images, difficulty="Medium", custom_instructions="", max_workers=None, on_progress=None, use_cache=True):
+    """
+    images: [(name, bytes)]. Returns (questions, errors, report); errors = [{image, error}].
+    One failing image never fails the batch. Cache reads/writes stay on the caller's thread.
+    """
+    prompt = image_prompt(difficulty, custom_instructions)
+    keys = [image_cache_key(data, difficulty, custom_instructions) for _, data in images]
+    results = [[] for _ in images]
+    errors = []
+    sent_bytes = 0
+
+    if use_cache:
+        cached = ai_cache.lookup(keys)
+    else:
+        cached = {}
+        ai_cache.bump(bypassed=len(images))
+    pending = []
+    for i, key in enumerate(keys):
+        if key in cached: results[i] = cached[key]
+        else: pending.append(i)
+
+    done = len(images) - len(pending)
+    if done and on_progress: on_progress(done, len(images))
+    if pending:
+        max_workers = max_workers or settings.AI_MAX_CONCURRENCY
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            futures = {pool.submit(process_image, prompt, images[i][1]): i for i in pending}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i], latency_ms, size = future.result()
+                    sent_bytes += size
+                    ai_cache.store(keys[i], 'image', model_name(), results[i], latency_ms, len(images[i][1]))
+                except Exception as e:
+                    print(f"Vision AI Error ({images[i][0]}): {e}")
+                    errors.append((i, {"image": images[i][0], "error": str(e)}))
+                done += 1
+                if on_progress: on_progress(done, len(images))
+
+    errors = [error for _, error in sorted(errors, key=lambda e: e[0])]
+    questions = [q for image_questions in results for q in image_questions]
+    report = {
+        "images": len(images),
+        "failed_images": len(errors),
+        "cached_images": len(images) - len(pending),
+        "bytes_received": sum(len(images[i][1]) for i in pending),
+        "bytes_sent": sent_bytes,
+    }
+    return questions, errors, report
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+
+from .models import Question, Option
+from .cache_utils import LocalLRU
+
+# Shared copy lives in the Django cache; each process keeps a small LRU on top
+# so the hot path (submit_exam / check_answer) skips unpickling as well.
+# Keys embed Exam.content_version, which signals.py bumps on every change.
+CACHE_TIMEOUT = 60 * 60 * 6
+
+_local = LocalLRU(maxsize=256)
+
+
+def _key(exam): return f"answer_key:{exam.id}:{exam.content_version}"
+
+
+def build_answer_key(exam):
+    """
+    Compact, picklable answer key for one exam:
+    {
+        'version': '<content_version>',
+        'negative_marking_ratio': 0.25,
+        'questions': {question_id: (correct_option_id, marks, explanation)},
+        'options': {option_id: (question_id, is_correct)},
+    }
+    """
+    questions = {}
+    for q_id, marks, explanation in Question.objects.filter(exam_id=exam.id).values_list('id', 'marks', 'explanation'):
+        questions[q_id] = (None, marks, explanation)
+
+    options = {}
+    for opt_id, q_id, is_correct in Option.objects.filter(question__exam_id=exam.id).order_by('id').values_list('id', 'question_id', 'is_correct'):
+        options[opt_id] = (q_id, is_correct)
+        # Same rule as before: the first correct option (by id) is "the" answer
+        if is_correct and questions.get(q_id, (0,))[0] is None:
+            questions[q_id] = (opt_id,) + questions[q_id][1:]
+
+    return {
+        'version': exam.content_version,
+        'negative_marking_ratio': exam.negative_marking_ratio,
+        'questions': questions,
+        'options': options,
+    }
+
+
+def get_answer_key(exam):
+    key_name = _key(exam)
+    key = _local.get(key_name)
+    if key is None:
+        key = cache.get(key_name)
+        if key is None:
+            key = build_answer_key(exam)
+            cache.set(key_name, key, CACHE_TIMEOUT)
+        _local.set(key_name, key)
+    return key
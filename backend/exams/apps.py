@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class ExamsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exams'
-    verbose_name = 'Exams Management'
\ No newline at end of file
+    verbose_name = 'Exams Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401 (connects receivers)
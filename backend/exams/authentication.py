@@ -1,17 +1,181 @@
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.utils import timezone
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.exceptions import AuthenticationFailed
 
+from .models import User
+from .cache_utils import LocalLRU, shared_cache
+
+# --- CACHED AUTH ROW ---
+# The user's columns (incl. token_version) are kept in the shared cache and written
+# through on every User save (signals.py), so authenticating a request is usually
+# query-free. Without a shared cache (LocMem), or while it is unreachable, a short-lived
+# per-process copy is used instead so a login on another worker is seen within seconds.
+SHARED_TIMEOUT = 60 * 60
+LOCAL_TIMEOUT = 5
+
+# Never cached (password), or never written back from a possibly stale cached copy:
+# these stay deferred on request.user and load from the DB on first access.
+UNCACHED_FIELDS = {'password'}
+DEFERRED_FIELDS = {'password', 'token_version', 'last_login', 'last_logout'}
+
+_local = LocalLRU(maxsize=4096)
+
+
+# Local keys are str(user_id): the token claim may carry the id as a string
+def _key(user_id): return f"auth_user:{user_id}"
+
+
+def _cached_fields():
+    return [f.attname for f in User._meta.concrete_fields if f.attname not in UNCACHED_FIELDS]
+
+
+def _remember(user_id, fields):
+    _local.set(str(user_id), (time.monotonic() + LOCAL_TIMEOUT, fields))
+    if shared_cache():
+        try:
+            cache.set(_key(user_id), fields, SHARED_TIMEOUT)
+        except Exception:
+            pass
+
+
+def cache_user(user):
+    """Write-through after a save. Partially loaded instances just drop the entry."""
+    if user.get_deferred_fields() - UNCACHED_FIELDS:
+        forget_user(user.pk)
+        return
+    _remember(user.pk, {name: getattr(user, name) for name in _cached_fields()})
+
+
+def forget_user(user_id):
+    _local.pop(str(user_id))
+    if shared_cache():
+        try:
+            cache.delete(_key(user_id))
+        except Exception:
+            pass
+
+
+def load_user_fields(user_id):
+    if shared_cache():
+        try:
+            fields = cache.get(_key(user_id))
+            if fields is not None: return fields
+        except Exception:
+            # Shared cache unreachable -> fall back to the short-lived local copy
+            entry = _local.get(str(user_id))
+            if entry and entry[0] > time.monotonic(): return entry[1]
+    else:
+        entry = _local.get(str(user_id))
+        if entry and entry[0] > time.monotonic(): return entry[1]
+
+    fields = User.objects.filter(id=user_id).values(*_cached_fields()).first()
+    if fields is not None: _remember(user_id, fields)
+    return fields
+
+
+def build_user(fields):
+    # A DB-backed instance with DEFERRED_FIELDS left unloaded; save() only writes loaded columns
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in fields and f.attname not in DEFERRED_FIELDS]
+    return User.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+
+
 class SingleDeviceJWTAuthentication(JWTAuthentication):
     def get_user(self, validated_token):
-        # 1. Get the user object using standard logic
-        user = super().get_user(validated_token)
-        
-        # 2. Check for token_version claim
+        # 1. Password-hash revocation needs the real row
+        if api_settings.CHECK_REVOKE_TOKEN:
+            user = super().get_user(validated_token)
+            fields = {'token_version': user.token_version}
+        else:
+            try:
+                user_id = validated_token[api_settings.USER_ID_CLAIM]
+            except KeyError:
+                raise InvalidToken('Token contained no recognizable user identification')
+
+            # 2. Cached row (shared cache -> local copy -> DB)
+            fields = load_user_fields(user_id)
+            if fields is None:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            if api_settings.CHECK_USER_IS_ACTIVE and not fields['is_active']:
+                raise AuthenticationFailed('User is inactive', code='user_inactive')
+            user = None
+
+        # 3. Check for token_version claim
         token_version = validated_token.get('token_version')
-        
-        # 3. Compare with DB version
+
+        # 4. Compare with the current version
         # If the token's version is older than the user's current version, reject it.
-        if token_version is not None and user.token_version != token_version:
+        if token_version is not None and fields['token_version'] != token_version:
             raise AuthenticationFailed('You have logged in on another device. Please login again.')
-            
-        return user
\ No newline at end of file
+
+        return user or build_user(fields)
+
+
+# --- SESSION WRITES ---
+# Login and logout touch only their own columns with a single UPDATE: no full-row save.
+# The bumped token_version is read back by the same statement (UPDATE ... RETURNING, or a
+# row lock elsewhere), so concurrent logins of one user (exam-start storms) each get a
+# distinct version. The write skips post_save, so the cached auth row is written through here.
+def _bump_token_version(user_id, now):
+    if connection.vendor in ('postgresql', 'sqlite'):
+        qn = connection.ops.quote_name
+        table, column = qn(User._meta.db_table), qn('token_version')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {column} = ({table}.{column} + 1), {qn('last_login')} = %s "
+                f"WHERE {table}.{qn('id')} = %s RETURNING {column}",
+                [connection.ops.adapt_datetimefield_value(now), user_id],
+            )
+            return cursor.fetchone()[0]
+    with transaction.atomic():
+        version = User.objects.select_for_update().values_list('token_version', flat=True).get(pk=user_id) + 1
+        User.objects.filter(pk=user_id).update(token_version=version, last_login=now)
+    return version
+
+
+def start_session(user):
+    """Bumps token_version and stamps last_login. Returns the new token_version."""
+    now = timezone.now()
+    user.token_version = _bump_token_version(user.pk, now)
+    user.last_login = now
+    cache_user(user)
+    return user.token_version
+
+
+def end_session(user):
+    User.objects.filter(pk=user.pk).update(last_logout=timezone.now())
+    # request.user may be a partial cached copy: drop the entry rather than rebuild it
+    forget_user(user.pk)
+
+
+# --- TOKEN TABLE PRUNING ---
+# token_blacklist stores a row per issued refresh token (plus one per blacklisting on
+# rotation). Expired ones are dead weight: they are deleted in short primary-key batches
+# so no statement holds the tables for long, unlike flushexpiredtokens' single DELETE.
+PRUNE_BATCH = 1000
+
+
+def prune_expired_tokens(batch_size=PRUNE_BATCH, pause=0.0):
+    """Returns the number of outstanding tokens deleted (their blacklist rows go with them)."""
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    now = timezone.now()
+    pruned, last_id = 0, 0
+    while True:
+        # Keyset walk over the primary key; expires_at has no index of its own
+        ids = list(
+            OutstandingToken.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'expires_at')[:batch_size]
+        )
+        if not ids: return pruned
+        last_id = ids[-1][0]
+        expired = [token_id for token_id, expires_at in ids if expires_at <= now]
+        if expired:
+            pruned += OutstandingToken.objects.filter(id__in=expired).delete()[1].get(OutstandingToken._meta.label, 0)
+        # Every refresh token gets the same lifetime, so expiry follows id order: stop at the first live one
+        if len(expired) < len(ids): return pruned
+        if pause: time.sleep(pause)
@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def shared_cache():
+    # False for per-process LocMem: a delete there only reaches the worker that made it
+    return not isinstance(caches['default'], LocMemCache)
+
+
+class LocalLRU:
+    """
+    Small thread-safe, per-process LRU that sits in front of the shared Django cache.
+    Keys should embed a content version so stale entries simply age out.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data: return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
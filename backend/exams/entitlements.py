@@ -0,0 +1,102 @@
+import uuid
+
+from django.core.cache import cache
+
+from .models import Chapter, Topic, Exam, UserSubscription
+from .cache_utils import shared_cache
+
+# --- ENTITLEMENTS ---
+# Two cached lookups replace the FK walk + subscription query on every exam access:
+# 1. object -> (course_id, course_is_paid) for exams, chapters and topics. Entries are
+#    written through when an exam is saved; structural edits (course, subject, chapter,
+#    topic) rotate a generation token instead of hunting down every dependent key.
+# 2. user -> frozenset of actively subscribed course ids, dropped on subscription changes.
+# Without a shared cache (LocMem) those invalidations only reach the worker that handled
+# the write, so entries there live LOCAL_TIMEOUT seconds: other workers catch up that fast.
+CACHE_TIMEOUT = 60 * 60 * 6
+USER_TIMEOUT = 60 * 5
+LOCAL_TIMEOUT = 5
+
+GEN_KEY = "entitlement:gen"
+
+# Owner lookups, most specific link first (same precedence as the old permission walk)
+EXAM_OWNER_PATHS = ['course', 'subject__course', 'chapter__subject__course', 'topic__chapter__subject__course']
+
+
+def _generation():
+    gen = cache.get(GEN_KEY)
+    if gen is None:
+        cache.add(GEN_KEY, uuid.uuid4().hex, None)
+        gen = cache.get(GEN_KEY)
+    return gen
+
+
+def _object_key(gen, obj): return f"entitlement:{gen}:{obj._meta.model_name}:{obj.pk}"
+def _user_key(user_id): return f"entitlement:user:{user_id}"
+
+
+def _timeouts():
+    # (object, user) entry lifetimes
+    return (CACHE_TIMEOUT, USER_TIMEOUT) if shared_cache() else (LOCAL_TIMEOUT, LOCAL_TIMEOUT)
+
+
+def rotate_generation():
+    cache.set(GEN_KEY, uuid.uuid4().hex, None)
+
+
+def resolve_owner(obj):
+    # (course_id, is_paid) owning this object, or (None, False) if it hangs off no course
+    if isinstance(obj, Exam):
+        fields = []
+        for path in EXAM_OWNER_PATHS:
+            fields += [f'{path}__id', f'{path}__is_paid']
+        row = Exam.objects.filter(id=obj.id).values_list(*fields).first() or ()
+        for i in range(0, len(row), 2):
+            if row[i]: return (row[i], row[i + 1])
+        return (None, False)
+    if isinstance(obj, Chapter):
+        row = Chapter.objects.filter(id=obj.id).values_list('subject__course_id', 'subject__course__is_paid').first()
+    elif isinstance(obj, Topic):
+        row = Topic.objects.filter(id=obj.id).values_list('chapter__subject__course_id', 'chapter__subject__course__is_paid').first()
+    else:
+        return (None, False)
+    return tuple(row) if row else (None, False)
+
+
+def refresh_owner(obj):
+    # Write-through on save
+    cache.set(_object_key(_generation(), obj), resolve_owner(obj), _timeouts()[0])
+
+
+def subscribed_course_ids(user):
+    ids = cache.get(_user_key(user.id))
+    if ids is None:
+        ids = frozenset(UserSubscription.objects.filter(user_id=user.id, active=True).values_list('course_id', flat=True))
+        cache.set(_user_key(user.id), ids, _timeouts()[1])
+    return ids
+
+
+def invalidate_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+def can_access(user, obj):
+    """Free content, or paid content the user is actively subscribed to."""
+    object_key = _object_key(_generation(), obj)
+    user_key = _user_key(user.id) if user.is_authenticated else None
+    found = cache.get_many([k for k in (object_key, user_key) if k])
+
+    owner = found.get(object_key)
+    if owner is None:
+        owner = resolve_owner(obj)
+        cache.set(object_key, owner, _timeouts()[0])
+
+    course_id, is_paid = owner
+    if not course_id or not is_paid:
+        return True
+    if not user.is_authenticated:
+        return False
+    ids = found.get(user_key)
+    if ids is None:
+        ids = subscribed_course_ids(user)
+    return course_id in ids
@@ -0,0 +1,127 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ExamAttempt, StudentResponse
+from .answer_key import get_answer_key
+from .ranking import record_score
+from .question_stats import ensure_rows, record_attempt
+
+
+class AlreadySubmitted(Exception):
+    pass
+
+
+def clean_answers(answers):
+    # Normalise the {question_id: option_id} payload to ints, dropping junk.
+    # A null/empty option clears a previously saved answer.
+    selected = {}
+    for q_id, opt_id in (answers or {}).items():
+        try:
+            selected[int(q_id)] = int(opt_id) if opt_id not in (None, '') else None
+        except (TypeError, ValueError):
+            continue
+    return selected
+
+
+def build_responses(key, attempt_id, selected):
+    # StudentResponse rows for the entries that are valid against the answer key
+    rows = []
+    for q_id, opt_id in selected.items():
+        if q_id not in key['questions']: continue
+        if opt_id is not None:
+            option = key['options'].get(opt_id)
+            # The option must belong to the question it was submitted for
+            if not option or option[0] != q_id: continue
+        rows.append(StudentResponse(
+            attempt_id=attempt_id, question_id=q_id, selected_option_id=opt_id,
+            status='answered' if opt_id else 'skipped'
+        ))
+    return rows
+
+
+def upsert_responses(rows):
+    # One INSERT ... ON CONFLICT (attempt, question) DO UPDATE per batch
+    if not rows: return
+    StudentResponse.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True,
+        unique_fields=['attempt', 'question'], update_fields=['selected_option', 'status']
+    )
+
+
+def score_answers(key, selected):
+    # Grades {question_id: option_id} against a precompiled answer key
+    score = 0
+    ratio = key['negative_marking_ratio']
+    for q_id, opt_id in selected.items():
+        option = key['options'].get(opt_id)
+        if not option or option[0] != q_id: continue
+        marks = key['questions'][q_id][1]
+        if option[1]:
+            score += marks
+        else:
+            score -= (marks * ratio)
+    return score
+
+
+def autosave_answers(exam, user, attempt_id, answers):
+    """
+    Autosave: upserts a batch of answer changes for an in-progress attempt.
+    The attempt row is locked so a concurrent submit either sees this batch
+    or rejects it. Raises ExamAttempt.DoesNotExist / AlreadySubmitted.
+    """
+    rows = build_responses(get_answer_key(exam), attempt_id, clean_answers(answers))
+    with transaction.atomic():
+        try:
+            is_completed = ExamAttempt.objects.select_for_update().filter(
+                id=attempt_id, user=user, exam=exam
+            ).values_list('is_completed', flat=True).get()
+        except (TypeError, ValueError):
+            raise ExamAttempt.DoesNotExist
+        if is_completed:
+            raise AlreadySubmitted
+        upsert_responses(rows)
+    return len(rows)
+
+
+def submit_attempt(exam, user, attempt_id, answers):
+    """
+    Grades a submission with a fixed number of queries, whatever the exam size:
+    1. One read of the attempt (a duplicate submit stops here)
+    2. One conditional UPDATE flipping the attempt to completed
+    3. One upsert of the last answers delta (autosave already stored the rest)
+    4. One read of the stored responses, graded against the cached answer key
+    5. One UPDATE of the score
+    6. One upsert into the exam's score histogram (ranking.py)
+    7. After commit, two UPDATEs of the answered questions' / options' totals (question_stats.py)
+    Raises ExamAttempt.DoesNotExist / AlreadySubmitted.
+    """
+    try:
+        is_completed = ExamAttempt.objects.filter(
+            id=attempt_id, user=user, exam=exam
+        ).values_list('is_completed', flat=True).get()
+    except (TypeError, ValueError):
+        raise ExamAttempt.DoesNotExist
+    if is_completed:
+        raise AlreadySubmitted
+
+    key = get_answer_key(exam)
+    rows = build_responses(key, attempt_id, clean_answers(answers))
+    ensure_rows(exam.id, key)
+
+    with transaction.atomic():
+        # Conditional flip: of two concurrent submits only one can claim the row
+        claimed = ExamAttempt.objects.filter(id=attempt_id, is_completed=False).update(
+            is_completed=True, submit_time=timezone.now()
+        )
+        if not claimed:
+            raise AlreadySubmitted
+        upsert_responses(rows)
+
+        stored = dict(StudentResponse.objects.filter(attempt_id=attempt_id).values_list('question_id', 'selected_option_id'))
+        total_score = max(0, score_answers(key, stored))
+        ExamAttempt.objects.filter(id=attempt_id).update(total_score=total_score)
+        record_score(exam.id, total_score)
+        # Additive totals: kept out of the submit's transaction and its row locks
+        transaction.on_commit(lambda: record_attempt(exam.id, key, stored))
+
+    return total_score
@@ -0,0 +1,328 @@
+import csv
+import math
+import codecs
+
+from chardet import UniversalDetector
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, Round
+
+from .models import Question, Option, Course, Subject, Chapter
+from .snapshots import invalidate_snapshots
+from .notes import invalidate_notes
+from .search import index_questions, index_chapters
+
+# --- BULK QUESTION IMPORT ---
+# Rows are streamed off the upload (codecs.iterdecode + DictReader), validated and
+# written in fixed-size chunks: one bulk INSERT for the questions and one for their
+# options per chunk, instead of five INSERTs per CSV line.
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+CORRECT_LETTERS = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+
+
+class RowError(ValueError):
+    pass
+
+
+def map_question_headers(fieldnames):
+    header_map = {}
+    for field in fieldnames or []:
+        clean = field.strip().lower()
+        if 'question' in clean: header_map['question'] = field
+        elif 'option a' in clean: header_map['a'] = field
+        elif 'option b' in clean: header_map['b'] = field
+        elif 'option c' in clean: header_map['c'] = field
+        elif 'option d' in clean: header_map['d'] = field
+        elif 'correct' in clean: header_map['correct'] = field
+        elif 'mark' in clean: header_map['marks'] = field
+        elif 'explanation' in clean: header_map['explanation'] = field
+    return header_map
+
+
+def parse_question_row(row, header_map):
+    # -> (text, [4 options], correct_index, marks, explanation); raises RowError
+    def cell(key, default=''):
+        return (row.get(header_map.get(key)) or default).strip()
+
+    q_text = cell('question')
+    options = [cell('a'), cell('b'), cell('c'), cell('d')]
+    correct_opt = cell('correct').upper()
+
+    # Validation: Skip if critical data missing
+    if not q_text: raise RowError("Missing question text")
+    if not all(options): raise RowError("All four options are required")
+    if correct_opt not in CORRECT_LETTERS: raise RowError(f"Correct option must be A-D, got '{correct_opt}'")
+
+    marks_str = cell('marks', '2')
+    try:
+        marks = float(marks_str) if marks_str else 2.0
+    except ValueError:
+        raise RowError(f"Invalid marks '{marks_str}'")
+    # float() also takes 'inf' / 'nan', which would poison total_marks and scoring
+    if not math.isfinite(marks) or marks < 0: raise RowError(f"Invalid marks '{marks_str}'")
+
+    return q_text, options, CORRECT_LETTERS[correct_opt], marks, cell('explanation')
+
+
+class QuestionCSVImporter:
+    """
+    atomic=True  -> the whole file lands in one transaction, or not at all.
+    atomic=False -> each chunk commits on its own; the report's 'checkpoint' is the last
+                    committed CSV row, and resume_from_row skips rows up to it on a retry.
+    dry_run=True -> validates every row and reports per-row errors without writing.
+    """
+    def __init__(self, exam, dry_run=False, atomic=True, resume_from_row=0, chunk_size=CHUNK_SIZE):
+        self.exam = exam
+        self.dry_run = dry_run
+        self.atomic = atomic
+        self.resume_from_row = resume_from_row
+        self.chunk_size = chunk_size
+
+        self.added = 0
+        self.skipped = 0
+        self.errors = []
+        self.checkpoint = resume_from_row
+
+    def rows(self, file_obj):
+        # Stream & Decode (Fix memory issues & BOM); data rows are numbered from 2 (after the header)
+        reader = csv.DictReader(codecs.iterdecode(file_obj, 'utf-8-sig'))
+        header_map = map_question_headers(reader.fieldnames)
+        for row_number, row in enumerate(reader, start=2):
+            if row_number <= self.resume_from_row: continue
+            try:
+                yield row_number, parse_question_row(row, header_map)
+            except RowError as e:
+                self.skipped += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({"row": row_number, "error": str(e)})
+
+    def write_chunk(self, chunk):
+        questions = Question.objects.bulk_create([
+            Question(exam=self.exam, text_content=text, marks=marks, explanation=explanation)
+            for _, (text, _, _, marks, explanation) in chunk
+        ])
+        Option.objects.bulk_create([
+            Option(question=question, text=opt_text, is_correct=(idx == correct_idx))
+            for question, (_, (_, options, correct_idx, _, _)) in zip(questions, chunk)
+            for idx, opt_text in enumerate(options)
+        ])
+        # bulk_create skips the model signals
+        index_questions([question.id for question in questions])
+
+    def flush(self, chunk):
+        if not chunk: return
+        if not self.dry_run:
+            if self.atomic:
+                self.write_chunk(chunk)
+            else:
+                with transaction.atomic():
+                    self.write_chunk(chunk)
+        self.added += len(chunk)
+        self.checkpoint = chunk[-1][0]
+
+    def import_rows(self, file_obj):
+        chunk = []
+        try:
+            for item in self.rows(file_obj):
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    self.flush(chunk)
+                    chunk = []
+            self.flush(chunk)
+        except Exception:
+            # Chunked mode keeps the chunks committed before the failure, so their marks count.
+            # A single transaction is doomed (aborted, on Postgres): issue nothing more in it.
+            if not self.atomic: self.update_total_marks()
+            raise
+        self.update_total_marks()
+
+    def update_total_marks(self):
+        # Re-sum the stored questions, so partial and resumed imports stay exact. bulk_create
+        # skips signals, so the model save here is also what refreshes the paper / answer key caches.
+        if not self.added or self.dry_run: return
+        marks = Question.objects.filter(exam_id=OuterRef('pk')).values('exam_id').annotate(total=Sum('marks')).values('total')
+        self.exam.total_marks = Cast(Round(Coalesce(Subquery(marks), 0.0)), IntegerField())
+        self.exam.save(update_fields=['total_marks'])
+        self.exam.refresh_from_db(fields=['total_marks'])
+
+    def run(self, file_obj):
+        if self.atomic and not self.dry_run:
+            with transaction.atomic():
+                self.import_rows(file_obj)
+        else:
+            self.import_rows(file_obj)
+        return self.report()
+
+    def report(self):
+        verb = "Would add" if self.dry_run else "Added"
+        return {
+            "status": "success",
+            "dry_run": self.dry_run,
+            "added": self.added,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "checkpoint": self.checkpoint,
+            "total_marks": self.exam.total_marks,
+            "message": f"{verb} {self.added} questions. Skipped {self.skipped} rows (check formatting)."
+        }
+
+
+# --- BULK NOTES IMPORT ---
+# Course / Subject / Chapter keys are preloaded into dicts once (ids and titles only,
+# never the notes), rows are streamed in chunks, and each chunk costs a handful of
+# bulk_create / bulk_update statements however many rows it holds.
+NOTES_CHUNK_SIZE = 500
+DETECT_BYTES = 64 * 1024
+MAX_FIELD_SIZE = 16 * 1024 * 1024
+
+# The csv limit is process-wide: raise it once, here, and never lower someone else's
+csv.field_size_limit(max(csv.field_size_limit(), MAX_FIELD_SIZE))
+
+
+def detect_encoding(file_obj, limit=DETECT_BYTES):
+    # Feeds at most `limit` bytes to the detector, then rewinds the upload
+    head = file_obj.read(limit)
+    file_obj.seek(0)
+    try:
+        # A multi-byte char cut at the boundary is still valid UTF-8
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        pass
+
+    detector = UniversalDetector()
+    for i in range(0, len(head), 4096):
+        detector.feed(head[i:i + 4096])
+        if detector.done: break
+    detector.close()
+    encoding = detector.result['encoding'] or 'utf-8'
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = 'utf-8'
+    return encoding
+
+
+def map_notes_headers(fieldnames):
+    header_map = {}
+    for field in fieldnames or []:
+        clean = field.strip().lower()
+        if 'course' in clean: header_map['course'] = field
+        elif 'paper' in clean or 'section' in clean: header_map['section'] = field
+        elif 'subject' in clean: header_map['subject'] = field
+        elif 'chapter' in clean: header_map['chapter'] = field
+        elif 'topic' in clean: header_map['topic'] = field
+        elif 'note' in clean: header_map['notes'] = field
+    return header_map
+
+
+class NotesCSVImporter:
+    """
+    Upserts chapter notes keyed by (course title, subject title, chapter title), creating
+    any missing course / subject / chapter. Rows without notes still create the hierarchy;
+    a later row for the same chapter overwrites an earlier one.
+    """
+    def __init__(self, chunk_size=NOTES_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.counts = {'courses_created': 0, 'subjects_created': 0, 'chapters_created': 0, 'chapters_updated': 0}
+        self.skipped = 0
+        self.errors = []
+        self.touched_courses = set()
+
+    def preload(self):
+        self.courses = {}
+        for course_id, title in Course.objects.order_by('id').values_list('id', 'title'):
+            self.courses.setdefault(title, course_id)
+        self.subjects = {}
+        for subject_id, course_id, title, section in Subject.objects.order_by('id').values_list('id', 'course_id', 'title', 'section'):
+            self.subjects.setdefault((course_id, title), [subject_id, section])
+        self.chapters = {}
+        for chapter in Chapter.objects.order_by('id').only('id', 'subject_id', 'title'):
+            self.chapters.setdefault((chapter.subject_id, chapter.title), chapter.id)
+
+    def rows(self, file_obj):
+        encoding = detect_encoding(file_obj)
+        reader = csv.DictReader(codecs.iterdecode(file_obj, encoding, errors='replace'))
+        header_map = map_notes_headers(reader.fieldnames)
+        missing = [key for key in ('course', 'subject', 'chapter') if key not in header_map]
+        if missing:
+            raise RowError(f"Missing column(s): {', '.join(missing)}")
+
+        def cell(row, key, default=''):
+            return (row.get(header_map.get(key)) or default).strip()
+
+        for row_number, row in enumerate(reader, start=2):
+            c_title, s_title, ch_title = cell(row, 'course'), cell(row, 'subject'), cell(row, 'chapter')
+            if not (c_title and s_title and ch_title):
+                self.skipped += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({"row": row_number, "error": "Course, subject and chapter are required"})
+                continue
+            yield c_title, cell(row, 'section'), s_title, ch_title, cell(row, 'notes')
+
+    def write_chunk(self, chunk):
+        # 1. Courses
+        new_courses = {c_title: Course(title=c_title) for c_title, *_ in chunk if c_title not in self.courses}
+        for course in Course.objects.bulk_create(new_courses.values()):
+            self.courses[course.title] = course.id
+        self.counts['courses_created'] += len(new_courses)
+
+        # 2. Subjects (section follows the latest non-empty value)
+        new_subjects, changed_subjects = {}, {}
+        for c_title, sec_title, s_title, _, _ in chunk:
+            key = (self.courses[c_title], s_title)
+            if key in new_subjects:
+                if sec_title: new_subjects[key].section = sec_title
+            elif key not in self.subjects:
+                new_subjects[key] = Subject(course_id=key[0], title=s_title, section=sec_title or 'Main')
+            elif sec_title and self.subjects[key][1] != sec_title:
+                self.subjects[key][1] = sec_title
+                changed_subjects[key] = Subject(id=self.subjects[key][0], section=sec_title)
+        for key, subject in zip(new_subjects, Subject.objects.bulk_create(new_subjects.values())):
+            self.subjects[key] = [subject.id, subject.section]
+        Subject.objects.bulk_update(changed_subjects.values(), ['section'])
+        self.counts['subjects_created'] += len(new_subjects)
+
+        # 3. Chapters
+        new_chapters, updated_notes = {}, {}
+        for c_title, _, s_title, ch_title, notes in chunk:
+            course_id = self.courses[c_title]
+            key = (self.subjects[(course_id, s_title)][0], ch_title)
+            self.touched_courses.add(course_id)
+            if key in new_chapters:
+                if notes: new_chapters[key].study_notes = notes
+            elif key not in self.chapters:
+                new_chapters[key] = Chapter(subject_id=key[0], title=ch_title, study_notes=notes)
+            elif notes:
+                updated_notes[key] = Chapter(id=self.chapters[key], study_notes=notes)
+        for key, chapter in zip(new_chapters, Chapter.objects.bulk_create(new_chapters.values())):
+            self.chapters[key] = chapter.id
+        Chapter.objects.bulk_update(updated_notes.values(), ['study_notes'])
+        invalidate_notes([chapter.id for chapter in updated_notes.values()])
+        index_chapters([self.chapters[key] for key in new_chapters] + [chapter.id for chapter in updated_notes.values()])
+        self.counts['chapters_created'] += len(new_chapters)
+        self.counts['chapters_updated'] += len(updated_notes)
+
+    def run(self, file_obj):
+        with transaction.atomic():
+            self.preload()
+            chunk = []
+            for item in self.rows(file_obj):
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    self.write_chunk(chunk)
+                    chunk = []
+            if chunk: self.write_chunk(chunk)
+            # bulk writes skip the model signals
+            invalidate_snapshots(self.touched_courses)
+        return self.report()
+
+    def report(self):
+        return {
+            "status": "success",
+            **self.counts,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "message": f"Processed successfully! Created {self.counts['chapters_created']}, Updated {self.counts['chapters_updated']} chapters."
+        }
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from exams.authentication import PRUNE_BATCH, prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Deletes expired outstanding (and blacklisted) JWT refresh tokens in short batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PRUNE_BATCH)
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        pruned = prune_expired_tokens(options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} expired tokens"))
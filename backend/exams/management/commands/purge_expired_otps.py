@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from exams.otp import PURGE_BATCH, purge_expired
+
+
+class Command(BaseCommand):
+    help = "Deletes expired OTP codes in small batches (run from cron every few minutes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH)
+
+    def handle(self, *args, **options):
+        purged = purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired OTPs"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from exams.models import Chapter
+from exams.notes import build_notes
+
+BATCH_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = "Re-renders the stored sanitized HTML for chapter study notes (after a NOTES_FORMAT bump or bulk edits)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chapter', type=int, action='append', dest='chapter_ids', help="Limit to these chapter ids (repeatable).")
+
+    def handle(self, *args, **options):
+        chapter_ids = options['chapter_ids'] or list(Chapter.objects.order_by('id').values_list('id', flat=True))
+        built = 0
+        for start in range(0, len(chapter_ids), BATCH_SIZE):
+            built += len(build_notes(chapter_ids[start:start + BATCH_SIZE]))
+        self.stdout.write(self.style.SUCCESS(f"Rendered notes for {built} chapters"))
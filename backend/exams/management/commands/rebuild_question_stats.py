@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from exams.question_stats import rebuild_question_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes per-question and per-option statistics from StudentResponse."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, action='append', dest='exam_ids', help="Limit to these exam ids (repeatable).")
+
+    def handle(self, *args, **options):
+        questions = rebuild_question_stats(options['exam_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {questions} questions"))
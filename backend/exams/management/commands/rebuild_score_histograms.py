@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from exams.ranking import rebuild_histograms
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per-exam score histograms used for rank / percentile from completed attempts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, action='append', dest='exam_ids', help="Limit to these exam ids (repeatable).")
+
+    def handle(self, *args, **options):
+        buckets = rebuild_histograms(options['exam_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} score buckets"))
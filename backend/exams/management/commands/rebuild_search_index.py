@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from exams.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Re-indexes questions and chapter notes for full-text search and drops rows for deleted objects."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['question', 'chapter'], action='append', dest='kinds', help="Limit to these kinds (repeatable).")
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index(options['kinds'] or ('question', 'chapter'))
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} documents"))
@@ -0,0 +1,97 @@
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# NOTE: exams.ai_jobs is imported inside functions. Pool children unpickle run_in_child
+# by importing this module before django.setup() has run, so it must not touch models.
+
+
+def init_worker():
+    # Spawned children start from a blank interpreter
+    import django
+    django.setup()
+
+
+def run_in_child(job_id):
+    from exams.ai_jobs import run_job
+    try:
+        run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Runs queued AI generation jobs in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.AI_WORKER_PROCESSES,
+                            help="Pool size; 0 runs jobs inline in this process.")
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit.")
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--stale-after', type=int, default=15 * 60,
+                            help="Seconds before a running job is assumed dead and requeued.")
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        self.stdout.write(f"AI worker started ({processes or 'inline'} process(es))")
+        if processes <= 0:
+            self.run_inline(options)
+        else:
+            self.run_pool(processes, options)
+
+    def run_inline(self, options):
+        from exams.ai_jobs import claim_jobs, requeue_stale, run_job
+        while True:
+            requeue_stale(options['stale_after'])
+            claimed = claim_jobs(1)
+            for job_id in claimed:
+                run_job(job_id)
+                self.stdout.write(f"Job #{job_id} finished")
+            if not claimed:
+                if options['once']: return
+                time.sleep(options['poll_interval'])
+
+    def make_pool(self, processes):
+        # spawn, not fork: children must not inherit the parent's DB connections
+        context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=init_worker)
+
+    def run_pool(self, processes, options):
+        from exams.ai_jobs import claim_jobs, heartbeat, requeue_stale, fail_job
+        pool = self.make_pool(processes)
+        inflight = {}
+        try:
+            while True:
+                # Jobs still in the pool are alive however long their model calls take
+                heartbeat(inflight.values())
+                requeue_stale(options['stale_after'])
+                try:
+                    for job_id in claim_jobs(processes - len(inflight)):
+                        inflight[pool.submit(run_in_child, job_id)] = job_id
+                except BrokenProcessPool:
+                    # A child died hard; its jobs fail below, the claimed one goes stale and is retried
+                    pass
+
+                if not inflight:
+                    if options['once']: return
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(inflight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = inflight.pop(future)
+                    if future.exception():
+                        # The child died before it could record anything
+                        fail_job(job_id, f"Worker crashed: {future.exception()!r}")
+                    self.stdout.write(f"Job #{job_id} finished")
+
+                if getattr(pool, '_broken', False) and not inflight:
+                    pool.shutdown(wait=False)
+                    pool = self.make_pool(processes)
+        finally:
+            pool.shutdown(wait=True)
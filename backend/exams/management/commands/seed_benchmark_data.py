@@ -0,0 +1,210 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from exams.models import User, Course, Subject, Chapter, Exam, Question, Option, UserSubscription, ExamAttempt, StudentResponse
+from exams.ranking import rebuild_histograms
+from exams.question_stats import rebuild_question_stats
+from exams.snapshots import build_snapshots
+from exams.notes import build_notes
+from exams.search import rebuild_index
+
+# --- SYNTHETIC BENCHMARK DATASET ---
+# Everything is written with bulk_create, so model signals do not fire: the histograms,
+# question totals, course snapshots, rendered notes and search index are built once at the end instead.
+# Rows are tagged with --prefix (course/exam titles, usernames) so --flush can remove them
+# and benchmarks/load.py can find the generated students.
+BATCH_SIZE = 1000
+WORDS = (
+    "polity constitution economy budget inflation river monsoon plateau empire revolt treaty "
+    "parliament judiciary federal fiscal monetary climate biodiversity census tribunal amendment"
+).split()
+
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def notes(rng, title, sections=4):
+    parts = [f"# {title}"]
+    for i in range(sections):
+        parts.append(f"## Section {i + 1}")
+        parts.append(" ".join(sentence(rng) for _ in range(6)))
+        parts.append("\n".join(f"- {sentence(rng, 6)}" for _ in range(3)))
+    return "\n\n".join(parts)
+
+
+class Command(BaseCommand):
+    help = "Bulk-generates courses, notes, exams, users, subscriptions and attempt history for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=5)
+        parser.add_argument('--subjects', type=int, default=4, help="Per course.")
+        parser.add_argument('--chapters', type=int, default=5, help="Per subject; each gets notes and a quiz.")
+        parser.add_argument('--exams', type=int, default=3, help="Full mocks per course.")
+        parser.add_argument('--questions', type=int, default=50, help="Per full mock.")
+        parser.add_argument('--quiz-questions', type=int, default=10, help="Per chapter quiz.")
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--attempts', type=int, default=10, help="Completed attempts per user.")
+        parser.add_argument('--paid-ratio', type=float, default=0.5, help="Share of courses that need a subscription.")
+        parser.add_argument('--password', default='bench-pass')
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0, help="Random seed (same seed, same dataset).")
+        parser.add_argument('--flush', action='store_true', help="Delete previously generated rows with this prefix first.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        prefix = options['prefix']
+
+        if options['flush']:
+            self.flush(prefix)
+        elif User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"Benchmark data with prefix '{prefix}' already exists (use --flush).")
+
+        with transaction.atomic():
+            courses = self.create_courses(prefix)
+            chapters = self.create_syllabus(courses)
+            exams = self.create_exams(prefix, courses, chapters)
+            answer_keys = self.create_questions(exams)
+            users = self.create_users(prefix)
+            reachable = self.create_subscriptions(users, courses, exams)
+            attempts = self.create_attempts(users, reachable, answer_keys)
+
+        exam_ids = [exam.id for exam in exams]
+        rebuild_histograms(exam_ids)
+        rebuild_question_stats(exam_ids)
+        build_snapshots([course.id for course in courses])
+        build_notes([chapter.id for chapter in chapters])
+        rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(courses)} courses, {len(chapters)} chapters, {len(exams)} exams, "
+            f"{sum(len(k) for k in answer_keys.values())} questions, {len(users)} users, {attempts} attempts"
+        ))
+
+    def flush(self, prefix):
+        with transaction.atomic():
+            Exam.objects.filter(title__startswith=f"{prefix} ").delete()
+            Course.objects.filter(title__startswith=f"{prefix} ").delete()
+            User.objects.filter(username__startswith=f"{prefix}_").delete()
+
+    # --- CONTENT ---
+    def create_courses(self, prefix):
+        n = self.options['courses']
+        paid = round(n * self.options['paid_ratio'])
+        return Course.objects.bulk_create([
+            Course(title=f"{prefix} Course {i + 1}", description=sentence(self.rng), is_paid=i < paid, price=499 if i < paid else 0)
+            for i in range(n)
+        ])
+
+    def create_syllabus(self, courses):
+        subjects = Subject.objects.bulk_create([
+            Subject(course=course, title=f"Subject {i + 1}", order=i + 1)
+            for course in courses for i in range(self.options['subjects'])
+        ], batch_size=BATCH_SIZE)
+        return Chapter.objects.bulk_create([
+            Chapter(subject=subject, title=f"{subject.title}.{i + 1}", order=i + 1, study_notes=notes(self.rng, f"{subject.title}.{i + 1}"))
+            for subject in subjects for i in range(self.options['chapters'])
+        ], batch_size=BATCH_SIZE)
+
+    def create_exams(self, prefix, courses, chapters):
+        exams = []
+        for course in courses:
+            for i in range(self.options['exams']):
+                exams.append(Exam(title=f"{prefix} Mock {course.id}.{i + 1}", exam_type='MOCK_FULL', course=course,
+                                  duration_minutes=120, total_marks=self.options['questions'] * 2))
+        for chapter in chapters:
+            exams.append(Exam(title=f"{prefix} Quiz {chapter.id}", exam_type='TOPIC_QUIZ', chapter=chapter,
+                              duration_minutes=15, total_marks=self.options['quiz_questions'] * 2))
+        exams = Exam.objects.bulk_create(exams, batch_size=BATCH_SIZE)
+
+        subject_course = dict(Subject.objects.filter(course__in=courses).values_list('id', 'course_id'))
+        course_of = {chapter.id: subject_course[chapter.subject_id] for chapter in chapters}
+        for exam in exams:
+            exam.owner_id = exam.course_id or course_of[exam.chapter_id]
+        return exams
+
+    def create_questions(self, exams):
+        """Returns {exam_id: [(question_id, [option ids], correct option id)]}."""
+        questions = []
+        for exam in exams:
+            count = self.options['questions'] if exam.exam_type == 'MOCK_FULL' else self.options['quiz_questions']
+            questions += [Question(exam=exam, text_content=sentence(self.rng, 16) + "?", marks=2.0, explanation=sentence(self.rng))
+                          for _ in range(count)]
+        questions = Question.objects.bulk_create(questions, batch_size=BATCH_SIZE)
+
+        options = []
+        for question in questions:
+            right = self.rng.randrange(4)
+            options += [Option(question=question, text=sentence(self.rng, 4), is_correct=(i == right)) for i in range(4)]
+        options = Option.objects.bulk_create(options, batch_size=BATCH_SIZE)
+
+        keys = {}
+        for i, question in enumerate(questions):
+            choices = options[i * 4:(i + 1) * 4]
+            correct = next(option.id for option in choices if option.is_correct)
+            keys.setdefault(question.exam_id, []).append((question.id, [option.id for option in choices], correct))
+        return keys
+
+    # --- STUDENTS ---
+    def create_users(self, prefix):
+        password = make_password(self.options['password'])  # One hash for everyone: hashing dominates otherwise
+        return User.objects.bulk_create([
+            User(username=f"{prefix}_{i + 1:05d}", password=password, first_name="Student", last_name=str(i + 1))
+            for i in range(self.options['users'])
+        ], batch_size=BATCH_SIZE)
+
+    def create_subscriptions(self, users, courses, exams):
+        """Subscribes each user to one or two paid courses; returns {user_id: [exams they may take]}."""
+        paid = [course for course in courses if course.is_paid]
+        free_ids = {course.id for course in courses if not course.is_paid}
+        rows, reachable = [], {}
+        for user in users:
+            owned = set(free_ids)
+            for course in self.rng.sample(paid, min(len(paid), self.rng.randint(1, 2))):
+                rows.append(UserSubscription(user=user, course=course, active=True))
+                owned.add(course.id)
+            reachable[user.id] = [exam for exam in exams if exam.owner_id in owned]
+        UserSubscription.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        return reachable
+
+    def create_attempts(self, users, reachable, answer_keys):
+        now = timezone.now()
+        created = 0
+        for start in range(0, len(users), 50):
+            attempts, answers = [], []
+            for user in users[start:start + 50]:
+                skill = self.rng.uniform(0.3, 0.9)
+                for _ in range(self.options['attempts'] if reachable[user.id] else 0):
+                    exam = self.rng.choice(reachable[user.id])
+                    score, picked = 0.0, []
+                    for question_id, option_ids, correct in answer_keys.get(exam.id, []):
+                        roll = self.rng.random()
+                        if roll < 0.1:
+                            picked.append((question_id, None))
+                            continue
+                        option_id = correct if roll < 0.1 + 0.9 * skill else self.rng.choice([o for o in option_ids if o != correct])
+                        score += 2.0 if option_id == correct else -2.0 * exam.negative_marking_ratio
+                        picked.append((question_id, option_id))
+                    started = now - timedelta(days=self.rng.uniform(0, 180))
+                    attempts.append(ExamAttempt(user=user, exam=exam, is_completed=True, total_score=max(0, score),
+                                                submit_time=started + timedelta(minutes=exam.duration_minutes * 0.8)))
+                    attempts[-1].seeded_start = started
+                    answers.append(picked)
+
+            attempts = ExamAttempt.objects.bulk_create(attempts, batch_size=BATCH_SIZE)
+            # auto_now_add overwrote start_time on insert; spread the history back over the past months
+            for attempt in attempts: attempt.start_time = attempt.seeded_start
+            ExamAttempt.objects.bulk_update(attempts, ['start_time'], batch_size=500)
+            StudentResponse.objects.bulk_create([
+                StudentResponse(attempt=attempt, question_id=question_id, selected_option_id=option_id,
+                                status='answered' if option_id else 'skipped')
+                for attempt, picked in zip(attempts, answers) for question_id, option_id in picked
+            ], batch_size=BATCH_SIZE)
+            created += len(attempts)
+        return created
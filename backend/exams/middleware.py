@@ -0,0 +1,73 @@
+import re
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only without it
+    brotli = None
+
+# --- RESPONSE COMPRESSION ---
+# Negotiated Brotli / gzip for large text responses. Responses that already carry a
+# Content-Encoding (the pre-gzipped exam papers) pass through untouched, and so do small
+# or streaming ones. Brotli runs at a low quality: it still beats gzip on JSON at a
+# fraction of the CPU of the default (11).
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript')
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+_coding = re.compile(r'\s*([a-z0-9*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?', re.I)
+
+
+def accepted_encodings(header):
+    # {coding: q} from an Accept-Encoding header
+    accepted = {}
+    for part in header.split(','):
+        match = _coding.match(part)
+        if not match: continue
+        try:
+            accepted[match.group(1).lower()] = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+    return accepted
+
+
+def choose_encoding(header, offers=None):
+    # offers: codings the caller has bytes for, best first (default: everything available here)
+    accepted = accepted_encodings(header)
+    offers = offers or (['br'] if brotli else []) + ['gzip']
+    q = {coding: accepted.get(coding, accepted.get('*', 0.0)) for coding in offers}
+    best = max(offers, key=lambda coding: q[coding])  # ties keep the order above (br first)
+    return best if q[best] > 0 else None
+
+
+def compress(content, coding):
+    if coding == 'br': return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'): return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES): return response
+        if len(response.content) < settings.COMPRESS_MIN_SIZE: return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if not coding: return response
+
+        compressed = compress(response.content, coding)
+        if len(compressed) >= len(response.content): return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = coding
+        # A strong ETag names one exact byte sequence; the compressed body is a different one
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'): response['ETag'] = 'W/' + etag
+        return response
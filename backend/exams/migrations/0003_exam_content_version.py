@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:38
+
+import exams.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0002_user_last_logout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='content_version',
+            field=models.CharField(default=exams.models.new_content_version, editable=False, max_length=32),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_histograms(apps, schema_editor):
+    # Same bucketing as exams.ranking (hundredths of a mark)
+    ExamAttempt = apps.get_model('exams', 'ExamAttempt')
+    ExamScoreBucket = apps.get_model('exams', 'ExamScoreBucket')
+    counts = {}
+    rows = ExamAttempt.objects.filter(is_completed=True).values('exam_id', 'total_score').annotate(n=models.Count('id'))
+    for row in rows.iterator():
+        key = (row['exam_id'], int(round(row['total_score'] * 100)))
+        counts[key] = counts.get(key, 0) + row['n']
+    ExamScoreBucket.objects.bulk_create(
+        [ExamScoreBucket(exam_id=exam_id, bucket=bucket, count=n) for (exam_id, bucket), n in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0006_ai_result_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamScoreBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='examattempt',
+            index=models.Index(fields=['exam', 'is_completed', '-total_score'], name='attempt_leaderboard_idx'),
+        ),
+        migrations.AddField(
+            model_name='examscorebucket',
+            name='exam',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_buckets', to='exams.exam'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='examscorebucket',
+            unique_together={('exam', 'bucket')},
+        ),
+        migrations.RunPython(backfill_histograms, migrations.RunPython.noop),
+    ]
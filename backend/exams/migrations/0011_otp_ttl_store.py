@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F, Max
+from django.db.models.functions import Now
+
+
+def keep_live_codes(apps, schema_editor):
+    # Codes were valid for 5 minutes: drop the expired backlog and all but the newest per phone
+    OTP = apps.get_model('exams', 'OTP')
+    OTP.objects.update(expires_at=F('created_at') + timedelta(seconds=300))
+    OTP.objects.filter(expires_at__lte=Now()).delete()
+    newest = OTP.objects.values('phone_number').annotate(newest=Max('id')).values('newest')
+    OTP.objects.exclude(id__in=newest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0010_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='otp',
+            name='otp_lookup_idx',
+        ),
+        migrations.RemoveField(
+            model_name='otp',
+            name='is_verified',
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(keep_live_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='otp',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='otp',
+            name='phone_number',
+            field=models.CharField(max_length=15, unique=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0011_otp_ttl_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChapterNotes',
+            fields=[
+                ('chapter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rendered_notes', serialize=False, to='exams.chapter')),
+                ('version', models.CharField(max_length=32)),
+                ('sections', models.BinaryField()),
+                ('section_count', models.PositiveIntegerField(default=0)),
+                ('source_size', models.PositiveIntegerField(default=0)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
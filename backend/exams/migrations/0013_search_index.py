@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Full-text index over exams_searchdocument, per database vendor (other vendors fall back
+# to LIKE scans in search.py). SQLite: an external-content FTS5 table kept in step by
+# triggers. Postgres: a weighted tsvector generated column with a GIN index.
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE exams_search_fts USING fts5("
+    "title, body, content='exams_searchdocument', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER exams_search_fts_ai AFTER INSERT ON exams_searchdocument BEGIN "
+    "INSERT INTO exams_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER exams_search_fts_ad AFTER DELETE ON exams_searchdocument BEGIN "
+    "INSERT INTO exams_search_fts(exams_search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER exams_search_fts_au AFTER UPDATE OF title, body ON exams_searchdocument BEGIN "
+    "INSERT INTO exams_search_fts(exams_search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO exams_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS exams_search_fts_au",
+    "DROP TRIGGER IF EXISTS exams_search_fts_ad",
+    "DROP TRIGGER IF EXISTS exams_search_fts_ai",
+    "DROP TABLE IF EXISTS exams_search_fts",
+]
+POSTGRES_INDEX = [
+    "ALTER TABLE exams_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(body, '')), 'B')) STORED",
+    "CREATE INDEX search_vector_idx ON exams_searchdocument USING GIN (search_vector)",
+]
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS search_vector_idx",
+    "ALTER TABLE exams_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_for_vendor(sqlite, postgresql):
+    def run(apps, schema_editor):
+        for statement in {'sqlite': sqlite, 'postgresql': postgresql}.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0012_chapter_notes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('question', 'Question'), ('chapter', 'Chapter notes')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('exam_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('chapter_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('title', models.TextField()),
+                ('body', models.TextField(blank=True, default='')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exams.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['exam_id'], name='search_document_exam_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='search_document_unique')],
+            },
+        ),
+        migrations.RunPython(run_for_vendor(SQLITE_INDEX, POSTGRES_INDEX), run_for_vendor(SQLITE_DROP, POSTGRES_DROP)),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:36
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0014_ai_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='questionstats',
+            name='attempts',
+        ),
+    ]
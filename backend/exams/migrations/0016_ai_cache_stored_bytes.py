@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import Sum
+
+
+def count_stored_bytes(apps, schema_editor):
+    # ai_cache now keeps the stored byte total as a counter: start it from the rows already cached
+    AIResultCache = apps.get_model('exams', 'AIResultCache')
+    AICacheCounter = apps.get_model('exams', 'AICacheCounter')
+    total = AIResultCache.objects.aggregate(total=Sum('size'))['total'] or 0
+    AICacheCounter.objects.update_or_create(name='stored_bytes', defaults={'value': total})
+
+
+def drop_stored_bytes(apps, schema_editor):
+    apps.get_model('exams', 'AICacheCounter').objects.filter(name='stored_bytes').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0015_question_stats_attempts_from_histogram'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_stored_bytes, drop_stored_bytes),
+    ]
@@ -30,17 +30,17 @@ class User(AbstractUser):
         return self.phone_number or self.username
 
 class OTP(models.Model):
-    phone_number = models.CharField(max_length=15)
+    # One live code per phone: sending replaces it, verifying deletes it (see otp.py)
+    phone_number = models.CharField(max_length=15, unique=True)
     otp_code = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
-    is_verified = models.BooleanField(default=False)
+    expires_at = models.DateTimeField(db_index=True)
 
     class Meta:
         app_label = 'exams'
 
-    def is_valid(self):
-        # Valid for 5 minutes
-        return (timezone.now() - self.created_at).total_seconds() < 300
+def new_content_version():
+    return uuid.uuid4().hex
 
 # ... (Course, Subject, Chapter, Topic, Exam, etc.) ...
 class Course(models.Model):
@@ -96,6 +96,9 @@ class Exam(models.Model):
     duration_minutes = models.IntegerField(default=30)
     total_marks = models.IntegerField(default=100)
     negative_marking_ratio = models.FloatField(default=0.25)
+    # Changes whenever the exam or any of its questions/options change (see signals.py).
+    # A fresh token rather than a counter, so a stale admin save can never bring back an old version.
+    content_version = models.CharField(max_length=32, default=new_content_version, editable=False)
     class Meta: app_label = 'exams'
     def __str__(self): return f"{self.get_exam_type_display()} - {self.title}"
 
@@ -114,13 +117,57 @@ class Option(models.Model):
     class Meta: app_label = 'exams'
     def __str__(self): return self.text
 
+class CourseSnapshot(models.Model):
+    # Materialized CourseSerializer output (JSON text), rebuilt whenever the course tree changes.
+    # See snapshots.py; the version token keys the cached copy of the payload.
+    course = models.OneToOneField(Course, primary_key=True, related_name='snapshot', on_delete=models.CASCADE)
+    version = models.CharField(max_length=32, default=new_content_version)
+    payload = models.TextField()
+    built_at = models.DateTimeField(auto_now=True)
+    class Meta: app_label = 'exams'
+    def __str__(self): return f"Snapshot - {self.course_id}"
+
+class ChapterNotes(models.Model):
+    # Chapter.study_notes rendered to sanitized HTML sections (zlib-compressed JSON), rebuilt
+    # whenever the notes change. See notes.py; version is a hash of the source.
+    chapter = models.OneToOneField(Chapter, primary_key=True, related_name='rendered_notes', on_delete=models.CASCADE)
+    version = models.CharField(max_length=32)
+    sections = models.BinaryField()
+    section_count = models.PositiveIntegerField(default=0)
+    source_size = models.PositiveIntegerField(default=0)
+    built_at = models.DateTimeField(auto_now=True)
+    class Meta: app_label = 'exams'
+    def __str__(self): return f"Notes - {self.chapter_id}"
+
+class SearchDocument(models.Model):
+    # One row per searchable question / chapter, mirrored into the full-text index (see
+    # search.py): an FTS5 table on SQLite, a generated tsvector column + GIN index on Postgres.
+    KINDS = (('question', 'Question'), ('chapter', 'Chapter notes'))
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.PositiveIntegerField()
+    course = models.ForeignKey(Course, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    exam_id = models.PositiveIntegerField(null=True, blank=True)
+    chapter_id = models.PositiveIntegerField(null=True, blank=True)
+    title = models.TextField()
+    body = models.TextField(blank=True, default="")
+    class Meta:
+        app_label = 'exams'
+        constraints = [models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_unique')]
+        indexes = [models.Index(fields=['exam_id'], name='search_document_exam_idx')]
+    def __str__(self): return f"{self.kind} {self.object_id}"
+
 class UserSubscription(models.Model):
     # FIX: Use settings.AUTH_USER_MODEL to avoid lazy reference errors
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     active = models.BooleanField(default=True)
     purchase_date = models.DateTimeField(auto_now_add=True)
-    class Meta: app_label = 'exams'
+    class Meta:
+        indexes = [
+            # Entitlements read (user, active) -> course ids straight off this index
+            models.Index(fields=['user', 'active', 'course'], name='subscription_lookup_idx'),
+        ]
+        app_label = 'exams'
 
 class AdBanner(models.Model):
     title = models.CharField(max_length=100)
@@ -142,7 +189,16 @@ class ExamAttempt(models.Model):
     submit_time = models.DateTimeField(null=True, blank=True)
     total_score = models.FloatField(default=0.0)
     is_completed = models.BooleanField(default=False)
-    class Meta: app_label = 'exams'
+    class Meta:
+        indexes = [
+            models.Index(fields=['exam', 'is_completed', '-total_score'], name='attempt_leaderboard_idx'),
+            # History pages: keyset on (start_time, id) per user, optionally by completion status
+            models.Index(fields=['user', '-start_time', '-id'], name='attempt_history_idx'),
+            models.Index(fields=['user', 'is_completed', '-start_time', '-id'], name='attempt_history_status_idx'),
+            # A user's attempts at one exam (leaderboard "me")
+            models.Index(fields=['user', 'exam', 'is_completed'], name='attempt_user_exam_idx'),
+        ]
+        app_label = 'exams'
     def __str__(self): return f"{self.user} - {self.exam.title}"
 
 class StudentResponse(models.Model):
@@ -152,4 +208,85 @@ class StudentResponse(models.Model):
     status = models.CharField(max_length=20, default='answered')
     class Meta: 
         unique_together = ('attempt', 'question')
-        app_label = 'exams'
\ No newline at end of file
+        app_label = 'exams'
+# --- AI GENERATION JOBS ---
+# Queued by AIGeneratorViewSet and executed by `manage.py run_ai_worker`
+class AIGenerationJob(models.Model):
+    KIND_CHOICES = (('text', 'Text'), ('image', 'Image'))
+    STATUS_CHOICES = (('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'))
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    params = models.JSONField(default=dict, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Bumped while a worker still holds the job
+    finished_at = models.DateTimeField(null=True, blank=True)
+    class Meta:
+        indexes = [models.Index(fields=['status', 'id'])]
+        app_label = 'exams'
+    def __str__(self): return f"{self.kind} job #{self.id} ({self.status})"
+
+class AIJobImage(models.Model):
+    job = models.ForeignKey(AIGenerationJob, related_name='images', on_delete=models.CASCADE)
+    name = models.CharField(max_length=255, blank=True)
+    data = models.BinaryField()
+    order = models.IntegerField(default=0)
+    class Meta:
+        ordering = ['order', 'id']
+        app_label = 'exams'
+
+# --- AI RESULT CACHE ---
+# Content-addressed: key = sha256 of the notes text / image bytes + generation params + model
+class AIResultCache(models.Model):
+    key = models.CharField(max_length=64, primary_key=True)
+    kind = models.CharField(max_length=10)
+    model_name = models.CharField(max_length=50)
+    result = models.JSONField()
+    size = models.PositiveIntegerField(default=0)
+    input_chars = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+    class Meta: app_label = 'exams'
+
+class AICacheCounter(models.Model):
+    name = models.CharField(max_length=30, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    class Meta: app_label = 'exams'
+
+# --- SCORE HISTOGRAM (ranking.py) ---
+# Completed attempts per (exam, score); score stored in hundredths of a mark
+class ExamScoreBucket(models.Model):
+    exam = models.ForeignKey(Exam, related_name='score_buckets', on_delete=models.CASCADE)
+    bucket = models.IntegerField()
+    count = models.IntegerField(default=0)
+    class Meta:
+        unique_together = ('exam', 'bucket')
+        app_label = 'exams'
+
+# --- QUESTION ANALYTICS (question_stats.py) ---
+# Running totals over completed attempts, bumped on submit; skipped = exam attempts - answered
+class QuestionStats(models.Model):
+    question = models.OneToOneField(Question, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    exam = models.ForeignKey(Exam, related_name='question_stats', on_delete=models.CASCADE)
+    answered = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    class Meta:
+        verbose_name_plural = 'question stats'
+        app_label = 'exams'
+    def __str__(self): return f"Stats for question {self.question_id}"
+
+class OptionStats(models.Model):
+    option = models.OneToOneField(Option, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, related_name='option_stats', on_delete=models.CASCADE)
+    picks = models.IntegerField(default=0)
+    class Meta:
+        verbose_name_plural = 'option stats'
+        app_label = 'exams'
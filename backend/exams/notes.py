@@ -0,0 +1,228 @@
+import re
+import zlib
+import hashlib
+from html import escape
+from html.parser import HTMLParser
+
+import orjson
+import markdown
+from django.core.cache import cache
+
+from .models import Chapter, ChapterNotes
+from .cache_utils import LocalLRU
+
+# --- PRE-RENDERED STUDY NOTES ---
+# Chapter.study_notes (Markdown with inline HTML and $TeX$) is rendered once per change
+# to sanitized HTML, split into sections at top-level h1/h2 headings and stored
+# zlib-compressed in ChapterNotes. The notes endpoint serves pages of sections from that
+# row, keyed by a hash of the source so the ETag survives rebuilds. Math is left as TeX
+# in <span class="math"> for the client to typeset. Bump NOTES_FORMAT when the output
+# changes, then run `manage.py rebuild_chapter_notes`.
+NOTES_FORMAT = "2"
+SPLIT_TAGS = {'h1', 'h2'}
+CACHE_TIMEOUT = 60 * 60 * 24
+
+_local = LocalLRU(maxsize=64)
+
+
+def notes_version(source):
+    return hashlib.sha1(f"{NOTES_FORMAT}\0{source}".encode()).hexdigest()[:20]
+
+
+def notes_etag(version, title, start, count):
+    # The page also carries the chapter title, which the notes version does not cover
+    title_hash = hashlib.sha1(title.encode()).hexdigest()[:8]
+    return f'"{version}-{title_hash}-{start}-{count}"'
+
+
+# --- SANITIZER ---
+# Allowlist re-serialization: unknown tags are dropped (their text kept, escaped),
+# script-like elements are dropped with their content, attributes are filtered per tag
+# and URLs must use a safe scheme.
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'b', 'em', 'i', 'u', 's', 'del', 'ins',
+    'sub', 'sup', 'mark', 'small', 'code', 'pre', 'kbd', 'blockquote', 'ul', 'ol', 'li', 'dl', 'dt', 'dd',
+    'table', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td', 'caption', 'a', 'img', 'span', 'div',
+    'figure', 'figcaption', 'abbr',
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+DROP_WITH_CONTENT = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'textarea', 'select', 'svg', 'math'}
+GLOBAL_ATTRS = {'id', 'class', 'title'}
+TAG_ATTRS = {
+    'a': {'href'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'ol': {'start'},
+    'th': {'colspan', 'rowspan', 'align'},
+    'td': {'colspan', 'rowspan', 'align'},
+}
+URL_ATTRS = {'href', 'src'}
+SAFE_URL = re.compile(r'^(?:https?:|mailto:|#|/|\./|\.\./|[^:/?#]*(?:[/?#]|$))', re.I)
+SAFE_IMAGE_DATA = re.compile(r'^data:image/(?:png|jpe?g|gif|webp);base64,[a-z0-9+/=\s]+$', re.I)
+
+
+def safe_url(tag, value):
+    value = value.strip()
+    # Browsers ignore embedded whitespace/control chars in schemes ("java\tscript:")
+    probe = re.sub(r'[\x00-\x20]', '', value)
+    if tag == 'img' and SAFE_IMAGE_DATA.match(probe): return True
+    return bool(SAFE_URL.match(probe))
+
+
+class SectionSanitizer(HTMLParser):
+    """Sanitizes rendered HTML and splits it at top-level SPLIT_TAGS headings."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sections = []
+        self.out = []
+        self.open = []        # allowed tags currently open
+        self.dropping = 0     # depth inside a DROP_WITH_CONTENT element
+        self.heading = None   # [tag, text parts] while inside a splitting heading
+        self.new_section(None, '', 0)
+
+    def new_section(self, title, anchor, level):
+        self.out = []
+        self.sections.append({'title': title, 'anchor': anchor, 'level': level, 'parts': self.out})
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropping or tag in DROP_WITH_CONTENT:
+            if tag not in VOID_TAGS: self.dropping += 1
+            return
+        if tag not in ALLOWED_TAGS: return
+
+        kept = []
+        for name, value in attrs:
+            if value is None or (name not in GLOBAL_ATTRS and name not in TAG_ATTRS.get(tag, ())): continue
+            if name in URL_ATTRS and not safe_url(tag, value): continue
+            kept.append(f' {name}="{escape(value)}"')
+
+        if tag in SPLIT_TAGS and not self.open:
+            anchor = dict(attrs).get('id') or ''
+            self.new_section('', anchor, int(tag[1]))
+            self.heading = [tag, []]
+
+        self.out.append(f"<{tag}{''.join(kept)}>")
+        if tag not in VOID_TAGS: self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing: nothing to drop and no depth to open (<svg><circle/></svg>)
+        if self.dropping or tag in DROP_WITH_CONTENT: return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open and self.open[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            if tag in DROP_WITH_CONTENT or tag not in VOID_TAGS: self.dropping -= 1
+            return
+        if tag not in self.open: return
+        # Close anything left open inside it
+        while self.open:
+            open_tag = self.open.pop()
+            self.out.append(f"</{open_tag}>")
+            if open_tag == tag: break
+        if self.heading and tag == self.heading[0] and not self.open:
+            self.sections[-1]['title'] = ''.join(self.heading[1]).strip()
+            self.heading = None
+
+    def handle_data(self, data):
+        if self.dropping: return
+        if self.heading: self.heading[1].append(data)
+        self.out.append(escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        while self.open: self.out.append(f"</{self.open.pop()}>")
+        sections = []
+        for section in self.sections:
+            html = ''.join(section.pop('parts')).strip()
+            if html: sections.append({**section, 'html': html})
+        return sections
+
+
+# --- RENDERING ---
+# $$display$$ and $inline$ spans are swapped for placeholders before Markdown runs, so
+# underscores and asterisks inside TeX are not read as emphasis.
+DISPLAY_MATH = re.compile(r'\$\$(.+?)\$\$', re.S)
+INLINE_MATH = re.compile(r'(?<![\\$])\$(?![\s$])([^\n$]+?)(?<![\s\\])\$')
+PLACEHOLDER = re.compile(r'MATHX(\d+)X')
+
+
+def render_sections(source):
+    """[{title, anchor, level, html}] for a notes document."""
+    math = []
+
+    def stash(display):
+        def replace(match):
+            math.append((display, match.group(1).strip()))
+            return f"MATHX{len(math) - 1}X"
+        return replace
+
+    text = DISPLAY_MATH.sub(stash(True), source or '')
+    text = INLINE_MATH.sub(stash(False), text)
+    html = markdown.markdown(text, extensions=['extra', 'sane_lists', 'toc'], output_format='html')
+
+    parser = SectionSanitizer()
+    parser.feed(html)
+    sections = parser.result()
+
+    def typeset(match):
+        display, tex = math[int(match.group(1))]
+        return f'<span class="math{" math-display" if display else ""}">{escape(tex, quote=False)}</span>'
+    for section in sections:
+        section['html'] = PLACEHOLDER.sub(typeset, section['html'])
+        if section['title']: section['title'] = PLACEHOLDER.sub(lambda m: math[int(m.group(1))][1], section['title'])
+    return sections
+
+
+# --- STORAGE ---
+def pack(sections): return zlib.compress(orjson.dumps(sections), 6)
+def unpack(blob): return orjson.loads(zlib.decompress(bytes(blob)))
+
+
+def _key(chapter_id, version): return f"chapter_notes:{chapter_id}:{version}"
+
+
+def build_notes(chapter_ids):
+    """Renders and stores notes for the chapters; returns {chapter_id: (version, sections)}."""
+    built, rows = {}, []
+    for chapter_id, source in Chapter.objects.filter(id__in=chapter_ids).values_list('id', 'study_notes').iterator():
+        version, sections = notes_version(source), render_sections(source)
+        built[chapter_id] = (version, sections)
+        rows.append(ChapterNotes(chapter_id=chapter_id, version=version, sections=pack(sections),
+                                 section_count=len(sections), source_size=len(source or '')))
+    if rows:
+        ChapterNotes.objects.bulk_create(
+            rows, batch_size=200, update_conflicts=True, unique_fields=['chapter'],
+            update_fields=['version', 'sections', 'section_count', 'source_size', 'built_at'],
+        )
+    return built
+
+
+def invalidate_notes(chapter_ids):
+    # Bulk writes skip the Chapter signal: drop the rows and let the next read rebuild them
+    chapter_ids = [i for i in chapter_ids if i]
+    if chapter_ids: ChapterNotes.objects.filter(chapter_id__in=chapter_ids).delete()
+
+
+def get_notes(chapter_id, version):
+    """
+    (version, sections) for a chapter. `version` is the stored ChapterNotes.version
+    (or None when there is no row yet), read alongside the chapter itself.
+    """
+    if version:
+        key = _key(chapter_id, version)
+        sections = _local.get(key)
+        if sections is None:
+            blob = cache.get(key)
+            if blob is None:
+                blob = ChapterNotes.objects.filter(chapter_id=chapter_id, version=version).values_list('sections', flat=True).first()
+                if blob is not None: cache.set(key, bytes(blob), CACHE_TIMEOUT)
+            if blob is not None:
+                sections = unpack(blob)
+                _local.set(key, sections)
+        if sections is not None: return version, sections
+
+    version, sections = build_notes([chapter_id]).get(chapter_id, (None, []))
+    if version: _local.set(_key(chapter_id, version), sections)
+    return version, sections
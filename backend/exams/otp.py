@@ -0,0 +1,77 @@
+import math
+import time
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import OTP
+
+# --- OTP STORE ---
+# One row per phone (unique key). Sending upserts the code and its expiry, verifying is
+# a single conditional DELETE on that key, so a code works once and only until it
+# expires. Codes that were never used are swept by `manage.py purge_expired_otps`.
+PURGE_BATCH = 1000
+
+
+def issue_otp(phone):
+    code = str(1000 + secrets.randbelow(9000))
+    now = timezone.now()
+    OTP.objects.bulk_create(
+        [OTP(phone_number=phone, otp_code=code, expires_at=now + timedelta(seconds=settings.OTP_TTL_SECONDS))],
+        update_conflicts=True, unique_fields=['phone_number'], update_fields=['otp_code', 'created_at', 'expires_at'],
+    )
+    return code
+
+
+def consume_otp(phone, code):
+    """True if `code` is the phone's live code, which is then used up."""
+    if not phone or not code: return False
+    deleted, _ = OTP.objects.filter(phone_number=phone, otp_code=str(code), expires_at__gt=timezone.now()).delete()
+    return deleted > 0
+
+
+def purge_expired(batch_size=PURGE_BATCH):
+    # Short DELETEs by primary key so the sweep never holds a long lock on the table
+    purged = 0
+    while True:
+        ids = list(OTP.objects.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size])
+        if not ids: return purged
+        purged += OTP.objects.filter(id__in=ids).delete()[0]
+
+
+# --- RATE LIMITS ---
+# Token buckets in the shared cache, one per phone and one per client IP for each action.
+# A bucket holds `capacity` tokens and refills fully over OTP_LIMIT_WINDOW, so short
+# bursts pass while a flood is held to the refill rate without touching the database.
+# Read-modify-write on the cache: concurrent requests can slip an extra token through.
+def take_token(key, capacity, window):
+    """Takes one token. Returns 0 when allowed, else the seconds until a token is available."""
+    now = time.time()
+    rate = capacity / window
+    tokens, updated = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens < 1:
+        cache.set(key, (tokens, now), window)
+        return (1 - tokens) / rate
+    cache.set(key, (tokens - 1, now), window)
+    return 0
+
+
+def throttle(action, phone, ip):
+    """action is 'send' or 'verify'. Returns 0 when allowed, else whole seconds to wait."""
+    window = settings.OTP_LIMIT_WINDOW
+    phone_limit = settings.OTP_SEND_PHONE_LIMIT if action == 'send' else settings.OTP_VERIFY_PHONE_LIMIT
+    # The IP bucket goes first so a flood across many phones never reaches the per-phone buckets
+    wait = take_token(f"otp_rate:{action}:ip:{ip}", settings.OTP_IP_LIMIT, window)
+    if not wait and phone:
+        wait = take_token(f"otp_rate:{action}:phone:{phone}", phone_limit, window)
+    return math.ceil(wait)
+
+
+def throttle_new_phone():
+    # Codes for numbers without an account are rows nobody may ever use: one shared bucket
+    # caps how many a flood can create, however many IPs or numbers it rotates through
+    return math.ceil(take_token("otp_rate:send:new_phone", settings.OTP_NEW_PHONE_LIMIT, settings.OTP_LIMIT_WINDOW))
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+# --- KEYSET PAGINATION ---
+# Cursor pages seek on the ordering columns instead of OFFSET/COUNT, so page N costs the
+# same as page 1 as long as an index covers (filter columns..., ordering...).
+
+
+class HistoryCursorPagination(CursorPagination):
+    # Backed by attempt_history_idx / attempt_history_status_idx
+    ordering = ('-start_time', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
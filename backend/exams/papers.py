@@ -0,0 +1,48 @@
+import gzip
+import hashlib
+
+from django.core.cache import cache
+
+from .models import Exam, new_content_version
+from .serializers import ExamSerializer
+from .cache_utils import LocalLRU
+from .renderers import dumps
+
+# --- PRE-SERIALIZED EXAM PAPERS ---
+# The nested exam JSON is rendered once per Exam.content_version and kept as bytes
+# (plain + gzip), so thousands of students opening one paper cost a single render.
+CACHE_TIMEOUT = 60 * 60 * 6
+
+_local = LocalLRU(maxsize=32)
+
+
+def bump_content_version(*exam_ids):
+    # Invalidates every cache keyed on the exam's content (papers, answer keys)
+    exam_ids = [i for i in exam_ids if i]
+    if exam_ids:
+        Exam.objects.filter(id__in=exam_ids).update(content_version=new_content_version())
+
+
+def render_paper(exam):
+    full_exam = Exam.objects.prefetch_related('questions__options').get(id=exam.id)
+    raw = dumps(ExamSerializer(full_exam).data)
+    digest = hashlib.sha1(raw).hexdigest()[:20]
+    return {
+        'etag': f'"{digest}"',
+        'raw': raw,
+        # Strong ETags must differ per content-coding
+        'gzip_etag': f'"{digest}-gz"',
+        'gzip': gzip.compress(raw, compresslevel=6),
+    }
+
+
+def get_paper(exam):
+    key_name = f"exam_paper:{exam.id}:{exam.content_version}"
+    paper = _local.get(key_name)
+    if paper is None:
+        paper = cache.get(key_name)
+        if paper is None:
+            paper = render_paper(exam)
+            cache.set(key_name, paper, CACHE_TIMEOUT)
+        _local.set(key_name, paper)
+    return paper
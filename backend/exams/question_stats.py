@@ -0,0 +1,129 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, When
+
+from .models import Exam, Question, Option, StudentResponse, QuestionStats, OptionStats
+from .ranking import completed_attempts, lock_exams
+
+# --- QUESTION ANALYTICS ---
+# QuestionStats / OptionStats hold running answered / correct / picks totals, so reads
+# never aggregate StudentResponse. A submit bumps only the rows it answered, with two
+# UPDATEs after its transaction commits, so deadline submits never queue on an exam's
+# rows. The attempt count per exam is the score histogram total (ranking.py).
+# Deleting attempts is not tracked: `manage.py rebuild_question_stats` recomputes the
+# totals from StudentResponse, under the same exam row locks as the score histogram rebuild.
+ROWS_READY_TIMEOUT = 60 * 60 * 24
+
+# Flags for the per-exam summary
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+MIN_ATTEMPTS_TO_FLAG = 20
+
+
+def _rows_key(exam_id, version): return f"question_stats_rows:{exam_id}:{version}"
+
+
+def ensure_rows(exam_id, key):
+    """Creates missing zeroed rows for the exam's questions/options, once per content version."""
+    cache_key = _rows_key(exam_id, key['version'])
+    if cache.get(cache_key): return
+    QuestionStats.objects.bulk_create(
+        [QuestionStats(question_id=q_id, exam_id=exam_id) for q_id in key['questions']],
+        batch_size=500, ignore_conflicts=True,
+    )
+    OptionStats.objects.bulk_create(
+        [OptionStats(option_id=opt_id, question_id=q_id) for opt_id, (q_id, _) in key['options'].items()],
+        batch_size=500, ignore_conflicts=True,
+    )
+    cache.set(cache_key, True, ROWS_READY_TIMEOUT)
+
+
+def record_attempt(exam_id, key, selected):
+    """Adds one completed attempt's answers. selected = {question_id: option_id or None}, already validated."""
+    picked = {q_id: opt_id for q_id, opt_id in selected.items() if opt_id is not None and q_id in key['questions']}
+    if not picked: return
+    correct = [q_id for q_id, opt_id in picked.items() if key['options'].get(opt_id, (None, False))[1]]
+    right = Case(When(question_id__in=correct, then=1), default=0, output_field=IntegerField()) if correct else 0
+
+    QuestionStats.objects.filter(question_id__in=list(picked)).update(answered=F('answered') + 1, correct=F('correct') + right)
+    OptionStats.objects.filter(option_id__in=list(picked.values())).update(picks=F('picks') + 1)
+
+
+def question_report(exam_id):
+    """Per-question rows plus an exam summary, read from the totals tables (three queries)."""
+    attempts = completed_attempts(exam_id)
+    stats = list(
+        QuestionStats.objects.filter(exam_id=exam_id).select_related('question').order_by('question_id')
+        .only('question_id', 'answered', 'correct', 'question__text_content')
+    )
+    options = {}
+    for row in OptionStats.objects.filter(question__exam_id=exam_id).select_related('option').order_by('option_id').only(
+        'option_id', 'question_id', 'picks', 'option__text', 'option__is_correct'
+    ):
+        options.setdefault(row.question_id, []).append({
+            "option_id": row.option_id, "text": row.option.text, "is_correct": row.option.is_correct, "picks": row.picks,
+        })
+
+    questions = []
+    for row in stats:
+        p_correct = row.correct / attempts if attempts else None
+        flags = []
+        if attempts >= MIN_ATTEMPTS_TO_FLAG:
+            if p_correct >= TOO_EASY: flags.append('too_easy')
+            if p_correct <= TOO_HARD: flags.append('too_hard')
+            # A wrong option beating the right one often means a wrong answer key
+            picks = options.get(row.question_id, [])
+            best_right = max((o['picks'] for o in picks if o['is_correct']), default=0)
+            if any(o['picks'] > best_right for o in picks if not o['is_correct']): flags.append('check_key')
+        questions.append({
+            "question_id": row.question_id,
+            "text": row.question.text_content[:200],
+            "attempts": attempts,
+            "answered": row.answered,
+            "skipped": max(0, attempts - row.answered),
+            "correct": row.correct,
+            "p_correct": round(p_correct, 4) if p_correct is not None else None,
+            "flags": flags,
+            "options": options.get(row.question_id, []),
+        })
+
+    seen = attempts * len(questions)
+    summary = {
+        "attempts": attempts,
+        "questions": len(questions),
+        "avg_p_correct": round(sum(q['correct'] for q in questions) / seen, 4) if seen else None,
+        "skip_rate": round(sum(q['skipped'] for q in questions) / seen, 4) if seen else None,
+        "flagged": {flag: [q['question_id'] for q in questions if flag in q['flags']] for flag in ('too_easy', 'too_hard', 'check_key')},
+    }
+    return summary, questions
+
+
+def rebuild_question_stats(exam_ids=None):
+    """Recomputes every total from StudentResponse (backfill / repair). Returns the number of questions written."""
+    exams = Exam.objects.all() if exam_ids is None else Exam.objects.filter(id__in=exam_ids)
+    exam_ids = list(exams.values_list('id', flat=True))
+    with transaction.atomic():
+        lock_exams(exam_ids)
+        # Delete first: on SQLite that takes the write lock before the responses are counted
+        QuestionStats.objects.filter(exam_id__in=exam_ids).delete()
+        OptionStats.objects.filter(question__exam_id__in=exam_ids).delete()
+        completed = Q(attempt__is_completed=True, attempt__exam_id__in=exam_ids)
+
+        responses = StudentResponse.objects.filter(completed, selected_option__isnull=False)
+        answered = dict(responses.values('question_id').annotate(n=Count('id')).order_by().values_list('question_id', 'n'))
+        correct = dict(
+            responses.filter(selected_option__is_correct=True, selected_option__question_id=F('question_id'))
+            .values('question_id').annotate(n=Count('id')).order_by().values_list('question_id', 'n')
+        )
+        picks = dict(responses.values('selected_option_id').annotate(n=Count('id')).order_by().values_list('selected_option_id', 'n'))
+
+        question_rows = [
+            QuestionStats(question_id=q_id, exam_id=exam_id, answered=answered.get(q_id, 0), correct=correct.get(q_id, 0))
+            for q_id, exam_id in Question.objects.filter(exam_id__in=exam_ids).values_list('id', 'exam_id').iterator()
+        ]
+        QuestionStats.objects.bulk_create(question_rows, batch_size=1000)
+        OptionStats.objects.bulk_create([
+            OptionStats(option_id=opt_id, question_id=q_id, picks=picks.get(opt_id, 0))
+            for opt_id, q_id in Option.objects.filter(question__exam_id__in=exam_ids).values_list('id', 'question_id').iterator()
+        ], batch_size=1000)
+    return len(question_rows)
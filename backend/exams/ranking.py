@@ -0,0 +1,106 @@
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Exam, ExamAttempt, ExamScoreBucket
+
+# --- RANK / PERCENTILE ---
+# Each exam keeps a histogram of completed-attempt scores (ExamScoreBucket), bumped by one
+# upsert when an attempt is submitted. Rank = 1 + attempts in higher buckets, so a lookup
+# reads one index range of distinct scores rather than sorting every attempt.
+# Rebuilds run in one transaction holding the exams FOR UPDATE (lock_exams), so they never
+# leave a half-written histogram. Submits take no exam lock: the counters are additive,
+# and a submit landing mid-rebuild is at worst off by one until the next rebuild.
+SCALE = 100  # buckets are hundredths of a mark
+MAX_TOP = 100
+
+
+def bucket_for(score):
+    return int(round(score * SCALE))
+
+
+def lock_exams(exam_ids=None):
+    """Row-locks the exams (all of them when exam_ids is None) until the transaction ends. Rebuilds only."""
+    exams = Exam.objects.select_for_update()
+    if exam_ids is not None: exams = exams.filter(id__in=exam_ids)
+    list(exams.values_list('id', flat=True))
+
+
+def record_score(exam_id, score):
+    # Single-statement upsert (SQLite >= 3.24 / PostgreSQL), safe under concurrent submits
+    table = connection.ops.quote_name(ExamScoreBucket._meta.db_table)
+    count = connection.ops.quote_name('count')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (exam_id, bucket, {count}) VALUES (%s, %s, %s) "
+            f"ON CONFLICT (exam_id, bucket) DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}",
+            [exam_id, bucket_for(score), 1],
+        )
+
+
+def forget_score(exam_id, score):
+    # UPDATE only: while a whole exam is being deleted its buckets may already be gone
+    ExamScoreBucket.objects.filter(exam_id=exam_id, bucket=bucket_for(score)).update(count=F('count') - 1)
+
+
+def completed_attempts(exam_id):
+    return ExamScoreBucket.objects.filter(exam_id=exam_id).aggregate(total=Sum('count'))['total'] or 0
+
+
+def standing(exam_id, score):
+    """{'rank', 'percentile', 'total'} of `score` among the exam's completed attempts (one query)."""
+    totals = ExamScoreBucket.objects.filter(exam_id=exam_id).aggregate(
+        total=Sum('count'),
+        higher=Sum('count', filter=Q(bucket__gt=bucket_for(score))),
+    )
+    total, higher = totals['total'] or 0, totals['higher'] or 0
+    return {
+        'rank': higher + 1,
+        # Share of attempts this score matched or beat
+        'percentile': round(100.0 * (total - higher) / total, 2) if total else 100.0,
+        'total': total,
+    }
+
+
+def display_name(first_name, last_name):
+    # Public boards show a first name and an initial; usernames are phone / email derived
+    first, last = (first_name or '').strip(), (last_name or '').strip()
+    if not first: return f"{last[:1]}." if last else "Student"
+    return f"{first} {last[:1]}." if last else first
+
+
+def top_attempts(exam_id, limit=10):
+    # Reads the first `limit` rows of attempt_leaderboard_idx; ties share a rank
+    rows = ExamAttempt.objects.filter(exam_id=exam_id, is_completed=True).order_by('-total_score', 'submit_time', 'id').values(
+        'id', 'total_score', 'user__first_name', 'user__last_name'
+    )[:min(limit, MAX_TOP)]
+
+    top, rank, previous = [], 0, None
+    for position, row in enumerate(rows, start=1):
+        if row['total_score'] != previous:
+            rank, previous = position, row['total_score']
+        name = display_name(row['user__first_name'], row['user__last_name'])
+        top.append({'rank': rank, 'attempt_id': row['id'], 'name': name, 'score': row['total_score']})
+    return top
+
+
+def rebuild_histograms(exam_ids=None):
+    """Recomputes the buckets from ExamAttempt (backfill / repair). Returns the number of buckets written."""
+    attempts = ExamAttempt.objects.filter(is_completed=True)
+    buckets = ExamScoreBucket.objects.all()
+    if exam_ids is not None:
+        attempts = attempts.filter(exam_id__in=exam_ids)
+        buckets = buckets.filter(exam_id__in=exam_ids)
+
+    with transaction.atomic():
+        lock_exams(exam_ids)
+        # Delete first: on SQLite that takes the write lock before the attempts are counted
+        buckets.delete()
+        counts = {}
+        for row in attempts.values('exam_id', 'total_score').annotate(n=Count('id')).order_by().iterator():
+            key = (row['exam_id'], bucket_for(row['total_score']))
+            counts[key] = counts.get(key, 0) + row['n']
+        ExamScoreBucket.objects.bulk_create(
+            [ExamScoreBucket(exam_id=exam_id, bucket=bucket, count=n) for (exam_id, bucket), n in counts.items()],
+            batch_size=1000,
+        )
+    return len(counts)
@@ -0,0 +1,232 @@
+import re
+from html import escape
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils.html import strip_tags
+
+from .models import Subject, Chapter, Topic, Exam, Question, SearchDocument
+from .entitlements import EXAM_OWNER_PATHS, subscribed_course_ids
+
+# --- FULL-TEXT SEARCH ---
+# Questions (text + explanation) and chapter notes are copied into SearchDocument, which
+# the database indexes itself (migration 0013): an FTS5 table on SQLite, a tsvector/GIN
+# column on Postgres. Signals keep single-row edits (and moves between courses) in
+# step; bulk writers call index_questions / index_chapters, and `manage.py
+# rebuild_search_index` redoes the lot (also needed after any migration that makes
+# SQLite rebuild exams_searchdocument and drops the FTS triggers).
+# Results are ranked by bm25 / ts_rank_cd and filtered to courses the user may open.
+# Scoring is the expensive part (every match is scored), so only the newest
+# RANK_WINDOW matches the user may open are ranked: a query for a word found in half
+# the corpus costs the same as one for a rare word. Responses say when that window cut
+# older matches off (`truncated`), so the client can ask for a narrower query.
+# Benchmark with benchmarks/search.py.
+BATCH_SIZE = 1000
+MAX_TERMS = 8
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+MAX_PAGE = 50        # Offsets past this are not worth ranking for
+RANK_WINDOW = 2000
+MARK = ('\x02', '\x03')
+
+EXAM_OWNER = Coalesce(*[f'{path}__id' for path in EXAM_OWNER_PATHS])
+QUESTION_OWNER = Coalesce(*[f'exam__{path}__id' for path in EXAM_OWNER_PATHS])
+
+
+# --- INDEXING ---
+def _upsert(documents):
+    SearchDocument.objects.bulk_create(
+        documents, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['kind', 'object_id'],
+        update_fields=['course', 'exam_id', 'chapter_id', 'title', 'body'],
+    )
+
+
+def index_questions(question_ids):
+    rows = Question.objects.filter(id__in=question_ids).annotate(owner=QUESTION_OWNER) \
+        .values_list('id', 'exam_id', 'owner', 'text_content', 'explanation')
+    _upsert([
+        SearchDocument(kind='question', object_id=question_id, exam_id=exam_id, course_id=owner, title=text, body=explanation or '')
+        for question_id, exam_id, owner, text, explanation in rows.iterator()
+    ])
+
+
+def index_chapters(chapter_ids):
+    rows = Chapter.objects.filter(id__in=chapter_ids).values_list('id', 'subject__course_id', 'title', 'study_notes')
+    _upsert([
+        SearchDocument(kind='chapter', object_id=chapter_id, chapter_id=chapter_id, course_id=course_id, title=title,
+                       body=strip_tags(notes or ''))
+        for chapter_id, course_id, title, notes in rows.iterator()
+    ])
+
+
+def remove_documents(kind, object_ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=object_ids).delete()
+
+
+def reindex_moved(instance):
+    """A Subject / Chapter / Topic / Exam changed parent: re-derive the course of every row under it."""
+    if isinstance(instance, Subject):
+        index_chapters(list(Chapter.objects.filter(subject_id=instance.id).values_list('id', flat=True)))
+        exams = Exam.objects.filter(Q(subject_id=instance.id) | Q(chapter__subject_id=instance.id) | Q(topic__chapter__subject_id=instance.id))
+    elif isinstance(instance, Chapter):
+        exams = Exam.objects.filter(Q(chapter_id=instance.id) | Q(topic__chapter_id=instance.id))
+    elif isinstance(instance, Topic):
+        exams = Exam.objects.filter(topic_id=instance.id)
+    else:
+        exams = Exam.objects.filter(id=instance.id)
+
+    # Question rows keep their text, only the course moves: one UPDATE per owning course
+    by_owner = {}
+    for exam_id, owner in exams.annotate(owner=EXAM_OWNER).values_list('id', 'owner'):
+        by_owner.setdefault(owner, []).append(exam_id)
+    for owner, exam_ids in by_owner.items():
+        SearchDocument.objects.filter(kind='question', exam_id__in=exam_ids).update(course_id=owner)
+
+
+def rebuild_index(kinds=('question', 'chapter')):
+    """Re-indexes everything of the given kinds and drops rows whose object is gone. Returns the row count."""
+    indexed = 0
+    for kind, model, index in (('question', Question, index_questions), ('chapter', Chapter, index_chapters)):
+        if kind not in kinds: continue
+        ids = list(model.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(ids), BATCH_SIZE):
+            index(ids[start:start + BATCH_SIZE])
+        SearchDocument.objects.filter(kind=kind).exclude(object_id__in=model.objects.values('id')).delete()
+        indexed += len(ids)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO exams_search_fts(exams_search_fts) VALUES ('optimize')")
+    return indexed
+
+
+# --- QUERYING ---
+def parse_terms(query):
+    # Only word characters reach the index: the FTS5 / tsquery syntax is never exposed
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+def fts5_query(terms):
+    parts = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= 3: parts[-1] += '*'  # Prefix match on the word being typed
+    return ' '.join(parts)
+
+
+def tsquery(terms):
+    parts = [f"'{term}'" for term in terms]
+    if len(terms[-1]) >= 3: parts[-1] += ':*'
+    return ' & '.join(parts)
+
+
+def _access_filter(user, alias='d'):
+    # Same rule as entitlements.can_access: no course, a free course, or a subscribed one
+    if user.is_superuser: return '', []
+    owned = sorted(subscribed_course_ids(user))
+    clause = f"{alias}.course_id IS NULL OR NOT c.is_paid"
+    if owned: clause += f" OR {alias}.course_id IN ({', '.join(['%s'] * len(owned))})"
+    return f" AND ({clause})", owned
+
+
+def _highlight(snippet):
+    # Markers come back from the database around matches; escape the text, then mark it up
+    return escape(snippet or '', quote=False).replace(MARK[0], '<mark>').replace(MARK[1], '</mark>')
+
+
+COLUMNS = "d.kind, d.object_id, d.course_id, d.exam_id, d.chapter_id, d.title"
+
+
+def _search_sqlite(terms, kind, access, params, limit, offset):
+    # The window is a rowid lower bound, which FTS5 applies while walking the match list.
+    # The bound is the newest match left out; it is uncorrelated, so SQLite runs it once per use
+    filters = f"{'AND d.kind = %s' if kind else ''} {access}"
+    bound = f"""(
+            SELECT f.rowid FROM exams_search_fts f
+            JOIN exams_searchdocument d ON d.id = f.rowid
+            LEFT JOIN exams_course c ON c.id = d.course_id
+            WHERE f.exams_search_fts MATCH %s {filters}
+            ORDER BY f.rowid DESC LIMIT 1 OFFSET %s
+        )"""
+    sql = f"""
+        SELECT {COLUMNS}, snippet(exams_search_fts, -1, %s, %s, '…', 16), {bound} IS NOT NULL
+        FROM exams_search_fts
+        JOIN exams_searchdocument d ON d.id = exams_search_fts.rowid
+        LEFT JOIN exams_course c ON c.id = d.course_id
+        WHERE exams_search_fts MATCH %s {filters} AND exams_search_fts.rowid > coalesce({bound}, 0)
+        ORDER BY bm25(exams_search_fts, 4.0, 1.0), d.id
+        LIMIT %s OFFSET %s
+    """
+    match, filter_args = fts5_query(terms), ([kind] if kind else []) + params
+    bound_args = [match, *filter_args, RANK_WINDOW]
+    args = [*MARK, *bound_args, match, *filter_args, *bound_args, limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, args)
+        return cursor.fetchall()
+
+
+def _search_postgres(terms, kind, access, params, limit, offset):
+    # Rank and page first; ts_headline re-parses the text, so only run it on the page.
+    # One candidate past the window tells whether it cut anything off
+    sql = f"""
+        WITH candidates AS (
+            SELECT d.* FROM exams_searchdocument d
+            LEFT JOIN exams_course c ON c.id = d.course_id
+            WHERE d.search_vector @@ to_tsquery('english', %s) {'AND d.kind = %s' if kind else ''} {access}
+            ORDER BY d.id DESC LIMIT %s
+        ), ranked AS (
+            SELECT * FROM candidates ORDER BY id DESC LIMIT %s
+        ), page AS (
+            SELECT d.*, ts_rank_cd(d.search_vector, to_tsquery('english', %s)) AS rank FROM ranked d
+            ORDER BY rank DESC, d.id
+            LIMIT %s OFFSET %s
+        )
+        SELECT {COLUMNS}, ts_headline('english', d.title || ' … ' || d.body, to_tsquery('english', %s), %s),
+               (SELECT count(*) FROM candidates) > %s
+        FROM page d
+        ORDER BY d.rank DESC, d.id
+    """
+    query = tsquery(terms)
+    options = f"StartSel={MARK[0]}, StopSel={MARK[1]}, MaxWords=24, MinWords=8, HighlightAll=false"
+    args = [query] + ([kind] if kind else []) + params + [RANK_WINDOW + 1, RANK_WINDOW, query, limit, offset, query, options, RANK_WINDOW]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, args)
+        return cursor.fetchall()
+
+
+def _search_fallback(terms, kind, user, limit, offset):
+    # Databases without a full-text index here: unranked substring match
+    documents = SearchDocument.objects.all()
+    for term in terms:
+        documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    if kind: documents = documents.filter(kind=kind)
+    if not user.is_superuser:
+        documents = documents.filter(Q(course__isnull=True) | Q(course__is_paid=False) | Q(course_id__in=subscribed_course_ids(user)))
+    rows = documents.order_by('id').values_list('kind', 'object_id', 'course_id', 'exam_id', 'chapter_id', 'title', 'body')
+    return [(*row[:6], row[6][:200], False) for row in rows[offset:offset + limit]]  # Nothing is windowed here
+
+
+def search(user, query, kind=None, page=1, page_size=PAGE_SIZE):
+    """
+    Returns (results, has_next, truncated) for one page of ranked matches the user may
+    open. truncated: there were more than RANK_WINDOW matches and only the newest were ranked.
+    """
+    terms = parse_terms(query)
+    if not terms: return [], False, False
+    page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+    page = min(max(1, page), MAX_PAGE)
+    offset = (page - 1) * page_size
+
+    access, params = _access_filter(user)
+    # One extra row tells us whether there is a next page without counting every match
+    if connection.vendor == 'sqlite':
+        rows = _search_sqlite(terms, kind, access, params, page_size + 1, offset)
+    elif connection.vendor == 'postgresql':
+        rows = _search_postgres(terms, kind, access, params, page_size + 1, offset)
+    else:
+        rows = _search_fallback(terms, kind, user, page_size + 1, offset)
+
+    results = [
+        {"kind": kind_, "id": object_id, "course_id": course_id, "exam_id": exam_id, "chapter_id": chapter_id,
+         "title": title[:200], "snippet": _highlight(snippet)}
+        for kind_, object_id, course_id, exam_id, chapter_id, title, snippet, _ in rows[:page_size]
+    ]
+    return results, len(rows) > page_size, bool(rows and rows[0][7])
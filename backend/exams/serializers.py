@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from djoser.serializers import UserSerializer as BaseUserSerializer
-from .models import Course, Subject, Chapter, Topic, Exam, Question, Option, ExamAttempt, AdBanner
+from .models import Course, Subject, Chapter, Topic, Exam, Question, Option, ExamAttempt, AdBanner, AIGenerationJob
 
 # --- CUSTOM USER SERIALIZER ---
 class CustomUserSerializer(BaseUserSerializer):
@@ -10,6 +10,51 @@ class CustomUserSerializer(BaseUserSerializer):
 
 # --- APP SERIALIZERS ---
 
+# --- SPARSE FIELDSETS (?fields= / ?depth=) ---
+def parse_fields(raw):
+    # "id,title,subjects.title" -> {'id': {}, 'title': {}, 'subjects': {'title': {}}}
+    tree = {}
+    for path in raw.split(','):
+        node = tree
+        for part in filter(None, (p.strip() for p in path.split('.'))):
+            node = node.setdefault(part, {})
+    return tree
+
+def sparse_params(request):
+    if request is None or not hasattr(request, 'query_params'): return None, None
+    params = request.query_params
+    spec = parse_fields(params['fields']) if params.get('fields') else None
+    try:
+        depth = max(0, int(params['depth'])) if params.get('depth') else None
+    except ValueError:
+        depth = None
+    return spec, depth
+
+def prune_serializer(serializer, spec, depth):
+    # Drops fields not named in spec, and nested serializers deeper than depth
+    for name in list(serializer.fields):
+        if spec and name not in spec:
+            serializer.fields.pop(name)
+            continue
+        nested = getattr(serializer.fields[name], 'child', serializer.fields[name])
+        if isinstance(nested, serializers.BaseSerializer):
+            if depth is not None and depth <= 0:
+                serializer.fields.pop(name)
+                continue
+            prune_serializer(nested, (spec or {}).get(name) or None, None if depth is None else depth - 1)
+
+class SparseFieldsMixin:
+    """
+    Root serializers honour ?fields=id,title,subjects.title (dotted paths reach into
+    nested serializers) and ?depth=N (levels of nested serializers kept, 0 = none).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        spec, depth = sparse_params(self.context.get('request'))
+        if spec or depth is not None:
+            prune_serializer(self, spec, depth)
+
+
 class OptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Option
@@ -29,7 +74,7 @@ class SimpleExamSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'duration_minutes', 'total_marks', 'exam_type']
 
 # --- HEAVY EXAM SERIALIZER (With Questions) ---
-class ExamSerializer(serializers.ModelSerializer):
+class ExamSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     questions = QuestionSerializer(many=True, read_only=True)
     class Meta:
         model = Exam
@@ -49,14 +94,20 @@ class TopicSerializer(serializers.ModelSerializer):
         except Exception: pass
         return None
 
-class ChapterSerializer(serializers.ModelSerializer):
+class ChapterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Don't load topics unless needed to avoid recursion depth issues
     topics = TopicSerializer(many=True, read_only=True)
     quiz_details = serializers.SerializerMethodField()
+    has_notes = serializers.SerializerMethodField()
     
     class Meta:
         model = Chapter
-        fields = ['id', 'title', 'order', 'study_notes', 'topics', 'quiz_details']
+        fields = ['id', 'title', 'order', 'study_notes', 'has_notes', 'topics', 'quiz_details']
+
+    def get_has_notes(self, obj):
+        # Annotated by querysets that defer study_notes (outline views)
+        if hasattr(obj, 'notes_present'): return obj.notes_present
+        return bool(obj.study_notes)
 
     def get_quiz_details(self, obj):
         exam = None
@@ -79,7 +130,7 @@ class ChapterSerializer(serializers.ModelSerializer):
             return SimpleExamSerializer(exam).data
         return None
 
-class SubjectSerializer(serializers.ModelSerializer):
+class SubjectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     chapters = ChapterSerializer(many=True, read_only=True)
     tests = serializers.SerializerMethodField() 
 
@@ -92,7 +143,7 @@ class SubjectSerializer(serializers.ModelSerializer):
         exams = [e for e in obj.tests.all() if e.exam_type == 'SUBJECT_TEST']
         return SimpleExamSerializer(exams, many=True).data
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     subjects = SubjectSerializer(many=True, read_only=True)
     mocks = serializers.SerializerMethodField()
     pyqs = serializers.SerializerMethodField()
@@ -121,4 +172,8 @@ class ExamAttemptSerializer(serializers.ModelSerializer):
 class AdBannerSerializer(serializers.ModelSerializer):
     class Meta:
         model = AdBanner
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+class AIGenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AIGenerationJob
+        fields = ['id', 'kind', 'status', 'progress', 'result', 'error', 'attempts', 'created_at', 'started_at', 'finished_at']
@@ -0,0 +1,128 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User, Course, Subject, Chapter, Topic, Exam, Question, Option, UserSubscription, ExamAttempt
+from .papers import bump_content_version
+from .snapshots import course_ids_for, invalidate_snapshots
+from .notes import build_notes
+from .search import index_questions, index_chapters, remove_documents, reindex_moved
+from .entitlements import refresh_owner, rotate_generation, invalidate_user
+from .authentication import cache_user, forget_user
+from .ranking import forget_score
+
+
+# --- EXAM CONTENT VERSION (Invalidates cached papers & answer keys) ---
+@receiver(post_save, sender=Exam)
+def exam_saved(sender, instance, created, **kwargs):
+    # A fresh exam already has a fresh token
+    if not created: bump_content_version(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    bump_content_version(instance.exam_id)
+
+
+@receiver([post_save, post_delete], sender=Option)
+def option_changed(sender, instance, **kwargs):
+    exam_id = Question.objects.filter(id=instance.question_id).values_list('exam_id', flat=True).first()
+    bump_content_version(exam_id)
+
+
+# --- COURSE TREE SNAPSHOTS ---
+# post_save only sees the new parent, so the row as it was is kept on the instance
+# (`_moved_from`) when a save re-parents it: both the old and new course are rebuilt.
+TREE_PARENTS = {Subject: ['course'], Chapter: ['subject'], Topic: ['chapter'], Exam: ['course', 'subject', 'chapter', 'topic']}
+
+
+@receiver(pre_save, sender=Subject)
+@receiver(pre_save, sender=Chapter)
+@receiver(pre_save, sender=Topic)
+@receiver(pre_save, sender=Exam)
+def remember_parents(sender, instance, update_fields=None, **kwargs):
+    fields = TREE_PARENTS[sender]
+    instance._moved_from = None
+    if instance.pk is None or (update_fields is not None and not set(fields) & set(update_fields)): return
+    old = sender.objects.filter(pk=instance.pk).only(*fields).first()
+    if old and any(getattr(old, f'{field}_id') != getattr(instance, f'{field}_id') for field in fields):
+        instance._moved_from = old
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=Chapter)
+@receiver([post_save, post_delete], sender=Topic)
+@receiver([post_save, post_delete], sender=Exam)
+def course_tree_changed(sender, instance, **kwargs):
+    course_ids = course_ids_for(instance)
+    moved_from = getattr(instance, '_moved_from', None)
+    if moved_from is not None: course_ids |= course_ids_for(moved_from)
+    invalidate_snapshots(course_ids)
+
+
+# --- PRE-RENDERED CHAPTER NOTES ---
+@receiver(post_save, sender=Chapter)
+def chapter_notes_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'study_notes' in update_fields: build_notes([instance.id])
+
+
+# --- SEARCH INDEX ---
+@receiver(post_save, sender=Question)
+def question_indexed(sender, instance, **kwargs):
+    index_questions([instance.id])
+
+
+@receiver(post_save, sender=Chapter)
+def chapter_indexed(sender, instance, **kwargs):
+    index_chapters([instance.id])
+
+
+@receiver(post_delete, sender=Question)
+@receiver(post_delete, sender=Chapter)
+def search_document_deleted(sender, instance, **kwargs):
+    remove_documents(sender._meta.model_name, [instance.id])
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_save, sender=Chapter)
+@receiver(post_save, sender=Topic)
+@receiver(post_save, sender=Exam)
+def search_parent_moved(sender, instance, **kwargs):
+    # Rows store their course for the access filter: follow the item to its new course
+    if getattr(instance, '_moved_from', None) is not None: reindex_moved(instance)
+
+
+# --- ENTITLEMENTS ---
+@receiver(post_save, sender=Exam)
+def exam_owner_changed(sender, instance, **kwargs):
+    refresh_owner(instance)
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=Chapter)
+@receiver([post_save, post_delete], sender=Topic)
+def course_structure_changed(sender, instance, **kwargs):
+    rotate_generation()
+
+
+@receiver([post_save, post_delete], sender=UserSubscription)
+def subscription_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+# --- AUTH ROW (token_version write-through) ---
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    cache_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+# --- SCORE HISTOGRAM ---
+@receiver(post_delete, sender=ExamAttempt)
+def attempt_deleted(sender, instance, **kwargs):
+    if instance.is_completed: forget_score(instance.exam_id, instance.total_score)
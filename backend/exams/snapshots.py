@@ -0,0 +1,152 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Course, Subject, Chapter, Topic, Exam, CourseSnapshot, new_content_version
+from .serializers import CourseSerializer
+from .renderers import dumps
+from .middleware import compress
+from .cache_utils import LocalLRU
+
+# --- MATERIALIZED COURSE TREES ---
+# Each course's full CourseSerializer output is stored as JSON in CourseSnapshot and
+# cached under its version token. List endpoints read (id, version) in one query and
+# stitch the cached payloads together instead of walking subjects -> chapters -> topics.
+CACHE_TIMEOUT = 60 * 60 * 24
+
+_state = threading.local()
+_bodies = LocalLRU(maxsize=16)
+
+
+def _key(course_id, version): return f"course_snapshot:{course_id}:{version}"
+
+
+def course_tree_queryset():
+    return Course.objects.prefetch_related(
+        'subjects',
+        'subjects__chapters',
+        'subjects__chapters__topics',
+        'subjects__chapters__quiz',
+        'subjects__chapters__topics__quiz_legacy',
+        'subjects__tests',
+        'mocks',
+    )
+
+
+def build_snapshots(course_ids):
+    # Renders and stores snapshots; returns {course_id: json bytes}
+    payloads = {}
+    rows = []
+    for course in course_tree_queryset().filter(id__in=course_ids):
+        payload = dumps(CourseSerializer(course).data)
+        snapshot = CourseSnapshot(course_id=course.id, version=new_content_version(), payload=payload.decode())
+        payloads[course.id] = payload
+        rows.append(snapshot)
+
+    if rows:
+        CourseSnapshot.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['course'], update_fields=['version', 'payload', 'built_at']
+        )
+        cache.set_many({_key(r.course_id, r.version): payloads[r.course_id] for r in rows}, CACHE_TIMEOUT)
+    return payloads
+
+
+def get_snapshots(versions):
+    """
+    versions: [(course_id, snapshot_version or None), ...] as read from
+    Course.objects.values_list('id', 'snapshot__version'). Returns json bytes in that order.
+    """
+    keys = {course_id: _key(course_id, version) for course_id, version in versions if version}
+    found = cache.get_many(keys.values())
+    payloads = {course_id: found[key] for course_id, key in keys.items() if key in found}
+
+    # Cache miss but the row is current -> load the stored payload
+    stale_cache = [course_id for course_id in keys if course_id not in payloads]
+    if stale_cache:
+        stored = {}
+        for course_id, version, payload in CourseSnapshot.objects.filter(course_id__in=stale_cache).values_list('course_id', 'version', 'payload'):
+            payloads[course_id] = stored[_key(course_id, version)] = payload.encode()
+        cache.set_many(stored, CACHE_TIMEOUT)
+
+    # No row yet (new course or invalidated) -> build it now
+    missing = [course_id for course_id, _ in versions if course_id not in payloads]
+    if missing:
+        payloads.update(build_snapshots(missing))
+
+    return [payloads[course_id] for course_id, _ in versions if course_id in payloads]
+
+
+def stitch(payloads, many=True):
+    return b'[' + b','.join(payloads) + b']' if many else payloads[0]
+
+
+def get_body(versions, many=True, coding=None):
+    """
+    (body, content coding or None) for the stitched snapshots. Compressed bodies are
+    cached per set of snapshot versions, so a hot course list is compressed once per
+    change rather than by CompressionMiddleware on every request.
+    """
+    if not coding or not all(version for _, version in versions):
+        return stitch(get_snapshots(versions), many), None
+
+    digest = hashlib.sha1(repr(versions).encode()).hexdigest()
+    key = f"course_body:{coding}:{int(many)}:{digest}"
+    body = _bodies.get(key)
+    if body is None:
+        body = cache.get(key)
+        if body is None:
+            raw = stitch(get_snapshots(versions), many)
+            if len(raw) < settings.COMPRESS_MIN_SIZE: return raw, None
+            body = compress(raw, coding)
+            cache.set(key, body, CACHE_TIMEOUT)
+        _bodies.set(key, body)
+    return body, coding
+
+
+def course_ids_for(instance):
+    # Courses whose tree renders this object
+    if isinstance(instance, Course):
+        return {instance.id}
+    if isinstance(instance, Subject):
+        return {instance.course_id}
+    if isinstance(instance, Chapter):
+        return set(Subject.objects.filter(id=instance.subject_id).values_list('course_id', flat=True))
+    if isinstance(instance, Topic):
+        return set(Chapter.objects.filter(id=instance.chapter_id).values_list('subject__course_id', flat=True))
+    if isinstance(instance, Exam):
+        ids = {instance.course_id}
+        if instance.subject_id:
+            ids.update(Subject.objects.filter(id=instance.subject_id).values_list('course_id', flat=True))
+        if instance.chapter_id:
+            ids.update(Chapter.objects.filter(id=instance.chapter_id).values_list('subject__course_id', flat=True))
+        if instance.topic_id:
+            ids.update(Topic.objects.filter(id=instance.topic_id).values_list('chapter__subject__course_id', flat=True))
+        return ids
+    return set()
+
+
+def invalidate_snapshots(course_ids):
+    """
+    Drops the stored snapshots and rebuilds them once the surrounding transaction commits.
+    Several changes to one course inside a transaction collapse into a single rebuild.
+    """
+    course_ids = {i for i in course_ids if i}
+    if not course_ids: return
+    CourseSnapshot.objects.filter(course_id__in=course_ids).delete()
+
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        pending = _state.pending = {}
+    for course_id in course_ids:
+        token = pending[course_id] = object()
+        transaction.on_commit(lambda course_id=course_id, token=token: _rebuild(course_id, token))
+
+
+def _rebuild(course_id, token):
+    # Only the latest invalidation of a course does the work
+    if _state.pending.get(course_id) is not token: return
+    del _state.pending[course_id]
+    build_snapshots([course_id])
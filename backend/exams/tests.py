@@ -1,3 +1,1677 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import User, Course, Subject, Chapter, Topic, Exam, Question, Option, ExamAttempt, StudentResponse, UserSubscription, OTP, CourseSnapshot, AIGenerationJob, AIJobImage, AIResultCache, ExamScoreBucket, QuestionStats, OptionStats, ChapterNotes, SearchDocument
+from .answer_key import get_answer_key
+from . import ai_service, ai_cache, ranking
+from .ranking import rebuild_histograms
+from .question_stats import ensure_rows, rebuild_question_stats
+from .importers import QuestionCSVImporter
+from .middleware import compress as compress_body
+from .notes import render_sections
+
+
+def make_exam(num_questions, marks=2.0, negative_marking_ratio=0.25):
+    exam = Exam.objects.create(title=f"Mock {num_questions}", exam_type='MOCK_FULL', negative_marking_ratio=negative_marking_ratio)
+    for i in range(num_questions):
+        question = Question.objects.create(exam=exam, text_content=f"Q{i}", marks=marks)
+        Option.objects.bulk_create([
+            Option(question=question, text=label, is_correct=(label == 'A')) for label in 'ABCD'
+        ])
+    exam.refresh_from_db()  # Pick up the content_version bumped by the question signals
+    return exam
+
+
+def answer_sheet(exam, correct=True):
+    # {question_id: option_id} picking the correct (or first wrong) option of every question
+    answers = {}
+    for option in Option.objects.filter(question__exam=exam, is_correct=correct).order_by('id'):
+        answers.setdefault(str(option.question_id), option.id)
+    return answers
+
+
+class SubmitExamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self, exam, answers):
+        attempt = ExamAttempt.objects.create(user=self.user, exam=exam)
+        res = self.client.post(f'/api/exams/{exam.id}/submit_exam/', {'attempt_id': attempt.id, 'answers': answers}, format='json')
+        return attempt, res
+
+    def test_scores_correct_wrong_and_foreign_options(self):
+        exam = make_exam(4)
+        right = answer_sheet(exam, correct=True)
+        wrong = answer_sheet(exam, correct=False)
+        q_ids = list(right)
+        other_exam_option = Option.objects.filter(question__exam=make_exam(1)).first()
+        answers = {
+            q_ids[0]: right[q_ids[0]],
+            q_ids[1]: right[q_ids[1]],
+            q_ids[2]: wrong[q_ids[2]],
+            q_ids[3]: other_exam_option.id,  # Not an option of this question -> ignored
+        }
+        attempt, res = self.submit(exam, answers)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['score'], 2 + 2 - 0.5)
+        attempt.refresh_from_db()
+        self.assertTrue(attempt.is_completed)
+        self.assertIsNotNone(attempt.submit_time)
+        self.assertEqual(StudentResponse.objects.filter(attempt=attempt).count(), 3)
+
+    def test_score_never_negative(self):
+        exam = make_exam(3)
+        _, res = self.submit(exam, answer_sheet(exam, correct=False))
+        self.assertEqual(res.data['score'], 0)
+
+    def test_duplicate_submit_is_rejected(self):
+        exam = make_exam(2)
+        attempt, res = self.submit(exam, answer_sheet(exam))
+        self.assertEqual(res.status_code, 200)
+
+        # A duplicate costs the exam lookup plus one attempt read
+        with self.assertNumQueries(2):
+            res = self.client.post(f'/api/exams/{exam.id}/submit_exam/', {'attempt_id': attempt.id, 'answers': {}}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data['error'], "Exam already submitted")
+        self.assertEqual(StudentResponse.objects.filter(attempt=attempt).count(), 2)
+
+    def test_invalid_attempt(self):
+        exam = make_exam(1)
+        res = self.client.post(f'/api/exams/{exam.id}/submit_exam/', {'attempt_id': 'nope', 'answers': {}}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data['error'], "Invalid attempt")
+
+    def test_query_count_is_independent_of_exam_size(self):
+        counts = []
+        for size in (5, 200):
+            exam = make_exam(size)
+            answers = answer_sheet(exam)
+            attempt = ExamAttempt.objects.create(user=self.user, exam=exam)
+            ensure_rows(exam.id, get_answer_key(exam))  # Warm the key and stats rows; grading must not touch question tables
+            with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(f'/api/exams/{exam.id}/submit_exam/', {'attempt_id': attempt.id, 'answers': answers}, format='json')
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data['score'], size * 2)
+            counts.append(len(ctx.captured_queries))
+            sql = " ".join(q['sql'] for q in ctx.captured_queries)
+            self.assertNotIn('"exams_option"', sql)
+            self.assertNotIn('"exams_question"', sql)
+        self.assertEqual(counts[0], counts[1])
+        # exam lookup, attempt read, savepoint, flip, upsert, stored read, score update,
+        # histogram upsert, release; then, after commit, question totals and option totals
+        self.assertEqual(counts[0], 11)
+
+
+class AutosaveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.exam = make_exam(3)
+        self.attempt = ExamAttempt.objects.create(user=self.user, exam=self.exam)
+        self.right = answer_sheet(self.exam, correct=True)
+        self.wrong = answer_sheet(self.exam, correct=False)
+        self.q_ids = list(self.right)
+
+    def autosave(self, answers):
+        return self.client.post(f'/api/exams/{self.exam.id}/save_answers/', {'attempt_id': self.attempt.id, 'answers': answers}, format='json')
+
+    def test_batches_upsert_and_submit_grades_stored_answers(self):
+        q1, q2, q3 = self.q_ids
+        self.assertEqual(self.autosave({q1: self.wrong[q1], q2: self.right[q2]}).data['saved'], 2)
+        # Change of mind on q1, q2 cleared
+        self.autosave({q1: self.right[q1], q2: None})
+        self.assertEqual(StudentResponse.objects.filter(attempt=self.attempt).count(), 2)
+        self.assertIsNone(StudentResponse.objects.get(attempt=self.attempt, question_id=q2).selected_option_id)
+
+        # Final submit only carries the last delta
+        res = self.client.post(f'/api/exams/{self.exam.id}/submit_exam/', {'attempt_id': self.attempt.id, 'answers': {q3: self.wrong[q3]}}, format='json')
+        self.assertEqual(res.data['score'], 2 - 0.5)
+        self.assertEqual(StudentResponse.objects.filter(attempt=self.attempt).count(), 3)
+
+    def test_batch_is_a_single_upsert(self):
+        get_answer_key(self.exam)
+        # exam lookup, savepoint, locked attempt read, upsert, release
+        with self.assertNumQueries(5):
+            self.autosave(self.right)
+
+    def test_rejected_after_submit(self):
+        self.client.post(f'/api/exams/{self.exam.id}/submit_exam/', {'attempt_id': self.attempt.id, 'answers': {}}, format='json')
+        res = self.autosave(self.right)
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(StudentResponse.objects.filter(attempt=self.attempt).count(), 0)
+
+
+class AnswerKeyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.exam = make_exam(3)
+        self.question = self.exam.questions.order_by('id').first()
+        self.correct = self.question.options.get(is_correct=True)
+        self.wrong = self.question.options.filter(is_correct=False).first()
+
+    def check(self, option_id):
+        return self.client.post(f'/api/exams/{self.exam.id}/check_answer/', {'question_id': self.question.id, 'option_id': option_id}, format='json')
+
+    def test_check_answer_uses_cached_key(self):
+        get_answer_key(self.exam)
+        with self.assertNumQueries(1):  # Exam lookup only
+            res = self.check(self.wrong.id)
+        self.assertFalse(res.data['is_correct'])
+        self.assertEqual(res.data['correct_option_id'], self.correct.id)
+        self.assertTrue(self.check(self.correct.id).data['is_correct'])
+
+    def test_question_from_another_exam_is_not_found(self):
+        other = make_exam(1).questions.first()
+        res = self.client.post(f'/api/exams/{self.exam.id}/check_answer/', {'question_id': other.id}, format='json')
+        self.assertEqual(res.status_code, 404)
+
+    def test_signals_invalidate_key(self):
+        get_answer_key(self.exam)
+        self.wrong.is_correct = True
+        self.wrong.save()
+        self.correct.is_correct = False
+        self.correct.save()
+        self.assertEqual(self.check(self.wrong.id).data['is_correct'], True)
+
+        self.exam.negative_marking_ratio = 0.5
+        self.exam.save()
+        self.exam.refresh_from_db()
+        self.assertEqual(get_answer_key(self.exam)['negative_marking_ratio'], 0.5)
+
+        question_id = self.question.id
+        self.question.delete()
+        self.exam.refresh_from_db()
+        self.assertNotIn(question_id, get_answer_key(self.exam)['questions'])
+
+
+class ExamPaperTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.exam = make_exam(3)
+        self.url = f'/api/exams/{self.exam.id}/'
+
+    def test_paper_is_rendered_once_per_version(self):
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 200)
+        paper = json.loads(res.content)
+        self.assertEqual(len(paper['questions']), 3)
+        self.assertEqual(len(paper['questions'][0]['options']), 4)
+        self.assertNotIn('is_correct', paper['questions'][0]['options'][0])
+
+        with self.assertNumQueries(1):  # Exam lookup only
+            again = self.client.get(self.url)
+        self.assertEqual(again.content, res.content)
+        self.assertEqual(again['ETag'], res['ETag'])
+
+    def test_conditional_request_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
+
+    def test_gzip_variant(self):
+        plain = self.client.get(self.url)
+        res = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertNotEqual(res['ETag'], plain['ETag'])
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+
+    def test_option_edit_bumps_version(self):
+        etag = self.client.get(self.url)['ETag']
+        option = Option.objects.filter(question__exam=self.exam).first()
+        option.text = "Edited"
+        option.save()
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Edited', res.content)
+
+
+def make_course(title="UPSC", chapters=2):
+    course = Course.objects.create(title=title)
+    subject = Subject.objects.create(course=course, title="Polity")
+    for i in range(chapters):
+        chapter = Chapter.objects.create(subject=subject, title=f"Chapter {i}", order=i, study_notes=f"# Notes {i}")
+        Topic.objects.create(chapter=chapter, title=f"Topic {i}")
+        Exam.objects.create(title=f"Quiz {i}", exam_type='TOPIC_QUIZ', chapter=chapter)
+    Exam.objects.create(title="Subject Test", exam_type='SUBJECT_TEST', subject=subject)
+    Exam.objects.create(title="Mock", exam_type='MOCK_FULL', course=course)
+    Exam.objects.create(title="PYQ 2023", exam_type='PYQ', course=course)
+    return course
+
+
+class CourseSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.course = make_course()
+
+    def test_list_serves_full_tree_from_snapshot(self):
+        res = self.client.get('/api/courses/')
+        self.assertEqual(res.status_code, 200)
+        course = json.loads(res.content)[0]
+        self.assertEqual([m['title'] for m in course['mocks']], ["Mock"])
+        self.assertEqual([p['title'] for p in course['pyqs']], ["PYQ 2023"])
+        chapter = course['subjects'][0]['chapters'][0]
+        self.assertEqual(chapter['study_notes'], "# Notes 0")
+        self.assertEqual(chapter['quiz_details']['title'], "Quiz 0")
+        self.assertTrue(CourseSnapshot.objects.filter(course=self.course).exists())
+
+        make_course("NDA", chapters=10)
+        self.client.get('/api/courses/')
+        with self.assertNumQueries(1):  # (id, version) pairs; payloads come from the cache
+            res = self.client.get('/api/courses/')
+        self.assertEqual(len(json.loads(res.content)), 2)
+
+    def test_edits_invalidate_snapshot(self):
+        self.client.get('/api/courses/')
+        chapter = Chapter.objects.filter(subject__course=self.course).first()
+        chapter.study_notes = "Rewritten"
+        chapter.save()
+        Exam.objects.create(title="Mock 2", exam_type='MOCK_FULL', course=self.course)
+
+        course = json.loads(self.client.get('/api/courses/').content)[0]
+        self.assertEqual(course['subjects'][0]['chapters'][0]['study_notes'], "Rewritten")
+        self.assertEqual(len(course['mocks']), 2)
+
+    def test_moving_items_invalidates_both_courses(self):
+        other = make_course("NDA", chapters=1)
+        self.client.get('/api/courses/')
+        chapter = Chapter.objects.filter(subject__course=self.course).first()
+        chapter.subject = Subject.objects.get(course=other)
+        chapter.save()
+        mock = Exam.objects.get(course=self.course, title="Mock")
+        mock.course = other
+        mock.save()
+
+        courses = {c['id']: c for c in json.loads(self.client.get('/api/courses/').content)}
+        old, new = courses[self.course.id], courses[other.id]
+        self.assertNotIn(chapter.id, [c['id'] for c in old['subjects'][0]['chapters']])
+        self.assertIn(chapter.id, [c['id'] for c in new['subjects'][0]['chapters']])
+        self.assertEqual([m['title'] for m in old['mocks']], [])
+        self.assertEqual(sorted(m['title'] for m in new['mocks']), ["Mock", "Mock"])
+
+    def test_rebuilt_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Topic.objects.filter(chapter__subject__course=self.course).first().save()
+        self.assertTrue(CourseSnapshot.objects.filter(course=self.course).exists())
+
+    def test_enrolled_and_retrieve(self):
+        other = make_course("NDA")
+        self.assertEqual(json.loads(self.client.get('/api/courses/enrolled/').content), [])
+        UserSubscription.objects.create(user=self.user, course=other)
+        enrolled = json.loads(self.client.get('/api/courses/enrolled/').content)
+        self.assertEqual([c['id'] for c in enrolled], [other.id])
+        self.assertEqual(json.loads(self.client.get(f'/api/courses/{other.id}/').content)['title'], "NDA")
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.course = make_course()
+
+    def test_fields_prune_nested_output(self):
+        res = self.client.get('/api/courses/', {'fields': 'id,title,subjects.id,subjects.chapters.title,mocks'})
+        course = res.data[0]
+        self.assertEqual(set(course), {'id', 'title', 'subjects', 'mocks'})
+        self.assertEqual(set(course['subjects'][0]), {'id', 'chapters'})
+        self.assertEqual(course['subjects'][0]['chapters'][0], {'title': "Chapter 0"})
+
+    def test_outline_skips_notes_column_and_unused_prefetches(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get('/api/courses/', {'fields': 'id,title,subjects.title,subjects.chapters.id,subjects.chapters.has_notes'})
+        self.assertTrue(res.data[0]['subjects'][0]['chapters'][0]['has_notes'])
+        sql = " ".join(q['sql'] for q in ctx.captured_queries)
+        # The notes column only appears inside the has_notes test, never as a selected value
+        self.assertEqual(sql.count('"study_notes"'), sql.count('NOT ("exams_chapter"."study_notes" = \'\')'))
+        self.assertNotIn('"exams_topic"', sql)
+        self.assertNotIn('"exams_exam"', sql)
+        self.assertEqual(len(ctx.captured_queries), 3)  # courses, subjects, chapters
+
+    def test_depth(self):
+        course = self.client.get(f'/api/courses/{self.course.id}/', {'depth': 0}).data
+        self.assertNotIn('subjects', course)
+        self.assertIn('mocks', course)
+
+        subject = self.client.get('/api/courses/', {'depth': 1}).data[0]['subjects'][0]
+        self.assertNotIn('chapters', subject)
+        self.assertEqual(subject['tests'][0]['title'], "Subject Test")
+
+        exam = make_exam(2)
+        self.assertNotIn('questions', self.client.get(f'/api/exams/{exam.id}/', {'depth': 0}).data)
+        self.assertNotIn('questions', self.client.get('/api/exams/', {'depth': 0}).data[0])
+
+    def test_chapter_notes_on_demand(self):
+        chapter = Chapter.objects.filter(subject__course=self.course).first()
+        res = self.client.get(f'/api/chapters/{chapter.id}/', {'fields': 'id,study_notes'})
+        self.assertEqual(res.data, {'id': chapter.id, 'study_notes': "# Notes 0"})
+
+
+class EntitlementTests(TestCase):
+    def setUp(self):
+        cache.clear()  # Rolled-back rows from earlier tests reuse ids
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.course = make_course("Paid", chapters=1)
+        self.course.is_paid = True
+        self.course.save()
+        self.chapter = Chapter.objects.get(subject__course=self.course)
+        self.exam = self.chapter.quiz  # Chapter quiz -> chapter -> subject -> course
+        Question.objects.create(exam=self.exam, text_content="Q", marks=1)
+
+    def test_paid_content_requires_subscription(self):
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/').status_code, 403)
+        self.assertEqual(self.client.get(f'/api/chapters/{self.chapter.id}/').status_code, 403)
+
+        subscription = UserSubscription.objects.create(user=self.user, course=self.course)
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/chapters/{self.chapter.id}/').status_code, 200)
+
+        subscription.active = False
+        subscription.save()
+        self.assertEqual(self.client.post(f'/api/exams/{self.exam.id}/start_attempt/').status_code, 403)
+
+    def test_free_course_and_unlinked_exam(self):
+        self.course.is_paid = False
+        self.course.save()
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/exams/{make_exam(1).id}/').status_code, 200)
+
+    def test_hot_path_check_is_query_free(self):
+        UserSubscription.objects.create(user=self.user, course=self.course)
+        self.client.post(f'/api/exams/{self.exam.id}/start_attempt/')
+        # Exam lookup + attempt insert; the permission check itself runs from the cache
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.post(f'/api/exams/{self.exam.id}/start_attempt/').status_code, 200)
+
+    def test_exam_moved_to_free_course(self):
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/').status_code, 403)
+        self.exam.chapter = None
+        self.exam.course = make_course("Free", chapters=0)
+        self.exam.save()
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/').status_code, 200)
+
+    def test_other_workers_writes_seen_without_shared_cache(self):
+        import time
+        from . import entitlements
+        free = make_course("Free", chapters=1)
+        quiz = Chapter.objects.get(subject__course=free).quiz
+        self.assertEqual(self.client.get(f'/api/exams/{quiz.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/').status_code, 403)
+
+        # Written elsewhere: this process's cache is never told
+        Course.objects.filter(id=free.id).update(is_paid=True)
+        UserSubscription.objects.bulk_create([UserSubscription(user=self.user, course=self.course)])
+        later = time.time() + entitlements.LOCAL_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual(self.client.get(f'/api/exams/{quiz.id}/').status_code, 403)
+            self.assertEqual(self.client.get(f'/api/exams/{self.exam.id}/').status_code, 200)
+
+
+class TokenVersionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+
+    def login(self, force=False):
+        res = self.client.post('/api/auth/jwt/create/', {'username': 'student', 'password': 'pass', 'force_login': force}, format='json')
+        self.assertEqual(res.status_code, 200)
+        return res.data['access']
+
+    def get_history(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+        return self.client.get('/api/history/')
+
+    def test_authentication_is_query_free(self):
+        token = self.login()
+        with self.assertNumQueries(1):  # The history query itself
+            res = self.get_history(token)
+        self.assertEqual(res.status_code, 200)
+
+    def test_new_login_rejects_old_token(self):
+        old = self.login()
+        self.assertEqual(self.get_history(old).status_code, 200)
+        new = self.login(force=True)
+        self.assertEqual(self.get_history(old).status_code, 401)
+        self.assertEqual(self.get_history(new).status_code, 200)
+
+    def test_cached_user_writes_only_what_changed(self):
+        token = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+        self.assertEqual(self.client.post('/api/auth-otp/logout/').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_logout)
+        self.assertEqual(self.user.token_version, 1)
+        self.assertTrue(self.user.check_password('pass'))
+        # Deactivation is written through too
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_history(token).status_code, 401)
+
+
+def csv_upload(rows, header="Question,Option A,Option B,Option C,Option D,Correct,Marks,Explanation", name="questions.csv"):
+    body = "\n".join([header] + rows) + "\n"
+    return SimpleUploadedFile(name, body.encode('utf-8-sig'), content_type='text/csv')
+
+
+class QuestionCSVImportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass', phone_number='9000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.exam = Exam.objects.create(title="PYQ Bank", exam_type='PYQ', total_marks=0)
+
+    def upload(self, rows, **extra):
+        return self.client.post('/api/ai-generator/upload_questions_csv/', {'file': csv_upload(rows), 'exam_id': self.exam.id, **extra}, format='multipart')
+
+    def good_rows(self, n, start=0):
+        return [f"Q{i},a,b,c,d,B,2,Because {i}" for i in range(start, start + n)]
+
+    def test_imports_rows_and_reports_errors(self):
+        res = self.upload(self.good_rows(3) + ["Missing options,a,,c,d,A,1,", "Bad letter,a,b,c,d,E,1,", "Bad marks,a,b,c,d,A,x,"])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['added'], res.data['skipped']), (3, 3))
+        self.assertEqual([e['row'] for e in res.data['errors']], [5, 6, 7])
+
+        question = self.exam.questions.get(text_content="Q1")
+        self.assertEqual(question.explanation, "Because 1")
+        self.assertEqual(question.options.get(is_correct=True).text, "b")
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.total_marks, 6)
+
+    def test_dry_run_writes_nothing(self):
+        res = self.upload(self.good_rows(4) + [",a,b,c,d,A,1,"], dry_run='true')
+        self.assertEqual((res.data['added'], res.data['skipped']), (4, 1))
+        res = self.upload([f"Q,a,b,c,d,A,{marks}," for marks in ("inf", "nan", "-1", "-inf", "0")], dry_run='true')
+        self.assertEqual((res.data['added'], [e['row'] for e in res.data['errors']]), (1, [2, 3, 4, 5]))
+        self.assertEqual(Question.objects.filter(exam=self.exam).count(), 0)
+
+    def test_query_count_is_independent_of_row_count(self):
+        counts = []
+        for n in (5, 50):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.upload(self.good_rows(n)).data['added'], n)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Option.objects.filter(question__exam=self.exam).count(), 55 * 4)
+
+    def test_chunked_resume_from_checkpoint(self):
+        res = self.upload(self.good_rows(3), chunked='true')
+        self.assertEqual(res.data['checkpoint'], 4)
+        res = self.upload(self.good_rows(5), chunked='true', resume_from_row=res.data['checkpoint'])
+        self.assertEqual(res.data['added'], 2)
+        self.assertEqual(self.exam.questions.count(), 5)
+        self.assertEqual(res.data['total_marks'], 10)
+
+    def test_total_marks_is_the_sum_of_stored_questions(self):
+        Question.objects.create(exam=self.exam, text_content="Added by hand", marks=3.5)
+        res = self.upload(self.good_rows(3))
+        self.assertEqual(res.data['total_marks'], 10)  # round(3.5 + 3 * 2)
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.total_marks, 10)
+
+    def test_failed_chunk_keeps_the_original_error(self):
+        from django.db import IntegrityError
+        write_chunk = QuestionCSVImporter.write_chunk
+        calls = []
+
+        def second_chunk_fails(importer, chunk):
+            calls.append(chunk)
+            if len(calls) == 2: raise IntegrityError("duplicate key")
+            write_chunk(importer, chunk)
+
+        for atomic, stored in ((True, 0), (False, 2)):
+            calls.clear()
+            importer = QuestionCSVImporter(self.exam, atomic=atomic, chunk_size=2)
+            with mock.patch.object(QuestionCSVImporter, 'write_chunk', second_chunk_fails), \
+                    mock.patch.object(QuestionCSVImporter, 'update_total_marks', wraps=importer.update_total_marks) as update:
+                with self.assertRaisesMessage(IntegrityError, "duplicate key"):
+                    importer.run(csv_upload(self.good_rows(4)))
+            # One transaction: nothing is written after the failure. Chunked: the committed chunk counts
+            self.assertEqual((update.called, self.exam.questions.count()), (not atomic, stored))
+            self.exam.refresh_from_db()
+            self.assertEqual(self.exam.total_marks, stored * 2)
+
+    def test_import_refreshes_cached_paper(self):
+        etag = self.client.get(f'/api/exams/{self.exam.id}/')['ETag']
+        self.upload(self.good_rows(2))
+        res = self.client.get(f'/api/exams/{self.exam.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(json.loads(res.content)['questions']), 2)
+
+
+class NotesCSVImportTests(TestCase):
+    header = "Course,Paper,Subject,Chapter,Topic,Notes"
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass', phone_number='9000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, rows, encoding='utf-8'):
+        body = "\n".join([self.header] + rows) + "\n"
+        upload = SimpleUploadedFile("notes.csv", body.encode(encoding), content_type='text/csv')
+        return self.client.post('/api/bulk-notes/upload_csv/', {'file': upload}, format='multipart')
+
+    def test_creates_hierarchy_and_updates_notes(self):
+        course = Course.objects.create(title="SSC CGL")
+        subject = Subject.objects.create(course=course, title="Maths", section="Main")
+        chapter = Chapter.objects.create(subject=subject, title="Algebra", study_notes="old")
+
+        res = self.upload([
+            'SSC CGL,Tier 1,Maths,Algebra,,"# Algebra\nnew, multi-line"',
+            "SSC CGL,Tier 1,Maths,Geometry,,Triangles",
+            "Railways,,Reasoning,Series,,Patterns",
+            ",,Reasoning,Series,,No course",
+        ])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['courses_created'], res.data['subjects_created']), (1, 1))
+        self.assertEqual((res.data['chapters_created'], res.data['chapters_updated']), (2, 1))
+        self.assertEqual([e['row'] for e in res.data['errors']], [5])
+
+        chapter.refresh_from_db()
+        subject.refresh_from_db()
+        self.assertEqual(chapter.study_notes, "# Algebra\nnew, multi-line")
+        self.assertEqual(subject.section, "Tier 1")
+        self.assertEqual(Subject.objects.get(title="Reasoning").section, "Main")
+
+    def test_query_count_is_independent_of_row_count(self):
+        counts = []
+        for batch, n in (("a", 5), ("b", 60)):
+            rows = [f"Course {batch},,Subject {i % 3},Chapter {i},,Notes {i}" for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.upload(rows).data['chapters_created'], n)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_detects_legacy_encoding(self):
+        notes = "Le théorème de Pythagore énonce que le carré de l'hypoténuse est égal à la somme des carrés des côtés. " * 5
+        self.upload([f"Général,,Français,Géométrie,,{notes.strip()}"], encoding='cp1252')
+        self.assertEqual(Chapter.objects.get().study_notes, notes.strip())
+
+    def test_long_notes_leave_the_csv_limit_alone(self):
+        import csv
+        notes = "x" * 200_000  # past the csv module's 128K default
+        self.upload([f"SSC CGL,,Maths,Algebra,,{notes}"])
+        self.assertEqual(len(Chapter.objects.get().study_notes), 200_000)
+
+        # Imports never touch the process-wide limit, e.g. lower one another module raised
+        previous = csv.field_size_limit(1 << 30)
+        try:
+            self.upload(["SSC CGL,,Maths,Algebra,,Short"])
+            self.assertEqual(csv.field_size_limit(), 1 << 30)
+        finally:
+            csv.field_size_limit(previous)
+
+    def test_import_refreshes_course_snapshot(self):
+        course = Course.objects.create(title="SSC CGL")
+        self.client.get(f'/api/courses/{course.id}/')
+        self.upload(["SSC CGL,,Maths,Algebra,,Notes"])
+        res = self.client.get(f'/api/courses/{course.id}/')
+        self.assertEqual(json.loads(res.content)['subjects'][0]['chapters'][0]['title'], "Algebra")
+
+
+def run_worker():
+    call_command('run_ai_worker', processes=0, once=True, stdout=io.StringIO())
+
+
+@override_settings(AI_MODEL_BACKEND='fake')
+class AIGenerationJobTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass', phone_number='9000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        course = Course.objects.create(title="SSC CGL")
+        subject = Subject.objects.create(course=course, title="Maths")
+        self.chapter = Chapter.objects.create(subject=subject, title="Algebra", study_notes="Linear equations ...")
+
+    def status(self, job_id):
+        return self.client.get(f'/api/ai-generator/jobs/{job_id}/').data
+
+    def test_generate_enqueues_and_worker_completes(self):
+        res = self.client.post('/api/ai-generator/generate/', {'source_type': 'chapter', 'source_id': self.chapter.id, 'num_questions': 3}, format='json')
+        self.assertEqual(res.status_code, 202)
+        job_id = res.data['job_id']
+        self.assertEqual(self.status(job_id)['status'], 'queued')
+
+        run_worker()
+        job = self.status(job_id)
+        self.assertEqual((job['status'], job['progress'], job['attempts']), ('done', 100, 1))
+        self.assertEqual(len(job['result']['questions']), 3)
+        self.assertEqual(job['result']['questions'][0]['options'][0], "Option A")
+
+    def test_auto_save_into_new_exam(self):
+        res = self.client.post('/api/ai-generator/generate/', {
+            'source_type': 'chapter', 'source_id': self.chapter.id, 'num_questions': 2,
+            'auto_save': True, 'new_exam_title': "Algebra Quiz",
+        }, format='json')
+        run_worker()
+        saved = self.status(res.data['job_id'])['result']['saved']
+        exam = Exam.objects.get(id=saved['exam_id'])
+        self.assertEqual((exam.title, exam.chapter_id, saved['added']), ("Algebra Quiz", self.chapter.id, 2))
+        self.assertEqual(Option.objects.filter(question__exam=exam, is_correct=True).count(), 2)
+
+    def test_image_job_drops_image_bytes_when_done(self):
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new('RGB', (8, 8), 'white').save(buf, format='PNG')
+        upload = SimpleUploadedFile("page.png", buf.getvalue(), content_type='image/png')
+        res = self.client.post('/api/ai-generator/generate_image/', {'image': upload}, format='multipart')
+        self.assertEqual(AIJobImage.objects.filter(job_id=res.data['job_id']).count(), 1)
+
+        run_worker()
+        self.assertEqual(len(self.status(res.data['job_id'])['result']['questions']), 1)
+        self.assertFalse(AIJobImage.objects.exists())
+
+    def test_only_silent_jobs_are_requeued(self):
+        from .ai_jobs import claim_jobs, requeue_stale
+        res = self.client.post('/api/ai-generator/generate/', {'source_type': 'chapter', 'source_id': self.chapter.id}, format='json')
+        job_id = res.data['job_id']
+        claim_jobs(1)
+        # Running for an hour, but its worker still heartbeats
+        AIGenerationJob.objects.filter(id=job_id).update(started_at=timezone.now() - timezone.timedelta(hours=1))
+        requeue_stale(60)
+        self.assertEqual(self.status(job_id)['status'], 'running')
+        AIGenerationJob.objects.filter(id=job_id).update(heartbeat_at=timezone.now() - timezone.timedelta(minutes=2))
+        requeue_stale(60)
+        self.assertEqual(self.status(job_id)['status'], 'queued')
+
+    def test_requeued_run_does_not_save(self):
+        from .ai_jobs import claim_jobs, run_job, run_text_job
+        res = self.client.post('/api/ai-generator/generate/', {
+            'source_type': 'chapter', 'source_id': self.chapter.id, 'num_questions': 2,
+            'auto_save': True, 'new_exam_title': "Algebra Quiz",
+        }, format='json')
+        job_id = res.data['job_id']
+        claim_jobs(1)
+
+        def requeued_meanwhile(job):
+            # Another worker picked the job up again while this one was generating
+            AIGenerationJob.objects.filter(id=job_id).update(attempts=2)
+            return run_text_job(job)
+        with mock.patch('exams.ai_jobs.run_text_job', side_effect=requeued_meanwhile):
+            run_job(job_id)
+        job = AIGenerationJob.objects.get(id=job_id)
+        self.assertEqual((job.status, job.attempts, job.result), ('running', 2, None))
+        self.assertFalse(Exam.objects.exists())
+
+    def test_failed_image_job_drops_image_bytes(self):
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new('RGB', (8, 8), 'white').save(buf, format='PNG')
+        upload = SimpleUploadedFile("page.png", buf.getvalue(), content_type='image/png')
+        res = self.client.post('/api/ai-generator/generate_image/', {'image': upload}, format='multipart')
+        with mock.patch('exams.ai_jobs.generate_questions_from_images', side_effect=RuntimeError("model down")), \
+                self.assertLogs('exams.ai_jobs', 'ERROR'):
+            run_worker()
+        job = self.status(res.data['job_id'])
+        self.assertEqual((job['status'], job['error']), ('failed', "model down"))
+        self.assertFalse(AIJobImage.objects.exists())
+
+    def test_no_notes_is_rejected_up_front(self):
+        self.chapter.study_notes = ""
+        self.chapter.save()
+        res = self.client.post('/api/ai-generator/generate/', {'source_type': 'subject', 'source_id': self.chapter.subject_id}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(AIGenerationJob.objects.exists())
+
+
+@override_settings(AI_MODEL_BACKEND='fake')
+class MapReduceGenerationTests(TestCase):
+    def test_split_and_allocate(self):
+        long_notes = "\n\n".join(["x" * 900] * 10)
+        chunks = ai_service.split_notes([("Big", long_notes), ("Empty", ""), ("Small", "y" * 100)], chunk_chars=2000)
+        self.assertEqual(len(chunks), 6)
+        self.assertTrue(chunks[0].startswith("--- Chapter: Big (part 1/5) ---"))
+        self.assertTrue(all(len(c) <= 2000 for c in chunks))
+        # Nothing is lost to the headers, including from hard-cut paragraphs
+        self.assertEqual(sum(c.count("x") for c in chunks), 9000)
+        cut = ai_service.split_notes([("Wall", "z" * 5000)], chunk_chars=2000)
+        self.assertTrue(all(len(c) <= 2000 for c in cut))
+        self.assertEqual(sum(c.count("z") for c in cut), 5000)
+
+        # A full chunk reaches the prompt whole
+        with mock.patch.object(ai_service, 'get_provider') as provider:
+            provider.return_value.generate_text.return_value = '[{"question_text": "Q"}]'
+            full = ai_service.split_notes([("Big", "w" * 50000)])[0]
+            ai_service.request_questions(full, 1)
+        self.assertLessEqual(len(full), ai_service.CHUNK_CHARS)
+        self.assertIn(full, provider.return_value.generate_text.call_args[0][0])
+
+        counts = ai_service.allocate_questions(chunks, 11)
+        self.assertEqual(sum(counts), 11)
+        self.assertEqual(counts[-1], 0)  # the small chapter is ~5% of the text
+
+    @mock.patch.object(ai_service, 'BACKOFF_SECONDS', 0)
+    def test_retries_and_deduplicates(self):
+        calls = []
+
+        def flaky(chunk, n, *args):
+            calls.append(chunk)
+            if chunk.startswith("--- Chapter: B") and calls.count(chunk) == 1:
+                raise ValueError("rate limited")
+            return [{"question_text": "What is  X?", "options": list("ABCD"), "correct_index": 0}] + [
+                {"question_text": f"{chunk[:14]} #{i}", "options": list("ABCD"), "correct_index": 0} for i in range(n - 1)
+            ]
+
+        with mock.patch.object(ai_service, 'request_questions', side_effect=flaky):
+            questions, report = ai_service.generate_questions_map_reduce([("A", "a" * 50), ("B", "b" * 50), ("C", "c" * 50)], 6)
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(report, {"chunks": 3, "failed_chunks": 0, "duplicates": 2, "cached_chunks": 0})
+        self.assertEqual(len(questions), 4)
+
+    def test_course_job_covers_every_chapter(self):
+        admin = User.objects.create_superuser(username='admin', password='pass', phone_number='9000000000')
+        course = Course.objects.create(title="SSC CGL")
+        subject = Subject.objects.create(course=course, title="GK")
+        Chapter.objects.bulk_create([Chapter(subject=subject, title=f"Chapter {i}", study_notes=f"Notes {i} " * 50, order=i) for i in range(30)])
+
+        client = APIClient()
+        client.force_authenticate(admin)
+        res = client.post('/api/ai-generator/generate/', {'source_type': 'course', 'source_id': course.id, 'num_questions': 30}, format='json')
+        with mock.patch.object(ai_service, 'request_questions', wraps=ai_service.request_questions) as spy:
+            run_worker()
+        prompts = "".join(call.args[0] for call in spy.call_args_list)
+        self.assertTrue(all(f"Chapter: Chapter {i} ---" in prompts for i in range(30)))
+
+        job = AIGenerationJob.objects.get(id=res.data['job_id'])
+        self.assertEqual((job.status, job.result['generation']['chunks']), ('done', 30))
+        self.assertEqual(len(job.result['questions']), 30)
+
+
+@override_settings(AI_MODEL_BACKEND='fake')
+class AIResultCacheTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass', phone_number='9000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        subject = Subject.objects.create(course=Course.objects.create(title="SSC CGL"), title="GK")
+        for i in range(3):
+            Chapter.objects.create(subject=subject, title=f"Chapter {i}", study_notes=f"Notes {i}")
+        self.subject = subject
+
+    def generate(self, **extra):
+        res = self.client.post('/api/ai-generator/generate/', {'source_type': 'subject', 'source_id': self.subject.id, 'num_questions': 6, **extra}, format='json')
+        with mock.patch.object(ai_service, 'request_questions', wraps=ai_service.request_questions) as spy:
+            run_worker()
+        return AIGenerationJob.objects.get(id=res.data['job_id']).result, spy.call_count
+
+    def test_repeat_generation_is_served_from_cache(self):
+        first, calls = self.generate()
+        self.assertEqual((calls, first['generation']['cached_chunks']), (3, 0))
+
+        second, calls = self.generate()
+        self.assertEqual((calls, second['generation']['cached_chunks']), (0, 3))
+        self.assertEqual(second['questions'], first['questions'])
+
+        # Different params -> different key
+        _, calls = self.generate(difficulty='Hard')
+        self.assertEqual(calls, 3)
+
+        stats = self.client.get('/api/ai-generator/cache_stats/').data
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (3, 6, 6))
+        self.assertEqual(stats['hit_rate'], 0.3333)
+
+    def test_bypass_flag_forces_a_fresh_call(self):
+        self.generate()
+        _, calls = self.generate(bypass_cache=True)
+        self.assertEqual(calls, 3)
+        self.assertEqual(ai_cache.stats()['bypassed'], 3)
+
+    def test_eviction_drops_least_recently_used(self):
+        for i in range(4):
+            ai_cache.store(f"key{i}", 'text', 'fake', [{"question_text": "x" * 100}])
+        ai_cache.lookup(["key0"])
+        ai_cache.evict(max_bytes=AIResultCache.objects.get(key="key0").size * 2)
+        self.assertEqual(sorted(AIResultCache.objects.values_list('key', flat=True)), ["key0", "key3"])
+        self.assertEqual(ai_cache.stats()['evicted'], 2)
+        self.assertEqual(ai_cache.stored_bytes(), ai_cache.stats()['bytes'])
+
+    def test_store_keeps_a_running_byte_total(self):
+        with CaptureQueriesContext(connection) as ctx:
+            ai_cache.store("key0", 'text', 'fake', [{"question_text": "x" * 100}])
+            ai_cache.store("key0", 'text', 'fake', [{"question_text": "x" * 10}])  # replacing an entry
+            ai_cache.store("key1", 'text', 'fake', [{"question_text": "y"}])
+        self.assertFalse([q for q in ctx.captured_queries if 'SUM(' in q['sql']])
+        self.assertEqual(ai_cache.stored_bytes(), ai_cache.stats()['bytes'])
+        self.assertNotIn('stored_bytes', ai_cache.stats())
+
+
+class StartupBudgetTests(TestCase):
+    def test_startup_skips_ai_stack_and_stays_in_budget(self):
+        from benchmarks.startup import measure_startup, DEFAULT_BUDGET
+        result = measure_startup(runs=1)
+        self.assertEqual(result['loaded'], [])
+        self.assertLess(result['total'], DEFAULT_BUDGET)
+
+
+def png_upload(name, size=(8, 8), color='white'):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new('RGB', size, color).save(buf, format='PNG')
+    return SimpleUploadedFile(name, buf.getvalue(), content_type='image/png')
+
+
+@override_settings(AI_MODEL_BACKEND='fake')
+class BatchImageGenerationTests(TestCase):
+    def test_prepare_image_downscales_and_reencodes(self):
+        from PIL import Image
+        original = png_upload("scan.png", size=(4000, 3000), color='red').read()
+        prepared = ai_service.prepare_image(original)
+        with Image.open(io.BytesIO(prepared)) as img:
+            self.assertEqual((img.format, img.size), ('JPEG', (1600, 1200)))
+
+    def test_batch_returns_questions_and_per_image_errors(self):
+        admin = User.objects.create_superuser(username='admin', password='pass', phone_number='9000000000')
+        client = APIClient()
+        client.force_authenticate(admin)
+        images = [png_upload("p1.png", size=(3000, 2000)), SimpleUploadedFile("p2.png", b"not an image"), png_upload("p3.png", color='black')]
+        res = client.post('/api/ai-generator/generate_images/', {'images': images}, format='multipart')
+        self.assertEqual(res.status_code, 202)
+        run_worker()
+
+        job = AIGenerationJob.objects.get(id=res.data['job_id'])
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(len(job.result['questions']), 2)
+        self.assertEqual([e['image'] for e in job.result['errors']], ["p2.png"])
+        self.assertEqual(job.result['generation']['failed_images'], 1)
+
+    def test_model_calls_are_bounded(self):
+        import threading, time
+        lock, state = threading.Lock(), {'now': 0, 'peak': 0}
+
+        def slow(prompt, image_bytes):
+            with lock:
+                state['now'] += 1
+                state['peak'] = max(state['peak'], state['now'])
+            time.sleep(0.05)
+            with lock: state['now'] -= 1
+            return [{"question_text": "Q", "options": list("ABCD"), "correct_index": 0}]
+
+        images = [(f"p{i}.png", png_upload(f"p{i}.png", color=(i, i, i)).read()) for i in range(6)]
+        with mock.patch.object(ai_service, 'request_image_questions', side_effect=slow):
+            questions, errors, report = ai_service.generate_questions_from_images(images, max_workers=2)
+        self.assertEqual((len(questions), errors, state['peak']), (6, [], 2))
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.exam = make_exam(5)  # 2 marks each, -0.5 per wrong answer
+        self.client = APIClient()
+
+    def submit_as(self, username, correct):
+        user = User.objects.create_user(username=username, password='pass', first_name=username.title())
+        qids = list(answer_sheet(self.exam))
+        right, wrong = answer_sheet(self.exam, True), answer_sheet(self.exam, False)
+        answers = {qid: (right if i < correct else wrong)[qid] for i, qid in enumerate(qids)}
+        attempt = ExamAttempt.objects.create(user=user, exam=self.exam)
+        self.client.force_authenticate(user)
+        self.client.post(f'/api/exams/{self.exam.id}/submit_exam/', {'attempt_id': attempt.id, 'answers': answers}, format='json')
+        return user, attempt
+
+    def test_rank_percentile_and_top(self):
+        self.submit_as('asha', 5)       # 10.0
+        self.submit_as('bala', 3)       # 5.0
+        self.submit_as('chen', 3)       # 5.0
+        user, attempt = self.submit_as('dev', 1)  # 0.0
+
+        res = self.client.get(f'/api/exams/{self.exam.id}/leaderboard/', {'top': 3})
+        self.assertEqual(res.data['total_attempts'], 4)
+        self.assertEqual(res.data['me'], {"attempt_id": attempt.id, "score": 0.0, "rank": 4, "percentile": 25.0})
+        self.assertEqual([(r['rank'], r['name'], r['score']) for r in res.data['top']], [(1, "Asha", 10.0), (2, "Bala", 5.0), (2, "Chen", 5.0)])
+
+        self.client.force_authenticate(User.objects.get(username='chen'))
+        me = self.client.get(f'/api/exams/{self.exam.id}/leaderboard/').data['me']
+        self.assertEqual((me['rank'], me['percentile']), (2, 75.0))
+
+    def test_total_without_an_attempt_of_my_own(self):
+        self.submit_as('asha', 4)
+        self.client.force_authenticate(User.objects.create_user(username='watcher', password='pass'))
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(f'/api/exams/{self.exam.id}/leaderboard/', {'top': 0})
+        self.assertEqual((res.data['total_attempts'], res.data['me']), (1, None))
+        buckets = [q['sql'] for q in ctx.captured_queries if 'exams_examscorebucket' in q['sql']]
+        self.assertEqual(len(buckets), 1)
+        self.assertNotIn('FILTER', buckets[0])
+
+    def test_board_never_shows_usernames(self):
+        user, _ = self.submit_as('9876543210', 4)
+        user.first_name, user.last_name = "", ""
+        user.save()
+        self.submit_as('asha', 3)
+        User.objects.filter(username='asha').update(last_name="Kumar")
+        names = [r['name'] for r in self.client.get(f'/api/exams/{self.exam.id}/leaderboard/').data['top']]
+        self.assertEqual(names, ["Student", "Asha K."])
+
+    def test_cost_does_not_grow_with_attempts(self):
+        user, _ = self.submit_as('asha', 4)
+        counts = []
+        for extra in (5, 200):
+            ExamAttempt.objects.bulk_create([
+                ExamAttempt(user=user, exam=self.exam, is_completed=True, total_score=i % 11) for i in range(extra)
+            ])
+            rebuild_histograms([self.exam.id])
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(f'/api/exams/{self.exam.id}/leaderboard/')
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(res.data['total_attempts'], 206)
+
+    def test_rebuild_matches_incremental_and_deletes_decrement(self):
+        self.submit_as('asha', 5)
+        _, attempt = self.submit_as('bala', 2)
+        incremental = sorted(ExamScoreBucket.objects.values_list('bucket', 'count'))
+        call_command('rebuild_score_histograms', exam_ids=[self.exam.id], stdout=io.StringIO())
+        self.assertEqual(sorted(ExamScoreBucket.objects.values_list('bucket', 'count')), incremental)
+
+        ExamAttempt.objects.get(id=attempt.id).delete()
+        self.assertEqual(ranking.standing(self.exam.id, 0)['total'], 1)
+
+    def test_failed_rebuild_keeps_the_old_histogram(self):
+        self.submit_as('asha', 5)
+        before = sorted(ExamScoreBucket.objects.values_list('bucket', 'count'))
+        with mock.patch.object(ExamScoreBucket.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rebuild_histograms([self.exam.id])
+        self.assertEqual(sorted(ExamScoreBucket.objects.values_list('bucket', 'count')), before)
+
+
+class QuestionStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()  # stats-row flags are keyed by exam id, which rolled-back tests reuse
+        self.exam = make_exam(3)
+        self.qids = list(answer_sheet(self.exam))
+        self.right, self.wrong = answer_sheet(self.exam, True), answer_sheet(self.exam, False)
+        self.admin = User.objects.create_superuser(username='admin', password='pass', phone_number='9000000000')
+
+    def submit(self, answers):
+        user = User.objects.create_user(username=f"s{User.objects.count()}", password='pass')
+        attempt = ExamAttempt.objects.create(user=user, exam=self.exam)
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'/api/exams/{self.exam.id}/submit_exam/', {'attempt_id': attempt.id, 'answers': answers}, format='json')
+
+    def report(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        return client.get(f'/api/exams/{self.exam.id}/stats/')
+
+    def test_submits_update_totals(self):
+        q0, q1, q2 = self.qids
+        self.submit({q0: self.right[q0], q1: self.wrong[q1]})
+        self.submit({q0: self.right[q0], q1: self.right[q1], q2: None})
+        self.submit({q0: self.wrong[q0]})
+
+        rows = {str(r['question_id']): r for r in self.report().data['questions']}
+        self.assertEqual({k: rows[q0][k] for k in ('attempts', 'answered', 'skipped', 'correct')}, {'attempts': 3, 'answered': 3, 'skipped': 0, 'correct': 2})
+        self.assertEqual((rows[q1]['answered'], rows[q1]['correct'], rows[q2]['skipped']), (2, 1, 3))
+        picks = {o['option_id']: o['picks'] for o in rows[q0]['options']}
+        self.assertEqual((picks[self.right[q0]], picks[self.wrong[q0]]), (2, 1))
+
+        summary = self.report().data['summary']
+        self.assertEqual((summary['attempts'], summary['questions']), (3, 3))
+        self.assertEqual(summary['avg_p_correct'], round(3 / 9, 4))
+
+    def test_submit_bumps_answered_rows_after_commit(self):
+        q0, _, _ = self.qids
+        user = User.objects.create_user(username='late', password='pass')
+        attempt = ExamAttempt.objects.create(user=user, exam=self.exam)
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            client.post(f'/api/exams/{self.exam.id}/submit_exam/', {'attempt_id': attempt.id, 'answers': {q0: self.right[q0]}}, format='json')
+        self.assertFalse(QuestionStats.objects.filter(answered__gt=0).exists())
+
+        with CaptureQueriesContext(connection) as ctx:
+            for callback in callbacks: callback()
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "exams_questionstats"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('exam_id', updates[0])
+        self.assertEqual(list(QuestionStats.objects.filter(answered__gt=0).values_list('question_id', 'correct')), [(int(q0), 1)])
+
+    def test_rebuild_matches_incremental(self):
+        q0, q1, _ = self.qids
+        self.submit({q0: self.right[q0], q1: self.wrong[q1]})
+        self.submit({q1: self.right[q1]})
+        snapshot = lambda: (sorted(QuestionStats.objects.values_list('question_id', 'answered', 'correct')), sorted(OptionStats.objects.values_list('option_id', 'picks')))
+        incremental = snapshot()
+        call_command('rebuild_question_stats', exam_ids=[self.exam.id], stdout=io.StringIO())
+        self.assertEqual(snapshot(), incremental)
+
+        # A rebuild that fails partway leaves the totals it found
+        with mock.patch.object(OptionStats.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rebuild_question_stats([self.exam.id])
+        self.assertEqual(snapshot(), incremental)
+
+    def test_report_cost_does_not_grow_with_responses(self):
+        self.submit({self.qids[0]: self.right[self.qids[0]]})
+        counts = []
+        for extra in (2, 20):
+            for _ in range(extra): self.submit({q: self.right[q] for q in self.qids})
+            client = APIClient()
+            client.force_authenticate(self.admin)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(client.get(f'/api/exams/{self.exam.id}/stats/').status_code, 200)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_students_cannot_read_stats(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='student', password='pass'))
+        self.assertEqual(client.get(f'/api/exams/{self.exam.id}/stats/').status_code, 403)
+
+
+class AttemptHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.mock = Exam.objects.create(title="Mock", exam_type='MOCK_FULL', total_marks=100)
+        self.quiz = Exam.objects.create(title="Quiz", exam_type='TOPIC_QUIZ', total_marks=10)
+
+    def add_attempts(self, n):
+        ExamAttempt.objects.bulk_create([
+            ExamAttempt(user=self.user, exam=self.mock if i % 2 else self.quiz, is_completed=i % 3 != 0, total_score=i)
+            for i in range(n)
+        ])
+
+    def walk(self, params=None):
+        ids, url, pages = [], '/api/history/', 0
+        while url:
+            res = self.client.get(url, params if pages == 0 else None)
+            ids += [row['id'] for row in res.data['results']]
+            url, pages = res.data['next'], pages + 1
+        return ids
+
+    def test_cursor_pages_cover_everything_in_order(self):
+        self.add_attempts(45)
+        ExamAttempt.objects.filter(id__in=list(ExamAttempt.objects.values_list('id', flat=True)[:10])).update(start_time=timezone.now())
+        ids = self.walk()
+        expected = list(ExamAttempt.objects.filter(user=self.user).order_by('-start_time', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+        first = self.client.get('/api/history/').data['results'][0]
+        self.assertEqual(set(first), {'id', 'exam_title', 'start_time', 'total_score', 'exam_total_marks', 'is_completed'})
+
+    def test_filters(self):
+        self.add_attempts(12)
+        ids = self.walk({'exam_type': 'MOCK_FULL', 'is_completed': 'true'})
+        expected = set(ExamAttempt.objects.filter(exam=self.mock, is_completed=True).values_list('id', flat=True))
+        self.assertEqual(set(ids), expected)
+
+    def test_page_cost_is_constant(self):
+        counts = []
+        for n in (5, 300):
+            self.add_attempts(n)
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get('/api/history/', {'page_size': 50})
+            self.assertEqual(len(res.data['results']), min(50, ExamAttempt.objects.count()))
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts, [1, 1])
+
+    def test_history_query_uses_index(self):
+        self.add_attempts(3)
+        for params in ({}, {'is_completed': 'true'}, {'exam_type': 'MOCK_FULL'}):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get('/api/history/', params)
+            sql = ctx.captured_queries[-1]['sql']
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}" if connection.vendor == 'sqlite' else f"EXPLAIN {sql}")
+                plan = " ".join(str(row) for row in cursor.fetchall())
+            # Either history index serves the filter + order (the planner picks by table stats)
+            self.assertRegex(plan, r'attempt_history(_status)?_idx')
+            self.assertNotIn('TEMP B-TREE', plan)  # no sort step
+
+    def test_summary(self):
+        self.add_attempts(6)
+        self.assertEqual(self.client.get('/api/history/summary/').data, {'attempts': 6, 'completed': 4, 'total_score': 15})
+
+
+class BenchmarkSuiteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        call_command('seed_benchmark_data', courses=2, subjects=1, chapters=2, exams=1, questions=5,
+                     quiz_questions=3, users=4, attempts=3, stdout=io.StringIO())
+
+    def test_seeded_dataset_is_consistent(self):
+        self.assertEqual(ExamAttempt.objects.filter(user__username__startswith='bench_').count(), 12)
+        # Summaries were rebuilt from the bulk-written attempts
+        self.assertEqual(sum(ExamScoreBucket.objects.values_list('count', flat=True)), 12)
+        self.assertEqual(QuestionStats.objects.count(), Question.objects.count())
+        self.assertTrue(all(Chapter.objects.values_list('study_notes', flat=True)))
+        self.assertEqual(SearchDocument.objects.count(), Question.objects.count() + Chapter.objects.count())
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark_data', users=1, stdout=io.StringIO())
+
+    def test_load_driver_reports_every_endpoint(self):
+        from benchmarks.load import ENDPOINTS, InProcessClient, load_students, run_load
+        students = load_students()
+        self.assertEqual(len(students), 4)
+        report = run_load(students, InProcessClient, iterations=1, concurrency=1)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(list(report['endpoints']), list(ENDPOINTS))
+        self.assertEqual(report['endpoints']['submit_exam']['requests'], 4)
+        self.assertTrue(all(row['queries_avg'] is not None for row in report['endpoints'].values()))
+
+
+class QueryBudgetTests(TestCase):
+    # Steady-state queries per request (caches warm). Each endpoint has a fixed budget and
+    # must cost the same at both data sizes: growth with the data is an N+1.
+    BUDGETS = {
+        'courses': 1, 'course': 2, 'enrolled': 1, 'chapters': 4, 'chapter': 4, 'topics': 1, 'topic': 1,
+        'exams': 3, 'exams_sparse': 1, 'exam': 1, 'start_attempt': 2, 'save_answers': 5, 'submit_exam': 11,
+        'check_answer': 1, 'leaderboard': 4, 'history': 1, 'history_summary': 1, 'banners': 1,
+        'send_otp': 2, 'verify_otp': 3, 'search': 1,
+    }
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, prefix, scale):
+        from benchmarks.load import load_students
+        call_command('seed_benchmark_data', prefix=prefix, courses=2 * scale, subjects=scale, chapters=2 * scale,
+                     exams=scale, questions=5 * scale, quiz_questions=2 * scale, users=2 * scale, attempts=3 * scale,
+                     stdout=io.StringIO())
+        user, exam_ids = load_students(prefix, 1)[0]
+        exam = Exam.objects.filter(id__in=exam_ids, exam_type='MOCK_FULL').order_by('id').first()
+        chapter = Chapter.objects.filter(quiz__id__in=exam_ids).order_by('id').first()
+        # Topics are not seeded: hang a few legacy topic quizzes off the chapter
+        for i in range(3 * scale):
+            topic = Topic.objects.create(chapter=chapter, title=f"{prefix} topic {i}", order=i)
+            Exam.objects.create(title=f"{prefix} Topic quiz {i}", exam_type='TOPIC_QUIZ', topic=topic)
+        return user, exam, chapter, topic
+
+    def measure(self, user, exam, chapter, topic):
+        from rest_framework_simplejwt.tokens import RefreshToken
+        refresh = RefreshToken.for_user(user)
+        refresh['token_version'] = user.token_version
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'JWT {refresh.access_token}')
+        counts = {}
+
+        def count(name, method, path, data=None, warm=True):
+            call = lambda: getattr(client, method)(f'/api/{path}', data, format='json')
+            if warm: call()
+            # Work deferred to after commit is part of the request's cost
+            with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+                res = call()
+            self.assertLess(res.status_code, 500, name)
+            counts[name] = len(ctx.captured_queries)
+            return res
+
+        question = Question.objects.filter(exam=exam).order_by('id').first()
+        answers = answer_sheet(exam)
+        course_id = exam.course_id
+        start = lambda: client.post(f'/api/exams/{exam.id}/start_attempt/').data['attempt_id']
+
+        count('courses', 'get', 'courses/')
+        count('course', 'get', f'courses/{course_id}/')
+        count('enrolled', 'get', 'courses/enrolled/')
+        count('chapters', 'get', 'chapters/')
+        count('chapter', 'get', f'chapters/{chapter.id}/')
+        count('topics', 'get', 'topics/')
+        count('topic', 'get', f'topics/{topic.id}/')
+        count('exams', 'get', 'exams/')
+        count('exams_sparse', 'get', 'exams/', {'fields': 'id,title'})
+        count('exam', 'get', f'exams/{exam.id}/')
+        count('start_attempt', 'post', f'exams/{exam.id}/start_attempt/')
+        attempt_id = start()
+        count('save_answers', 'post', f'exams/{exam.id}/save_answers/', {'attempt_id': attempt_id, 'answers': answers})
+        client.post(f'/api/exams/{exam.id}/submit_exam/', {'attempt_id': start(), 'answers': answers}, format='json')
+        count('submit_exam', 'post', f'exams/{exam.id}/submit_exam/', {'attempt_id': attempt_id, 'answers': answers}, warm=False)
+        count('check_answer', 'post', f'exams/{exam.id}/check_answer/', {'question_id': question.id, 'option_id': answers[str(question.id)]})
+        count('leaderboard', 'get', f'exams/{exam.id}/leaderboard/')
+        count('history', 'get', 'history/')
+        count('history_summary', 'get', 'history/summary/')
+        count('banners', 'get', 'banners/')
+        count('search', 'get', 'search/', {'q': 'polity budget'})
+        phone = f"8{user.id:09d}"  # A fresh phone per size: both calls stay inside its rate limit
+        count('send_otp', 'post', 'auth-otp/send_otp/', {'phone': phone})
+        count('verify_otp', 'post', 'auth-otp/verify_otp/', {'phone': phone, 'otp': '0000'})
+        return counts
+
+    def test_query_counts_do_not_grow_with_data(self):
+        small = self.measure(*self.seed('small', 1))
+        large = self.measure(*self.seed('large', 4))
+        self.assertEqual(small, large)
+        for name, budget in self.BUDGETS.items():
+            self.assertLessEqual(large[name], budget, name)
+
+    def test_hot_lookups_use_indexes(self):
+        user, exam, _, _ = self.seed('plan', 1)
+        attempt = ExamAttempt.objects.filter(user=user).first()
+        plans = {
+            # verify_otp's DELETE: the unique phone_number key
+            'phone_number=?': OTP.objects.filter(phone_number='9000000099', otp_code='1234', expires_at__gt=timezone.now()),
+            'subscription_lookup_idx': UserSubscription.objects.filter(user_id=user.id, active=True).values_list('course_id', flat=True),
+            'attempt_user_exam_idx': ExamAttempt.objects.filter(exam=exam, user=user, is_completed=True).order_by('-submit_time', '-id').values('id', 'total_score')[:1],
+            # (attempt, question) unique index already leads with the attempt
+            'attempt_id': StudentResponse.objects.filter(attempt_id=attempt.id).values_list('question_id', 'selected_option_id'),
+        }
+        for index, queryset in plans.items():
+            plan = queryset.explain()
+            self.assertIn(index, plan)
+            self.assertNotRegex(plan, r'SCAN (TABLE )?exams_(otp|usersubscription|examattempt|studentresponse)\b')
+
+
+class OTPStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+
+    def send(self, phone='9000000001', **extra):
+        return self.client.post('/api/auth-otp/send_otp/', {'phone': phone}, format='json', **extra)
+
+    def sent_code(self, phone='9000000001'):
+        self.assertEqual(self.send(phone).status_code, 200)
+        return OTP.objects.get(phone_number=phone).otp_code
+
+    def verify(self, code, phone='9000000001'):
+        return self.client.post('/api/auth-otp/verify_otp/', {'phone': phone, 'otp': code}, format='json')
+
+    def test_code_is_single_use_and_resend_replaces_it(self):
+        first = self.sent_code()
+        second = self.sent_code()
+        self.assertEqual(OTP.objects.filter(phone_number='9000000001').count(), 1)
+        if first != second: self.assertEqual(self.verify(first).status_code, 400)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.verify('0000' if second != '0000' else '1111').status_code, 400)
+        # One conditional DELETE, no fetch
+        otp_queries = [q['sql'] for q in ctx.captured_queries if 'exams_otp' in q['sql']]
+        self.assertEqual(len(otp_queries), 1)
+        self.assertTrue(otp_queries[0].startswith('DELETE'))
+        res = self.verify(second)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('access', res.data)
+        self.assertEqual(self.verify(second).status_code, 400)
+        self.assertFalse(OTP.objects.exists())
+
+    def test_expired_codes_fail_and_are_purged(self):
+        code = self.sent_code()
+        self.send(phone='9000000002')
+        OTP.objects.filter(phone_number='9000000001').update(expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        self.assertEqual(self.verify(code).status_code, 400)
+        out = io.StringIO()
+        call_command('purge_expired_otps', batch_size=1, stdout=out)
+        self.assertIn("Purged 1", out.getvalue())
+        self.assertEqual(list(OTP.objects.values_list('phone_number', flat=True)), ['9000000002'])
+
+    def test_send_is_limited_per_phone_and_per_ip(self):
+        for _ in range(3):
+            self.assertEqual(self.send().status_code, 200)
+        res = self.send()
+        self.assertEqual(res.status_code, 429)
+        self.assertGreater(int(res['Retry-After']), 0)
+        self.assertEqual(self.send(phone='9000000002').status_code, 200)
+        with override_settings(OTP_IP_LIMIT=2):
+            cache.clear()
+            self.send(phone='9000000003')
+            self.send(phone='9000000004')
+            self.assertEqual(self.send(phone='9000000005').status_code, 429)
+            self.assertEqual(self.send(phone='9000000005', REMOTE_ADDR='10.0.0.9').status_code, 200)
+        self.assertLessEqual(OTP.objects.count(), 5)
+
+    def test_forwarded_for_cannot_reset_the_ip_bucket(self):
+        with override_settings(OTP_IP_LIMIT=2):
+            for i in range(2): self.send(HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+            self.assertEqual(self.send(phone='9000000002', HTTP_X_FORWARDED_FOR='203.0.113.99').status_code, 429)
+
+    def test_unknown_numbers_share_one_bucket(self):
+        with override_settings(OTP_NEW_PHONE_LIMIT=2):
+            for i in range(2):
+                self.assertEqual(self.send(phone=f'800000000{i}', REMOTE_ADDR=f'10.0.0.{i}').status_code, 200)
+            self.assertEqual(self.send(phone='8000000009', REMOTE_ADDR='10.0.0.9').status_code, 429)
+            self.assertFalse(OTP.objects.filter(phone_number='8000000009').exists())
+            # Registered numbers are not held back by it
+            self.assertEqual(self.send().status_code, 200)
+
+    def test_code_survives_a_login_conflict(self):
+        self.user.last_login = timezone.now()
+        self.user.save()
+        code = self.sent_code()
+        self.assertEqual(self.verify(code).status_code, 409)
+        res = self.client.post('/api/auth-otp/verify_otp/', {'phone': '9000000001', 'otp': code, 'force_login': True}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(OTP.objects.exists())
+
+    def test_verify_guesses_are_limited(self):
+        code = self.sent_code()
+        wrong = '0000' if code != '0000' else '1111'
+        for _ in range(5):
+            self.assertEqual(self.verify(wrong).status_code, 400)
+        self.assertEqual(self.verify(code).status_code, 429)
+
+
+class SessionWriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post('/api/auth/jwt/create/', {'username': 'student', 'password': 'pass', 'force_login': True}, format='json')
+
+    def test_login_writes_only_session_columns(self):
+        from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.login()
+        self.assertEqual(res.status_code, 200)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "exams_user"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"token_version" = ("exams_user"."token_version" + 1)', updates[0])
+        self.assertIn('RETURNING "token_version"', updates[0])  # No separate read-back of the version
+        self.assertNotIn('"password"', updates[0])
+        self.assertEqual(OutstandingToken.objects.count(), 1)  # One refresh token per login
+
+        self.login()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 2)
+        # The cached auth row was written through: the token works without a DB read of the user
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {self.login().data['access']}")
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/history/').status_code, 200)
+
+    def test_logout_updates_last_logout_only(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {self.login().data['access']}")
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.post('/api/auth-otp/logout/').status_code, 200)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertRegex(updates[0], r'^UPDATE "exams_user" SET "last_logout" = [^,]+ WHERE')
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_logout)
+
+    def test_prune_removes_only_expired_tokens(self):
+        from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+        now = timezone.now()
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=self.user, jti=f"jti-{i}", token="t", created_at=now, expires_at=now + timezone.timedelta(hours=i - 5))
+            for i in range(8)
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens[:2] + tokens[6:]])
+        out = io.StringIO()
+        call_command('prune_jwt_tokens', batch_size=2, stdout=out)
+        self.assertIn("Pruned 6", out.getvalue())
+        self.assertEqual(sorted(OutstandingToken.objects.values_list('jti', flat=True)), ['jti-6', 'jti-7'])
+        self.assertEqual(BlacklistedToken.objects.count(), 2)
+
+
+class RenderCompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_orjson_matches_drf_renderer(self):
+        from decimal import Decimal
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+        data = {
+            'when': timezone.now(), 'price': Decimal('499.50'), 'label': gettext_lazy("Not found."),
+            'by_id': {1: 'a', 2: ['b', None, True, 1.5]}, 'text': "line\u2028break ünïcode",
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        # Pretty-printing falls back to the stock renderer
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=2'), JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_large_responses_are_compressed_when_accepted(self):
+        make_course(chapters=30)
+        plain = self.client.get('/api/courses/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertGreater(len(plain.content), 1024)
+
+        res = self.client.get('/api/courses/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertNotIn('Content-Encoding', self.client.get('/api/courses/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity'))
+        # Small bodies are not worth it
+        self.assertNotIn('Content-Encoding', self.client.get('/api/history/', HTTP_ACCEPT_ENCODING='gzip'))
+
+    def test_compressed_bodies_are_reused(self):
+        make_course(chapters=30)
+        self.client.get('/api/courses/')  # Build the snapshots
+        with mock.patch('exams.snapshots.compress', wraps=compress_body) as compress:
+            first = self.client.get('/api/courses/', HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get('/api/courses/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+    def test_precompressed_paper_is_not_recompressed(self):
+        exam = make_exam(40)
+        res = self.client.get(f'/api/exams/{exam.id}/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        plain = self.client.get(f'/api/exams/{exam.id}/')
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        # q=0 refuses gzip outright
+        refused = self.client.get(f'/api/exams/{exam.id}/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', refused)
+        self.assertEqual((refused.content, refused['ETag']), (plain.content, plain['ETag']))
+
+    def test_encoding_negotiation(self):
+        from . import middleware
+        with mock.patch.object(middleware, 'brotli', object()):
+            self.assertEqual(middleware.choose_encoding('gzip, deflate, br'), 'br')
+            self.assertEqual(middleware.choose_encoding('br;q=0.5, gzip'), 'gzip')
+            self.assertEqual(middleware.choose_encoding('*'), 'br')
+        with mock.patch.object(middleware, 'brotli', None):
+            self.assertEqual(middleware.choose_encoding('br'), None)
+            self.assertEqual(middleware.choose_encoding('br, gzip;q=0.1'), 'gzip')
+        self.assertEqual(middleware.choose_encoding(''), None)
+
+
+class ChapterNotesTests(TestCase):
+    source = "\n\n".join(["Intro $x_1$."] + [f"## Part {i}\n\nBody {i}" for i in range(5)])
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.course = Course.objects.create(title="UPSC")
+        subject = Subject.objects.create(course=self.course, title="Polity")
+        self.chapter = Chapter.objects.create(subject=subject, title="Rights", study_notes=self.source)
+
+    def test_rendering_is_sanitized_and_keeps_math(self):
+        sections = render_sections(
+            "# Title\n\n<script>alert(1)</script>[a](javascript:alert(1)) [b](java\tscript:x) "
+            "<img src=x onerror=alert(1)> <b onclick=\"x\">ok</b>\n\n$$\\frac{a_1}{b_2}$$ and $a*b*c$"
+        )
+        html = sections[0]['html']
+        for needle in ('<script', 'alert(1)</', 'javascript', 'onerror', 'onclick'):
+            self.assertNotIn(needle, html)
+        self.assertIn('<b>ok</b>', html)
+        self.assertIn('<span class="math math-display">\\frac{a_1}{b_2}</span>', html)
+        self.assertIn('<span class="math">a*b*c</span>', html)
+        self.assertEqual((sections[0]['title'], sections[0]['anchor'], sections[0]['level']), ('Title', 'title', 1))
+
+    def test_self_closing_tags_inside_dropped_elements(self):
+        sections = render_sections(
+            "Before <math><mi>x</mi><mspace/></math> after <svg><circle r=\"1\"/></svg> tail\n\n"
+            "## Next\n\nBody <svg/> end"
+        )
+        self.assertEqual([s['title'] for s in sections], [None, "Next"])
+        self.assertEqual(sections[0]['html'], "<p>Before  after  tail</p>")
+        self.assertEqual(sections[1]['html'], '<h2 id="next">Next</h2>\n<p>Body  end</p>')
+
+    def test_sections_are_paged_by_heading(self):
+        url = f'/api/chapters/{self.chapter.id}/notes/'
+        first = self.client.get(url, {'count': 2}).json()
+        self.assertEqual(first['total_sections'], 6)
+        self.assertEqual([s['title'] for s in first['toc']], [f"Part {i}" for i in range(5)])
+        self.assertEqual([s['index'] for s in first['sections']], [0, 1])
+        self.assertIn('<span class="math">x_1</span>', first['sections'][0]['html'])
+        self.assertEqual(first['next'], 2)
+
+        last = self.client.get(url, {'section': 4, 'count': 50}).json()
+        self.assertEqual([s['title'] for s in last['sections']], ["Part 3", "Part 4"])
+        self.assertIsNone(last['next'])
+
+    def test_etag_revalidation_skips_the_stored_document(self):
+        url = f'/api/chapters/{self.chapter.id}/notes/'
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(res.status_code, 304)
+        self.assertFalse([q for q in queries.captured_queries if 'sections' in q['sql']])
+
+        # A changed chapter gets a new tag
+        self.chapter.study_notes += "\n\n## Part 5"
+        self.chapter.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.json()['total_sections'], 7)
+
+        # So does a renamed one: the page carries the title too
+        etag = res['ETag']
+        self.chapter.title = "Algebra II"
+        self.chapter.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((res.status_code, res.json()['title']), (200, "Algebra II"))
+
+    def test_bulk_edits_rebuild_on_next_read(self):
+        self.assertTrue(ChapterNotes.objects.filter(chapter=self.chapter).exists())
+        from .notes import invalidate_notes
+        Chapter.objects.filter(id=self.chapter.id).update(study_notes="# Fresh")
+        invalidate_notes([self.chapter.id])
+        body = self.client.get(f'/api/chapters/{self.chapter.id}/notes/').json()
+        self.assertEqual(body['toc'][0]['title'], "Fresh")
+        self.assertEqual(ChapterNotes.objects.get(chapter=self.chapter).version, body['version'])
+
+    def test_paid_notes_need_a_subscription(self):
+        Course.objects.filter(id=self.course.id).update(is_paid=True)
+        self.course.refresh_from_db()
+        self.course.save()  # rotate the entitlement cache
+        self.assertEqual(self.client.get(f'/api/chapters/{self.chapter.id}/notes/').status_code, 403)
+        UserSubscription.objects.create(user=self.user, course=self.course, active=True)
+        self.assertEqual(self.client.get(f'/api/chapters/{self.chapter.id}/notes/').status_code, 200)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student', password='pass', phone_number='9000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.course = Course.objects.create(title="UPSC")
+        subject = Subject.objects.create(course=self.course, title="Polity")
+        self.chapter = Chapter.objects.create(subject=subject, title="Fundamental Rights", study_notes="<b>Amendments</b> to the constitution")
+        self.exam = Exam.objects.create(title="Rights quiz", exam_type='TOPIC_QUIZ', chapter=self.chapter)
+        self.question = Question.objects.create(exam=self.exam, text_content="Which amendment added Article 21A?",
+                                                explanation="The 86th amendment, 2002.")
+
+    def search(self, q, **params):
+        return self.client.get('/api/search/', {'q': q, **params}).json()
+
+    def hits(self, q, **params):
+        return [(r['kind'], r['id']) for r in self.search(q, **params)['results']]
+
+    def test_ranked_stemmed_matches_with_highlights(self):
+        body = self.search("amendments")
+        self.assertEqual([(r['kind'], r['id']) for r in body['results']], [('question', self.question.id), ('chapter', self.chapter.id)])
+        self.assertIn('<mark>amendment</mark>', body['results'][0]['snippet'])
+        self.assertEqual(body['results'][0]['exam_id'], self.exam.id)
+        # Prefix match on the last word; operators in the query are plain text
+        self.assertEqual(self.hits("artic"), [('question', self.question.id)])
+        self.assertEqual(self.hits("amend", kind='chapter'), [('chapter', self.chapter.id)])
+        self.assertEqual(self.search('"NEAR( OR * ^')['results'], [])
+        self.assertEqual(self.search('')['results'], [])
+
+    def test_index_follows_edits(self):
+        self.question.text_content = "Which schedule lists the official languages?"
+        self.question.save()
+        self.assertEqual(self.hits("article"), [])
+        self.assertEqual(self.hits("languages"), [('question', self.question.id)])
+
+        self.chapter.delete()
+        self.assertEqual(self.hits("constitution"), [])
+        self.assertFalse(SearchDocument.objects.filter(kind='chapter').exists())
+
+    def test_results_respect_entitlements(self):
+        paid = Course.objects.create(title="Paid", is_paid=True)
+        exam = Exam.objects.create(title="Mock", exam_type='MOCK_FULL')
+        question = Question.objects.create(exam=exam, text_content="Amendment procedure under Article 368?")
+        exam.course = paid
+        exam.save()  # moves the indexed question to the paid course
+        self.assertEqual(self.hits("368"), [])
+        UserSubscription.objects.create(user=self.user, course=paid, active=True)
+        self.assertEqual(self.hits("368"), [('question', question.id)])
+
+    def test_moving_a_subject_moves_its_documents(self):
+        self.assertEqual(len(self.hits("amendment")), 2)
+        paid = Course.objects.create(title="Paid", is_paid=True)
+        subject = self.chapter.subject
+        subject.course = paid
+        subject.save()
+        # Notes and the chapter quiz now live in a course the student has not bought
+        self.assertEqual(self.hits("amendment"), [])
+        self.assertEqual(set(SearchDocument.objects.values_list('course_id', flat=True)), {paid.id})
+
+    def test_pages(self):
+        exam = Exam.objects.create(title="Mock", exam_type='MOCK_FULL', course=self.course)
+        for i in range(5): Question.objects.create(exam=exam, text_content=f"Preamble question {i}")
+        first = self.search("preamble", page_size=2)
+        self.assertEqual((len(first['results']), first['next']), (2, 2))
+        last = self.search("preamble", page_size=2, page=3)
+        self.assertEqual((len(last['results']), last['next']), (1, None))
+        seen = {r['id'] for p in (1, 2, 3) for r in self.search("preamble", page_size=2, page=p)['results']}
+        self.assertEqual(len(seen), 5)
+
+    def test_flags_matches_cut_off_by_the_rank_window(self):
+        exam = Exam.objects.create(title="Mock", exam_type='MOCK_FULL', course=self.course)
+        for i in range(5): Question.objects.create(exam=exam, text_content=f"Preamble question {i}")
+        self.assertFalse(self.search("preamble")['truncated'])
+        with mock.patch('exams.search.RANK_WINDOW', 3):
+            body = self.search("preamble")
+            self.assertEqual((len(body['results']), body['truncated']), (3, True))
+            self.assertFalse(self.search("preamble", kind='chapter')['truncated'])
+        with mock.patch('exams.search.RANK_WINDOW', 5):
+            body = self.search("preamble")
+            self.assertEqual((len(body['results']), body['truncated']), (5, False))
+
+    def test_bulk_imports_and_rebuild(self):
+        admin = User.objects.create_superuser(username='admin', password='pass', phone_number='9000000000')
+        self.client.force_authenticate(admin)
+        res = self.client.post('/api/ai-generator/upload_questions_csv/', {'file': csv_upload(["Bicameral legislature?,A,B,C,D,A,2,Two houses"]),
+                                                                           'exam_id': self.exam.id}, format='multipart')
+        self.assertEqual(res.status_code, 200, res.content)
+        self.assertEqual(len(self.hits("bicameral")), 1)
+
+        SearchDocument.objects.all().delete()
+        SearchDocument.objects.create(kind='question', object_id=999999, title="stale bicameral")
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn("Indexed 3 documents", out.getvalue())
+        self.assertEqual(len(self.hits("bicameral")), 1)
+        self.assertEqual(len(self.hits("constitution")), 1)
 
-# Create your tests here.
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     CourseViewSet, TopicViewSet, ChapterViewSet, ExamViewSet, 
     AttemptHistoryViewSet, AIGeneratorViewSet, BulkNotesViewSet, 
-    AdBannerViewSet, AuthViewSet
+    AdBannerViewSet, AuthViewSet, SearchViewSet
 )
 
 router = DefaultRouter()
@@ -16,6 +16,7 @@ router.register(r'ai-generator', AIGeneratorViewSet, basename='ai-generator')
 router.register(r'bulk-notes', BulkNotesViewSet, basename='bulk-notes')
 router.register(r'banners', AdBannerViewSet)
 router.register(r'auth-otp', AuthViewSet, basename='auth-otp')
+router.register(r'search', SearchViewSet, basename='search')
 
 urlpatterns = [
     path('', include(router.urls)),
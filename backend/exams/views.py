@@ -1,10 +1,9 @@
-import random
-import csv
-import codecs
-from io import TextIOWrapper
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django.utils.cache import patch_vary_headers
 from django.db import transaction
+from django.db.models import F, Prefetch, Q, Count, Sum, BooleanField, ExpressionWrapper, prefetch_related_objects
 from django.conf import settings
 
 # DRF & JWT Imports
@@ -12,14 +11,34 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
-from .models import Course, Exam, ExamAttempt, Question, Option, StudentResponse, Topic, Chapter, Subject, AdBanner, UserSubscription, User, OTP
-from .serializers import CourseSerializer, ExamSerializer, ExamAttemptSerializer, TopicSerializer, AdBannerSerializer, ChapterSerializer
-from .ai_service import generate_questions_from_text, generate_question_from_image
+from .models import Course, Exam, ExamAttempt, Topic, Chapter, AdBanner, UserSubscription, User, AIGenerationJob
+from .serializers import CourseSerializer, ExamSerializer, ExamAttemptSerializer, TopicSerializer, AdBannerSerializer, ChapterSerializer, AIGenerationJobSerializer, sparse_params
+from . import ai_cache
+from .ai_jobs import MAX_BATCH_IMAGES, enqueue_text_job, enqueue_image_job, save_generated_questions, NoNotesFound
 from .permissions import IsPaidSubscriberOrAdmin
+from .grading import submit_attempt, autosave_answers, AlreadySubmitted
+from .answer_key import get_answer_key
+from .papers import get_paper
+from .snapshots import get_body
+from .notes import get_notes, notes_etag
+from .search import search, PAGE_SIZE as SEARCH_PAGE_SIZE
+from .middleware import choose_encoding
+from .entitlements import subscribed_course_ids
+from .ranking import completed_attempts, standing, top_attempts
+from .question_stats import question_report
+from .pagination import HistoryCursorPagination
+from .importers import QuestionCSVImporter, NotesCSVImporter, RowError
+from .otp import issue_otp, consume_otp, throttle, throttle_new_phone
+from .authentication import start_session, end_session
+
+def is_truthy(value):
+    # Form-data flags arrive as strings
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
 
 # --- CUSTOM EXCEPTION FOR CONFLICT ---
 class Conflict(APIException):
@@ -30,7 +49,8 @@ class Conflict(APIException):
 # --- CUSTOM PASSWORD LOGIN (Fixed Logic) ---
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
-        data = super().validate(attrs)
+        # Authenticate only: TokenObtainPairSerializer would also issue (and record) a refresh token we replace below
+        data = super(TokenObtainPairSerializer, self).validate(attrs)
         
         request = self.context.get('request')
         force_login = request.data.get('force_login', False)
@@ -49,9 +69,7 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
              })
         
         # Valid Login Process
-        self.user.token_version += 1
-        self.user.last_login = timezone.now()
-        self.user.save()
+        start_session(self.user)
         
         refresh = RefreshToken.for_user(self.user)
         refresh['token_version'] = self.user.token_version 
@@ -72,17 +90,27 @@ class AuthViewSet(viewsets.ViewSet):
     # --- LOGOUT ENDPOINT (Critical for clean sessions) ---
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def logout(self, request):
-        user = request.user
-        user.last_logout = timezone.now()
-        user.save()
+        end_session(request.user)
         return Response({"status": "success", "message": "Logged out successfully"})
 
+    def _throttled(self, action_name, phone):
+        # get_ident honours REST_FRAMEWORK['NUM_PROXIES'] (REMOTE_ADDR unless proxies are configured)
+        return self._retry_later(throttle(action_name, phone, BaseThrottle().get_ident(self.request)))
+
+    def _retry_later(self, wait):
+        if not wait: return None
+        return Response({"error": "Too many requests. Please try again later.", "retry_after": wait},
+                        status=429, headers={'Retry-After': str(wait)})
+
     @action(detail=False, methods=['post'])
     def send_otp(self, request):
         phone = request.data.get('phone')
         if not phone: return Response({"error": "Phone number required"}, status=400)
-        otp_code = str(random.randint(1000, 9999))
-        OTP.objects.create(phone_number=phone, otp_code=otp_code)
+        limited = self._throttled('send', phone)
+        if not limited and not User.objects.filter(phone_number=phone).exists():
+            limited = self._retry_later(throttle_new_phone())
+        if limited: return limited
+        otp_code = issue_otp(phone)
         print(f"XXX OTP for {phone} is: {otp_code} XXX")
         if settings.DEBUG:
             return Response({"status": "success", "message": f"OTP sent to {phone}", "debug_otp": otp_code})
@@ -93,12 +121,16 @@ class AuthViewSet(viewsets.ViewSet):
         phone = request.data.get('phone')
         otp_input = request.data.get('otp')
         force_login = request.data.get('force_login', False)
-        
-        otp_record = OTP.objects.filter(phone_number=phone, otp_code=otp_input).last()
-        if not otp_record or not otp_record.is_valid():
-            return Response({"error": "Invalid or expired OTP"}, status=400)
-        
-        return self._perform_login(phone, force_login)
+
+        limited = self._throttled('verify', phone)
+        if limited: return limited
+        with transaction.atomic():
+            if not consume_otp(phone, otp_input):
+                return Response({"error": "Invalid or expired OTP"}, status=400)
+            response = self._perform_login(phone, force_login)
+            # Keep the code for the force_login retry after a 409 (or registering after a 404)
+            if response.status_code != 200: transaction.set_rollback(True)
+        return response
 
     @action(detail=False, methods=['post'])
     def firebase_exchange(self, request):
@@ -125,9 +157,7 @@ class AuthViewSet(viewsets.ViewSet):
                  "requires_confirmation": True
              }, status=409)
 
-        user.token_version += 1
-        user.last_login = timezone.now()
-        user.save()
+        start_session(user)
         
         refresh = RefreshToken.for_user(user)
         refresh['token_version'] = user.token_version
@@ -139,46 +169,145 @@ class AuthViewSet(viewsets.ViewSet):
             "role": "admin" if user.is_superuser else "student"
         })
 
+# --- SPARSE FIELDSETS (Only fetch what the pruned serializer renders) ---
+def is_sparse(request):
+    spec, depth = sparse_params(request)
+    return spec is not None or depth is not None
+
+def chapter_queryset_for(fields):
+    if 'study_notes' in fields: return Chapter.objects.all()
+    return Chapter.objects.defer('study_notes').annotate(
+        notes_present=ExpressionWrapper(~Q(study_notes=''), output_field=BooleanField())
+    )
+
+def chapter_prefetches_for(fields, prefix=''):
+    lookups = []
+    if 'topics' in fields or 'quiz_details' in fields:
+        lookups += [f'{prefix}topics', f'{prefix}topics__quiz_legacy']
+    if 'quiz_details' in fields:
+        lookups.append(f'{prefix}quiz')
+    return lookups
+
+def course_prefetches_for(fields):
+    lookups = []
+    if 'subjects' in fields:
+        subject_fields = fields['subjects'].child.fields
+        lookups.append('subjects')
+        if 'tests' in subject_fields: lookups.append('subjects__tests')
+        if 'chapters' in subject_fields:
+            chapter_fields = subject_fields['chapters'].child.fields
+            lookups.append(Prefetch('subjects__chapters', queryset=chapter_queryset_for(chapter_fields)))
+            lookups += chapter_prefetches_for(chapter_fields, 'subjects__chapters__')
+    if 'mocks' in fields or 'pyqs' in fields:
+        lookups.append('mocks')
+    return lookups
+
 # --- STUDENT/ADMIN VIEWS ---
 class CourseViewSet(viewsets.ReadOnlyModelViewSet):
-    # Optimized Prefetch
-    queryset = Course.objects.prefetch_related(
-        'subjects',
-        'subjects__chapters',
-        'subjects__chapters__topics',
-        'subjects__chapters__quiz',
-        'subjects__chapters__topics__quiz_legacy',
-        'subjects__tests',
-        'mocks',
-        'pyqs'
-    ).all()
+    # Responses are stitched from materialized snapshots (see snapshots.py)
+    queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def _snapshot_response(self, courses, many=True):
+        versions = list(courses.order_by('id').values_list('id', 'snapshot__version'))
+        body, coding = get_body(versions, many, choose_encoding(self.request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        response = HttpResponse(body, content_type='application/json')
+        if coding:
+            response['Content-Encoding'] = coding
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def _sparse_queryset(self, courses):
+        fields = self.get_serializer().fields
+        if 'description' not in fields: courses = courses.defer('description')
+        return courses.prefetch_related(*course_prefetches_for(fields)).order_by('id')
+
+    def list(self, request, *args, **kwargs):
+        if is_sparse(request):
+            return Response(self.get_serializer(self._sparse_queryset(Course.objects.all()), many=True).data)
+        return self._snapshot_response(Course.objects.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        course = self.get_object()
+        if is_sparse(request):
+            prefetch_related_objects([course], *course_prefetches_for(self.get_serializer().fields))
+            return Response(self.get_serializer(course).data)
+        return self._snapshot_response(Course.objects.filter(id=course.id), many=False)
+
     @action(detail=False, methods=['get'])
     def enrolled(self, request):
         if not request.user.is_authenticated: return Response([])
-        subscribed_ids = UserSubscription.objects.filter(user=request.user, active=True).values_list('course_id', flat=True)
-        courses = Course.objects.filter(id__in=subscribed_ids).prefetch_related(
-            'subjects', 'subjects__chapters', 'subjects__chapters__topics',
-            'subjects__chapters__quiz', 'subjects__chapters__topics__quiz_legacy',
-            'subjects__tests', 'mocks'
-        )
-        serializer = self.get_serializer(courses, many=True)
-        return Response(serializer.data)
+        courses = Course.objects.filter(id__in=subscribed_course_ids(request.user))
+        if is_sparse(request):
+            return Response(self.get_serializer(self._sparse_queryset(courses), many=True).data)
+        return self._snapshot_response(courses)
     
     
+NOTES_PAGE_SIZE = 3
+NOTES_PAGE_MAX = 10
+
 class ChapterViewSet(viewsets.ModelViewSet):
     queryset = Chapter.objects.all()
     serializer_class = ChapterSerializer
+
+    def get_queryset(self):
+        if self.action == 'notes':
+            # The rendered row is read separately; skip the Markdown source entirely
+            return Chapter.objects.only('id', 'title').annotate(notes_version=F('rendered_notes__version'))
+        if self.action not in ['list', 'retrieve']: return super().get_queryset()
+        fields = self.get_serializer().fields
+        return chapter_queryset_for(fields).prefetch_related(*chapter_prefetches_for(fields))
+
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']: permission_classes = [permissions.IsAuthenticated, IsPaidSubscriberOrAdmin]
+        if self.action in ['list', 'retrieve', 'notes']: permission_classes = [permissions.IsAuthenticated, IsPaidSubscriberOrAdmin]
         else: permission_classes = [permissions.IsAdminUser]
         return [permission() for permission in permission_classes]
 
+    # --- PRE-RENDERED NOTES (section pages by heading, ETag / 304) ---
+    @action(detail=True, methods=['get'])
+    def notes(self, request, pk=None):
+        chapter = self.get_object()
+        try:
+            start = max(0, int(request.query_params.get('section', 0)))
+            count = min(NOTES_PAGE_MAX, max(1, int(request.query_params.get('count', NOTES_PAGE_SIZE))))
+        except ValueError:
+            start, count = 0, NOTES_PAGE_SIZE
+
+        # The stored version is current (saves rebuild it, bulk edits delete it), so a
+        # revalidation can be answered before the sections are even loaded
+        if chapter.notes_version:
+            etag = notes_etag(chapter.notes_version, chapter.title, start, count)
+            if etag in [tag.removeprefix('W/') for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))]:
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+        version, sections = get_notes(chapter.id, chapter.notes_version)
+        page = sections[start:start + count]
+        response = Response({
+            "chapter_id": chapter.id,
+            "title": chapter.title,
+            "version": version,
+            "total_sections": len(sections),
+            "toc": [{"index": i, "title": s['title'], "anchor": s['anchor'], "level": s['level']} for i, s in enumerate(sections) if s['title']],
+            "sections": [{"index": start + i, **section} for i, section in enumerate(page)],
+            "next": start + count if start + count < len(sections) else None,
+        })
+        response['ETag'] = notes_etag(version, chapter.title, start, count)
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
 class TopicViewSet(viewsets.ModelViewSet):
     queryset = Topic.objects.all()
     serializer_class = TopicSerializer
+
+    def get_queryset(self):
+        # quiz_id reads the reverse one-to-one: join it instead of a query per topic
+        if self.action not in ['list', 'retrieve']: return super().get_queryset()
+        return Topic.objects.select_related('quiz_legacy')
+
     def get_permissions(self):
         if self.action in ['list', 'retrieve']: permission_classes = [permissions.IsAuthenticated, IsPaidSubscriberOrAdmin]
         else: permission_classes = [permissions.IsAdminUser]
@@ -189,69 +318,129 @@ class ExamViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ExamSerializer
     permission_classes = [permissions.IsAuthenticated, IsPaidSubscriberOrAdmin]
 
+    def get_queryset(self):
+        if self.action == 'list' and 'questions' in self.get_serializer().fields:
+            return Exam.objects.prefetch_related('questions__options')
+        return super().get_queryset()
+
+    # --- PRE-SERIALIZED PAPER (ETag / 304) ---
+    def retrieve(self, request, *args, **kwargs):
+        exam = self.get_object()
+        if is_sparse(request):
+            serializer = self.get_serializer(exam)
+            if 'questions' in serializer.fields: prefetch_related_objects([exam], 'questions__options')
+            return Response(serializer.data)
+
+        paper = get_paper(exam)
+        # Only a gzip copy is stored, so that is the one coding on offer
+        use_gzip = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), offers=['gzip']) == 'gzip'
+        etag = paper['gzip_etag'] if use_gzip else paper['etag']
+
+        # Weak comparison: CompressionMiddleware hands out W/ tags for bodies it compressed
+        if etag in [tag.removeprefix('W/') for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))]:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(paper['gzip'] if use_gzip else paper['raw'], content_type='application/json')
+            if use_gzip: response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding, Authorization'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
     @action(detail=True, methods=['post'])
     def start_attempt(self, request, pk=None):
         exam = self.get_object()
         attempt = ExamAttempt.objects.create(user=request.user, exam=exam)
         return Response({'attempt_id': attempt.id, 'start_time': attempt.start_time, 'duration': exam.duration_minutes})
 
+    # --- AUTOSAVE: Upsert a small batch of answer changes ---
+    @action(detail=True, methods=['post'])
+    def save_answers(self, request, pk=None):
+        exam = self.get_object()
+        try:
+            saved = autosave_answers(exam, request.user, request.data.get('attempt_id'), request.data.get('answers', {}))
+        except ExamAttempt.DoesNotExist:
+            return Response({"error": "Invalid attempt"}, status=400)
+        except AlreadySubmitted:
+            return Response({"error": "Exam already submitted"}, status=400)
+        return Response({"status": "saved", "saved": saved})
+
     @action(detail=True, methods=['post'])
     def submit_exam(self, request, pk=None):
         exam = self.get_object()
-        data = request.data
-        attempt_id = data.get('attempt_id')
-        answers = data.get('answers', {})
+        attempt_id = request.data.get('attempt_id')
+        answers = request.data.get('answers', {})
 
         try:
-            attempt = ExamAttempt.objects.get(id=attempt_id, user=request.user, exam=exam)
+            score = submit_attempt(exam, request.user, attempt_id, answers)
         except ExamAttempt.DoesNotExist:
             return Response({"error": "Invalid attempt"}, status=400)
-
-        if attempt.is_completed:
+        except AlreadySubmitted:
             return Response({"error": "Exam already submitted"}, status=400)
 
-        score = 0
-        questions_map = {q.id: q for q in exam.questions.all()}
-        
-        for q_id, opt_id in answers.items():
-            question = questions_map.get(int(q_id))
-            if not question: continue
-            
-            try:
-                selected_option = Option.objects.get(id=opt_id, question=question)
-            except Option.DoesNotExist: continue
-
-            StudentResponse.objects.create(attempt=attempt, question=question, selected_option=selected_option)
+        return Response({"score": score, "total_marks": exam.total_marks, "status": "Completed"})
 
-            if selected_option.is_correct:
-                score += question.marks
-            else:
-                score -= (question.marks * exam.negative_marking_ratio)
+    # --- LEADERBOARD (score histogram; cost does not grow with attempts) ---
+    @action(detail=True, methods=['get'])
+    def leaderboard(self, request, pk=None):
+        exam = self.get_object()
+        try:
+            top = int(request.query_params.get('top', 10))
+        except ValueError:
+            top = 10
+
+        # The caller's standing: the given attempt, else their latest completed one
+        mine = ExamAttempt.objects.filter(exam=exam, user=request.user, is_completed=True)
+        attempt_id = request.query_params.get('attempt_id')
+        if attempt_id:
+            if not str(attempt_id).isdigit(): raise Http404
+            mine = mine.filter(id=attempt_id)
+        attempt = mine.order_by('-submit_time', '-id').values('id', 'total_score').first()
+
+        # One histogram read either way: the caller's standing carries the total
+        me = None
+        if attempt:
+            me = {"attempt_id": attempt['id'], "score": attempt['total_score'], **standing(exam.id, attempt['total_score'])}
+            total = me.pop('total')
+        else:
+            total = completed_attempts(exam.id)
 
-        attempt.total_score = max(0, score)
-        attempt.submit_time = timezone.now()
-        attempt.is_completed = True
-        attempt.save()
+        return Response({
+            "exam_id": exam.id,
+            "total_attempts": total,
+            "top": top_attempts(exam.id, max(top, 0)),
+            "me": me,
+        })
 
-        return Response({"score": attempt.total_score, "total_marks": exam.total_marks, "status": "Completed"})
+    # --- QUESTION ANALYTICS (admin; reads the totals tables) ---
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def stats(self, request, pk=None):
+        exam = self.get_object()
+        summary, questions = question_report(exam.id)
+        return Response({"exam_id": exam.id, "summary": summary, "questions": questions})
 
     # --- NEW: Check Single Answer (For Practice Mode) ---
     @action(detail=True, methods=['post'])
     def check_answer(self, request, pk=None):
-        question_id = request.data.get('question_id')
+        key = get_answer_key(self.get_object())
+        try:
+            question_id = int(request.data.get('question_id'))
+        except (TypeError, ValueError):
+            raise Http404
+        if question_id not in key['questions']: raise Http404
+
+        correct_option_id, _, explanation = key['questions'][question_id]
         option_id = request.data.get('option_id')
-        question = get_object_or_404(Question, id=question_id)
-        correct_option = question.options.filter(is_correct=True).first()
         is_correct = False
         if option_id:
             try:
-                selected = Option.objects.get(id=option_id)
-                is_correct = selected.is_correct
-            except: pass
+                option = key['options'].get(int(option_id))
+                is_correct = bool(option and option[0] == question_id and option[1])
+            except (TypeError, ValueError): pass
         return Response({
             "is_correct": is_correct,
-            "correct_option_id": correct_option.id if correct_option else None,
-            "explanation": question.explanation
+            "correct_option_id": correct_option_id,
+            "explanation": explanation
         })
 
     @action(detail=True, methods=['post'])
@@ -270,53 +459,103 @@ class ExamViewSet(viewsets.ReadOnlyModelViewSet):
 class AttemptHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ExamAttemptSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HistoryCursorPagination
 
     def get_queryset(self):
-        return ExamAttempt.objects.filter(user=self.request.user).order_by('-start_time')
+        # ?is_completed=true|false and ?exam_type=MOCK_FULL narrow the keyset walk
+        queryset = ExamAttempt.objects.filter(user=self.request.user)
+        is_completed = self.request.query_params.get('is_completed')
+        if is_completed not in (None, ''):
+            queryset = queryset.filter(is_completed=is_truthy(is_completed))
+        exam_type = self.request.query_params.get('exam_type')
+        if exam_type:
+            queryset = queryset.filter(exam__exam_type=exam_type)
+        return queryset.select_related('exam').only(
+            'id', 'start_time', 'total_score', 'is_completed', 'exam__title', 'exam__total_marks'
+        )
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        # Lifetime totals for the dashboard (pages no longer carry everything)
+        totals = ExamAttempt.objects.filter(user=request.user).aggregate(
+            attempts=Count('id'),
+            completed=Count('id', filter=Q(is_completed=True)),
+            total_score=Sum('total_score'),
+        )
+        totals['total_score'] = totals['total_score'] or 0
+        return Response(totals)
 
 # --- ADMIN VIEWS ---
 
 class AIGeneratorViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAdminUser]
 
+    # --- AI GENERATION (queued; run by `manage.py run_ai_worker`) ---
+    def job_params(self, request):
+        params = {
+            'difficulty': request.data.get('difficulty', 'Medium'),
+            'custom_instructions': request.data.get('custom_instructions', ''),
+            # Skip the AI result cache and ask the model again (the fresh answer replaces the cached one)
+            'bypass_cache': is_truthy(request.data.get('bypass_cache')),
+        }
+        # Optional: let the worker save the results straight into an exam (same fields as save_bulk)
+        if is_truthy(request.data.get('auto_save')):
+            params['save'] = {
+                'exam_id': request.data.get('exam_id'),
+                'new_exam_title': request.data.get('new_exam_title'),
+                'duration': request.data.get('duration'),
+            }
+        return params
+
+    def job_accepted(self, job):
+        return Response({"job_id": job.id, "status": job.status}, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        # ... (Keep existing generate logic)
         topic_id = request.data.get('topic_id')
         source_type = request.data.get('source_type')
         source_id = request.data.get('source_id')
         num_questions = int(request.data.get('num_questions', 5))
-        difficulty = request.data.get('difficulty', 'Medium')
-        custom_instructions = request.data.get('custom_instructions', '')
         if not source_id and topic_id: source_id = topic_id
         if not source_type: source_type = 'topic'
         if source_type == 'topic': source_type = 'chapter' 
-        text_content = ""
-        if source_type == 'chapter':
-            chapter = get_object_or_404(Chapter, id=source_id)
-            text_content = chapter.study_notes or ""
-        elif source_type == 'subject':
-            chapters = Chapter.objects.filter(subject_id=source_id)
-            for ch in chapters:
-                if ch.study_notes: text_content += f"\n\n--- Chapter: {ch.title} ---\n{ch.study_notes}"
-        elif source_type == 'course':
-            chapters = Chapter.objects.filter(subject__course_id=source_id)[:20]
-            for ch in chapters:
-                if ch.study_notes: text_content += f"\n\n--- Chapter: {ch.title} ---\n{ch.study_notes}"
-        if not text_content: return Response({"error": "No notes found to generate from."}, status=400)
-        questions_json = generate_questions_from_text(text_content, num_questions, difficulty, custom_instructions)
-        return Response(questions_json)
+        if source_type == 'chapter': get_object_or_404(Chapter, id=source_id)
+
+        params = self.job_params(request)
+        params.update(source_type=source_type, source_id=source_id, num_questions=num_questions)
+        try:
+            job = enqueue_text_job(request.user, params)
+        except NoNotesFound as e:
+            return Response({"error": str(e)}, status=400)
+        return self.job_accepted(job)
 
     @action(detail=False, methods=['post'])
     def generate_image(self, request):
         image = request.FILES.get('image')
-        difficulty = request.data.get('difficulty', 'Medium')
-        custom_instructions = request.data.get('custom_instructions', '')
         if not image: return Response({"error": "No image uploaded"}, status=400)
-        questions = generate_question_from_image(image, difficulty, custom_instructions)
-        return Response(questions)
-    
-    # --- IMPROVED CSV UPLOAD ---
+        job = enqueue_image_job(request.user, [image], self.job_params(request))
+        return self.job_accepted(job)
+
+    @action(detail=False, methods=['post'])
+    def generate_images(self, request):
+        # Batch variant: one job, one question per image, per-image errors in the result
+        images = request.FILES.getlist('images')
+        if not images: return Response({"error": "No images uploaded"}, status=400)
+        if len(images) > MAX_BATCH_IMAGES:
+            return Response({"error": f"Upload at most {MAX_BATCH_IMAGES} images per batch"}, status=400)
+        job = enqueue_image_job(request.user, images, self.job_params(request))
+        return self.job_accepted(job)
+
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9]+)')
+    def job_status(self, request, job_id=None):
+        job = get_object_or_404(AIGenerationJob, id=job_id)
+        return Response(AIGenerationJobSerializer(job).data)
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        return Response(ai_cache.stats())
+
+    # --- IMPROVED CSV UPLOAD (Streamed, chunked bulk inserts) ---
     @action(detail=False, methods=['post'])
     def upload_questions_csv(self, request):
         file_obj = request.FILES.get('file')
@@ -326,85 +565,22 @@ class AIGeneratorViewSet(viewsets.ViewSet):
             return Response({"error": "File and Exam ID required"}, status=400)
             
         exam = get_object_or_404(Exam, id=exam_id)
-        
         try:
-            # 1. Stream & Decode (Fix memory issues & BOM)
-            decoded_file = codecs.iterdecode(file_obj, 'utf-8-sig')
-            reader = csv.DictReader(decoded_file)
-            
-            # 2. Normalize Headers
-            header_map = {}
-            if reader.fieldnames:
-                for field in reader.fieldnames:
-                    clean = field.strip().lower()
-                    if 'question' in clean: header_map['question'] = field
-                    elif 'option a' in clean: header_map['a'] = field
-                    elif 'option b' in clean: header_map['b'] = field
-                    elif 'option c' in clean: header_map['c'] = field
-                    elif 'option d' in clean: header_map['d'] = field
-                    elif 'correct' in clean: header_map['correct'] = field
-                    elif 'mark' in clean: header_map['marks'] = field
-
-            count = 0
-            skipped = 0
-            total_new_marks = 0
-
-            for row in reader:
-                q_text = row.get(header_map.get('question'), '').strip()
-                options = [
-                    row.get(header_map.get('a'), '').strip(),
-                    row.get(header_map.get('b'), '').strip(),
-                    row.get(header_map.get('c'), '').strip(),
-                    row.get(header_map.get('d'), '').strip()
-                ]
-                correct_opt = row.get(header_map.get('correct'), '').upper().strip()
-                marks_str = row.get(header_map.get('marks'), '2').strip()
-                marks = float(marks_str) if marks_str else 2.0
-                
-                # Validation: Skip if critical data missing
-                if not q_text or not all(options) or not correct_opt:
-                    skipped += 1
-                    continue
-                    
-                correct_idx = -1
-                if correct_opt == 'A': correct_idx = 0
-                elif correct_opt == 'B': correct_idx = 1
-                elif correct_opt == 'C': correct_idx = 2
-                elif correct_opt == 'D': correct_idx = 3
-                
-                if correct_idx == -1: 
-                    skipped += 1
-                    continue
-
-                question = Question.objects.create(
-                    exam=exam,
-                    text_content=q_text,
-                    marks=marks
-                )
-                
-                for idx, opt_text in enumerate(options):
-                    Option.objects.create(
-                        question=question,
-                        text=opt_text,
-                        is_correct=(idx == correct_idx)
-                    )
-                count += 1
-                total_new_marks += marks
-
-            # 3. Update Exam Total Marks
-            # Add new marks to existing total
-            exam.total_marks += int(total_new_marks)
-            exam.save()
-            
-            return Response({
-                "status": "success", 
-                "added": count, 
-                "skipped": skipped,
-                "message": f"Added {count} questions. Skipped {skipped} rows (check formatting). Total Marks Updated."
-            })
-
+            resume_from_row = int(request.data.get('resume_from_row') or 0)
+        except ValueError:
+            return Response({"error": "resume_from_row must be a number"}, status=400)
+
+        importer = QuestionCSVImporter(
+            exam,
+            dry_run=is_truthy(request.data.get('dry_run')),
+            # Per-chunk commits + checkpoint for very large banks; one transaction by default
+            atomic=not is_truthy(request.data.get('chunked')),
+            resume_from_row=resume_from_row,
+        )
+        try:
+            return Response(importer.run(file_obj))
         except Exception as e:
-            return Response({"error": f"CSV Error: {str(e)}"}, status=500)
+            return Response({"error": f"CSV Error: {str(e)}", "checkpoint": importer.checkpoint}, status=500)
 
     @action(detail=False, methods=['post'])
     def save_bulk(self, request):
@@ -416,58 +592,11 @@ class AIGeneratorViewSet(viewsets.ViewSet):
         questions_data = request.data.get('questions', [])
         duration = request.data.get('duration')
         
-        exam = None
-
-        if exam_id:
-            exam = get_object_or_404(Exam, id=exam_id)
-        elif new_exam_title:
-            exam_defaults = {
-                'title': new_exam_title,
-                'duration_minutes': int(duration) if duration else 30,
-                'total_marks': len(questions_data) * 2, 
-                'exam_type': 'SUBJECT_TEST'
-            }
-
-            if source_type == 'course' and source_id:
-                exam_defaults['course_id'] = source_id
-                exam_defaults['exam_type'] = 'MOCK_FULL'
-            elif source_type == 'subject' and source_id:
-                exam_defaults['subject_id'] = source_id
-                exam_defaults['exam_type'] = 'SUBJECT_TEST'
-            elif source_type == 'chapter' and source_id:
-                try:
-                    # FIX: Link directly to Chapter
-                    chapter = Chapter.objects.get(id=source_id)
-                    exam_defaults['chapter'] = chapter
-                    exam_defaults['exam_type'] = 'TOPIC_QUIZ' # or rename to CHAPTER_QUIZ
-                except Exception as e:
-                    print(f"Error linking chapter: {e}")
-            
-            exam = Exam.objects.create(**exam_defaults)
-        
+        if exam_id: get_object_or_404(Exam, id=exam_id)
+        exam, count = save_generated_questions(questions_data, exam_id, new_exam_title, source_type, source_id, duration)
         if not exam:
             return Response({"error": "Please select an existing exam OR enter a name for a new one."}, status=400)
 
-        if duration:
-            exam.duration_minutes = int(duration)
-            exam.save()
-        
-        count = 0
-        for q_data in questions_data:
-            question = Question.objects.create(
-                exam=exam,
-                text_content=q_data['question_text'],
-                marks=q_data.get('marks', 2),
-                explanation=q_data.get('explanation', '')
-            )
-            for idx, opt_text in enumerate(q_data['options']):
-                Option.objects.create(
-                    question=question,
-                    text=opt_text,
-                    is_correct=(idx == q_data['correct_index'])
-                )
-            count += 1
-            
         return Response({
             "status": "success", 
             "added": count, 
@@ -493,64 +622,9 @@ class BulkNotesViewSet(viewsets.ViewSet):
             return Response({"error": f"File '{file_obj.name}' is not a CSV"}, status=400)
 
         try:
-            # 1. Detect Encoding
-            raw_data = file_obj.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
-            file_obj.seek(0)
-            
-            # 2. Stream & Decode
-            decoded_file = raw_data.decode(encoding, errors='replace').splitlines()
-            reader = csv.DictReader(decoded_file)
-            
-            # 3. Map Headers
-            header_map = {}
-            if reader.fieldnames:
-                for field in reader.fieldnames:
-                    clean = field.strip().lower()
-                    if 'course' in clean: header_map['course'] = field
-                    elif 'paper' in clean or 'section' in clean: header_map['section'] = field
-                    elif 'subject' in clean: header_map['subject'] = field
-                    elif 'chapter' in clean: header_map['chapter'] = field
-                    elif 'topic' in clean: header_map['topic'] = field
-                    elif 'note' in clean: header_map['notes'] = field 
-
-            updated_count = 0
-            created_count = 0
-            
-            for row in reader:
-                c_title = row.get(header_map.get('course'), '').strip()
-                sec_title = row.get(header_map.get('section'), 'Main').strip() 
-                s_title = row.get(header_map.get('subject'), '').strip()
-                ch_title = row.get(header_map.get('chapter'), '').strip()
-                notes = row.get(header_map.get('notes'), '').strip()
-
-                if not (c_title and s_title and ch_title): continue
-
-                course, _ = Course.objects.get_or_create(title=c_title)
-                
-                subject, _ = Subject.objects.get_or_create(
-                    title=s_title, 
-                    course=course,
-                    defaults={'section': sec_title} 
-                )
-                if subject.section != sec_title and sec_title:
-                    subject.section = sec_title
-                    subject.save()
-
-                chapter, created = Chapter.objects.get_or_create(title=ch_title, subject=subject)
-                
-                if notes:
-                    chapter.study_notes = notes
-                    chapter.save()
-                    if created: created_count += 1
-                    else: updated_count += 1
-
-            return Response({
-                "status": "success", 
-                "message": f"Processed successfully! Created {created_count}, Updated {updated_count} chapters."
-            })
-
+            return Response(NotesCSVImporter().run(file_obj))
+        except RowError as e:
+            return Response({"error": str(e)}, status=400)
         except Exception as e:
             print(f"CSV ERROR: {e}")
             return Response({"error": f"Server Error: {str(e)}"}, status=500)
@@ -561,4 +635,24 @@ class AdBannerViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action in ['list', 'retrieve']: permission_classes = [permissions.AllowAny]
         else: permission_classes = [permissions.IsAdminUser]
-        return [permission() for permission in permission_classes]
\ No newline at end of file
+        return [permission() for permission in permission_classes]
+
+# --- FULL-TEXT SEARCH (questions and chapter notes, ranked, entitlement-filtered) ---
+class SearchViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        query = request.query_params.get('q', '').strip()
+        kind = request.query_params.get('kind') or None
+        if kind not in (None, 'question', 'chapter'):
+            return Response({"error": "kind must be 'question' or 'chapter'"}, status=400)
+        try:
+            page = int(request.query_params.get('page', 1))
+            page_size = int(request.query_params.get('page_size', SEARCH_PAGE_SIZE))
+        except ValueError:
+            page, page_size = 1, SEARCH_PAGE_SIZE
+
+        results, has_next, truncated = search(request.user, query, kind, page, page_size)
+        return Response({"query": query, "page": page, "results": results, "next": page + 1 if has_next else None,
+                         "truncated": truncated})
+
@@ -2,6 +2,8 @@ import React, { useState, useEffect } from 'react';
 import api from '../api/axios';
 import { Loader2, Save, Trash2, Plus, Wand2, Clock, FileText, Image as ImageIcon, Layers, UploadCloud, Link as LinkIcon, FileSpreadsheet, Download, RefreshCw, HelpCircle } from 'lucide-react';
 
+const JOB_TIMEOUT_MS = 20 * 60 * 1000;
+
 const AdminGeneratorPage = () => {
     // ... (Keep existing state variables exactly as they were) ...
     const [courses, setCourses] = useState([]);
@@ -19,7 +21,7 @@ const AdminGeneratorPage = () => {
     const [difficulty, setDifficulty] = useState('Medium');
     const [customInstructions, setCustomInstructions] = useState('');
     
-    const [imageFile, setImageFile] = useState(null);
+    const [imageFiles, setImageFiles] = useState([]);
     const [csvFile, setCsvFile] = useState(null); 
     
     const [generatedQuestions, setGeneratedQuestions] = useState([]);
@@ -32,9 +34,9 @@ const AdminGeneratorPage = () => {
         const loadData = async () => {
             try {
                 const [cRes, tRes, eRes] = await Promise.all([
-                    api.get('courses/'),
+                    api.get('courses/', { params: { fields: 'id,title,subjects.id,subjects.title,subjects.chapters.id,subjects.chapters.title' } }),
                     api.get('topics/'),
-                    api.get('exams/')
+                    api.get('exams/', { params: { depth: 0 } })
                 ]);
                 setCourses(cRes.data);
                 const allSubjects = cRes.data.flatMap(c => c.subjects || []);
@@ -52,6 +54,24 @@ const AdminGeneratorPage = () => {
     }, [generatedQuestions]);
 
     // --- HANDLERS ---
+    // Generation runs as a background job: poll its status until the worker finishes.
+    // Polling backs off (1s, 2s, 4s ... 15s) and gives up after JOB_TIMEOUT_MS: a job whose
+    // worker died stays 'running' until the worker requeues it (15 min), so say so.
+    const waitForJob = async (jobId) => {
+        const deadline = Date.now() + JOB_TIMEOUT_MS;
+        let delay = 1000;
+        while (Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, delay));
+            delay = Math.min(delay * 2, 15000);
+            const { data: job } = await api.get(`ai-generator/jobs/${jobId}/`);
+            if (job.status === 'done') return job.result;
+            if (job.status === 'failed') throw new Error(job.error);
+        }
+        const stalled = new Error(`Job #${jobId} looks stalled: it has not finished after ${JOB_TIMEOUT_MS / 60000} minutes. It will be retried automatically; check back later.`);
+        stalled.stalled = true;
+        throw stalled;
+    };
+
     const handleTextGenerate = async () => {
         if (!selectedId) return alert("Please select a source");
         setLoading(true);
@@ -63,30 +83,35 @@ const AdminGeneratorPage = () => {
                 difficulty: difficulty,
                 custom_instructions: customInstructions
             });
+            const { questions } = await waitForJob(res.data.job_id);
             // Ensure explanation field exists
-            const formattedData = res.data.map(q => ({ ...q, image_url: '', explanation: q.explanation || '' }));
+            const formattedData = questions.map(q => ({ ...q, image_url: '', explanation: q.explanation || '' }));
             setGeneratedQuestions(prev => [...prev, ...formattedData]);
         } catch (err) {
-            alert("Generation failed.");
+            alert(err.stalled ? err.message : "Generation failed.");
         } finally {
             setLoading(false);
         }
     };
 
     const handleImageGenerate = async () => {
-        if (!imageFile) return alert("Please upload an image first");
+        if (imageFiles.length === 0) return alert("Please upload an image first");
         setLoading(true);
         const formData = new FormData();
-        formData.append('image', imageFile);
+        // One image -> generate_image; several -> the batch endpoint (one job for all pages)
+        imageFiles.forEach(file => formData.append(imageFiles.length > 1 ? 'images' : 'image', file));
         formData.append('difficulty', difficulty);
         formData.append('custom_instructions', customInstructions);
 
         try {
-            const res = await api.post('ai-generator/generate_image/', formData);
-            const formattedData = res.data.map(q => ({ ...q, image_url: '', explanation: q.explanation || '' }));
+            const endpoint = imageFiles.length > 1 ? 'ai-generator/generate_images/' : 'ai-generator/generate_image/';
+            const res = await api.post(endpoint, formData);
+            const { questions, errors = [] } = await waitForJob(res.data.job_id);
+            const formattedData = questions.map(q => ({ ...q, image_url: '', explanation: q.explanation || '' }));
             setGeneratedQuestions(prev => [...prev, ...formattedData]);
+            if (errors.length > 0) alert(`Skipped ${errors.length} image(s):\n` + errors.map(e => `${e.image}: ${e.error}`).join('\n'));
         } catch (err) {
-            alert("Image analysis failed.");
+            alert(err.stalled ? err.message : "Image analysis failed.");
         } finally {
             setLoading(false);
         }
@@ -120,7 +145,7 @@ const AdminGeneratorPage = () => {
             alert(`Success! Added ${res.data.added} questions.`);
             setCsvFile(null);
              if (newExamTitle) {
-                const eRes = await api.get('exams/');
+                const eRes = await api.get('exams/', { params: { depth: 0 } });
                 setExams(eRes.data);
                 setNewExamTitle('');
             }
@@ -204,7 +229,7 @@ const AdminGeneratorPage = () => {
             alert(res.data.message);
             setGeneratedQuestions([]);
             setNewExamTitle('');
-            api.get('exams/').then(r => setExams(r.data));
+            api.get('exams/', { params: { depth: 0 } }).then(r => setExams(r.data));
         } catch (err) { 
             alert("Failed to save."); 
         } finally {
@@ -262,8 +287,8 @@ const AdminGeneratorPage = () => {
                              <div>
                                 <label className="block text-xs font-bold text-gray-500 uppercase mb-2">1. Upload Image</label>
                                 <div className="border-2 border-dashed border-slate-300 rounded-xl p-8 text-center bg-slate-50 hover:border-blue-400 transition-colors">
-                                    <input type="file" accept="image/*" onChange={e => setImageFile(e.target.files[0])} className="hidden" id="imgUpload" />
-                                    <label htmlFor="imgUpload" className="cursor-pointer"><UploadCloud className="mx-auto text-slate-400 mb-2" size={32} /><p className="text-sm text-slate-600 font-medium">{imageFile ? imageFile.name : "Click to upload diagram"}</p></label>
+                                    <input type="file" accept="image/*" multiple onChange={e => setImageFiles(Array.from(e.target.files))} className="hidden" id="imgUpload" />
+                                    <label htmlFor="imgUpload" className="cursor-pointer"><UploadCloud className="mx-auto text-slate-400 mb-2" size={32} /><p className="text-sm text-slate-600 font-medium">{imageFiles.length === 0 ? "Click to upload diagrams / pages" : imageFiles.length === 1 ? imageFiles[0].name : `${imageFiles.length} images selected`}</p></label>
                                 </div>
                             </div>
                         )}
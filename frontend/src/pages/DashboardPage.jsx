@@ -13,6 +13,7 @@ const DashboardPage = () => {
     const [enrolledCourses, setEnrolledCourses] = useState([]);
     const [activeCourse, setActiveCourse] = useState(null);
     const [attempts, setAttempts] = useState([]);
+    const [historySummary, setHistorySummary] = useState({ attempts: 0, completed: 0, total_score: 0 });
     
     // Gamification
     const [xp, setXP] = useState(0);
@@ -47,10 +48,13 @@ const DashboardPage = () => {
         setLoading(true);
         try {
             // Use Promise.all to fetch concurrently
-            const [userRes, courseRes, histRes] = await Promise.all([
+            const [userRes, courseRes, histRes, summaryRes] = await Promise.all([
                 api.get('auth/users/me/'),
-                api.get('courses/enrolled/'),
-                api.get('history/')
+                // Outline only: titles + subject ids, no notes
+                api.get('courses/enrolled/', { params: { fields: 'id,title,subjects.id' } }),
+                // First cursor page for recent activity; lifetime totals come from the summary
+                api.get('history/'),
+                api.get('history/summary/')
             ]);
 
             setUser({ 
@@ -66,7 +70,8 @@ const DashboardPage = () => {
                 console.warn("No enrolled courses found for user.");
             }
 
-            setAttempts(histRes.data);
+            setAttempts(histRes.data.results);
+            setHistorySummary(summaryRes.data);
 
         } catch (err) {
             console.error("Dashboard Load Error:", err);
@@ -82,8 +87,7 @@ const DashboardPage = () => {
     // --- EFFECT: Calculate Stats ---
     useEffect(() => {
         if (!attempts) return;
-        const totalScore = attempts.reduce((acc, curr) => acc + (curr.total_score || 0), 0);
-        setXP(Math.round(totalScore * 10));
+        setXP(Math.round(historySummary.total_score * 10));
 
         if(activeCourse) {
             let totalItems = 10; 
@@ -91,7 +95,7 @@ const DashboardPage = () => {
             const completedCount = attempts.filter(a => a.exam_title && activeCourse.title.includes(a.exam_title)).length; 
             setProgress(Math.min(Math.round((completedCount / totalItems) * 100) + 5, 100));
         }
-    }, [activeCourse, attempts]);
+    }, [activeCourse, attempts, historySummary]);
 
     const handleLogout = async () => {
         try {
@@ -307,7 +311,7 @@ const DashboardPage = () => {
                             </div>
 
                             <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
-                                <StatBox label="Mock Tests Taken" value={attempts.length} icon={<CheckCircle/>} color="emerald" />
+                                <StatBox label="Mock Tests Taken" value={historySummary.attempts} icon={<CheckCircle/>} color="emerald" />
                                 <StatBox label="Avg. Score" value={activeCourse ? "72%" : "-"} icon={<TrendingUp/>} color="purple" />
                                 <StatBox label="Hours Spent" value="12.5" icon={<Clock/>} color="orange" />
                             </div>
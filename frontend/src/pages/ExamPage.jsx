@@ -20,6 +20,8 @@ const ExamPage = () => {
     
     const [currentQIndex, setCurrentQIndex] = useState(0);
     const answersRef = useRef({}); 
+    const pendingRef = useRef({}); // Answers changed since the last successful autosave
+    const inFlightRef = useRef({}); // Batch currently being autosaved
     const [answers, setAnswers] = useState({}); 
     const [markedForReview, setMarkedForReview] = useState({});
     
@@ -82,11 +84,16 @@ const ExamPage = () => {
         try {
             const payload = {
                 attempt_id: attemptId,
-                answers: answersRef.current
+                // Earlier picks are already stored by autosave; only send the last delta
+                answers: { ...inFlightRef.current, ...pendingRef.current }
             };
             
             const res = await api.post(`exams/${examId}/submit_exam/`, payload);
             setResult(res.data);
+            // Rank is a bonus: the result screen works without it
+            api.get(`exams/${examId}/leaderboard/`, { params: { attempt_id: attemptId, top: 0 } })
+                .then(lb => setResult(prev => ({ ...prev, standing: lb.data.me, total_attempts: lb.data.total_attempts })))
+                .catch(() => {});
         } catch (err) {
             alert("Submission failed. Check connection.");
         } finally {
@@ -184,12 +191,36 @@ const ExamPage = () => {
         return () => clearInterval(timerId);
     }, [timeLeft, result, loading]);
 
+    // --- 4b. AUTOSAVE (Small deltas, spreads writes across the exam window) ---
+    useEffect(() => {
+        if (!attemptId || result || loading) return;
+
+        const flush = async () => {
+            const batch = pendingRef.current;
+            if (!Object.keys(batch).length || Object.keys(inFlightRef.current).length) return;
+            pendingRef.current = {};
+            inFlightRef.current = batch;
+            try {
+                await api.post(`exams/${examId}/save_answers/`, { attempt_id: attemptId, answers: batch });
+            } catch (err) {
+                // Retry on the next tick; newer picks win over the failed batch
+                pendingRef.current = { ...batch, ...pendingRef.current };
+            } finally {
+                inFlightRef.current = {};
+            }
+        };
+
+        const saverId = setInterval(flush, 15000);
+        return () => clearInterval(saverId);
+    }, [attemptId, result, loading, examId]);
+
     // --- 5. HELPERS ---
     const handleAnswerSelect = (qId, optId) => {
         if (practiceFeedback[qId]) return;
         const newAnswers = { ...answers, [qId]: optId };
         setAnswers(newAnswers);
         answersRef.current = newAnswers;
+        pendingRef.current = { ...pendingRef.current, [qId]: optId };
     };
 
     const handleCheckAnswer = async (qId) => {
@@ -259,6 +290,11 @@ const ExamPage = () => {
                             <div className="text-xs font-bold text-purple-400 uppercase tracking-wider">Accuracy</div>
                         </div>
                     </div>
+                    {result.standing && (
+                        <p className="text-sm text-slate-600 mb-8">
+                            Rank <span className="font-bold text-slate-900">#{result.standing.rank}</span> of {result.total_attempts} · better than or equal to <span className="font-bold text-slate-900">{result.standing.percentile}%</span> of attempts
+                        </p>
+                    )}
                     <button onClick={() => navigate('/dashboard')} className="w-full bg-slate-900 text-white py-4 rounded-xl font-bold hover:bg-slate-800 transition-all">Back to Dashboard</button>
                 </div>
             </div>
@@ -126,7 +126,7 @@ const LoginPage = () => {
                 }
                 setOtpStep(2);
             } catch (err) {
-                setError("Failed to send Mock OTP. Is Backend running?");
+                setError(err.response?.data?.error || "Failed to send Mock OTP. Is Backend running?");
             }
         } else {
             // --- REAL FIREBASE FLOW ---
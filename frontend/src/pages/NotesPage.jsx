@@ -1,26 +1,50 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import api from '../api/axios';
 import Markdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 import remarkMath from 'remark-math';
 import rehypeKatex from 'rehype-katex';
+import katex from 'katex';
 import 'katex/dist/katex.min.css';
 import { ArrowLeft, Lock, Loader2, FileText, AlertTriangle } from 'lucide-react';
 
+// Chapter notes arrive pre-rendered and sanitized by the server (chapters/{id}/notes/),
+// a few heading sections per page; TeX is left in <span class="math"> for KaTeX.
+const NotesSection = ({ html }) => {
+    const ref = useRef(null);
+
+    useEffect(() => {
+        ref.current.querySelectorAll('.math').forEach((el) => {
+            katex.render(el.textContent, el, { displayMode: el.classList.contains('math-display'), throwOnError: false });
+        });
+    }, [html]);
+
+    return <section ref={ref} dangerouslySetInnerHTML={{ __html: html }} />;
+};
+
 const NotesPage = () => {
     const { topicId, chapterId } = useParams(); // Get both potential IDs
     const navigate = useNavigate();
     const [data, setData] = useState(null); // Changed 'topic' to generic 'data'
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
+    const [sections, setSections] = useState([]);
+    const [nextSection, setNextSection] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const sentinel = useRef(null);
 
     useEffect(() => {
         const fetchNotes = async () => {
             try {
-                // Determine Endpoint based on URL
-                const endpoint = chapterId ? `chapters/${chapterId}/` : `topics/${topicId}/`;
-                const res = await api.get(endpoint);
+                if (chapterId) {
+                    const res = await api.get(`chapters/${chapterId}/notes/`);
+                    setData(res.data);
+                    setSections(res.data.sections);
+                    setNextSection(res.data.next);
+                    return;
+                }
+                const res = await api.get(`topics/${topicId}/`);
                 setData(res.data);
             } catch (err) {
                 console.error("Notes Error:", err);
@@ -38,6 +62,30 @@ const NotesPage = () => {
         fetchNotes();
     }, [topicId, chapterId]);
 
+    const loadMore = useCallback(async () => {
+        if (nextSection === null || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const res = await api.get(`chapters/${chapterId}/notes/`, { params: { section: nextSection } });
+            setSections((prev) => [...prev, ...res.data.sections]);
+            setNextSection(res.data.next);
+        } catch (err) {
+            console.error("Notes Error:", err);
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [chapterId, nextSection, loadingMore]);
+
+    // Fetch the next sections as the reader nears the end of what is loaded
+    useEffect(() => {
+        if (!sentinel.current || nextSection === null) return;
+        const observer = new IntersectionObserver((entries) => {
+            if (entries[0].isIntersecting) loadMore();
+        }, { rootMargin: '600px' });
+        observer.observe(sentinel.current);
+        return () => observer.disconnect();
+    }, [loadMore, nextSection, data]);
+
     // Security Features (Prevent Copy/Print)
     useEffect(() => {
         const handleContextMenu = (e) => { e.preventDefault(); return false; };
@@ -69,7 +117,8 @@ const NotesPage = () => {
         </div>
     );
 
-    if (!data || !data.study_notes) return (
+    const isEmpty = chapterId ? !data || data.total_sections === 0 : !data || !data.study_notes;
+    if (isEmpty) return (
         <div className="min-h-screen flex flex-col items-center justify-center text-gray-500">
             <FileText size={48} className="mb-4 text-gray-300"/>
             <p>No notes available for this section yet.</p>
@@ -97,10 +146,19 @@ const NotesPage = () => {
                     </h1>
                     
                     <div className="prose prose-blue prose-lg max-w-none text-slate-700">
-                        <Markdown remarkPlugins={[remarkGfm, remarkMath]} rehypePlugins={[rehypeKatex]}>
-                            {data.study_notes}
-                        </Markdown>
+                        {chapterId ? (
+                            sections.map((section) => <NotesSection key={section.index} html={section.html} />)
+                        ) : (
+                            <Markdown remarkPlugins={[remarkGfm, remarkMath]} rehypePlugins={[rehypeKatex]}>
+                                {data.study_notes}
+                            </Markdown>
+                        )}
                     </div>
+                    {chapterId && nextSection !== null && (
+                        <div ref={sentinel} className="flex items-center justify-center gap-2 text-slate-400 text-sm py-6">
+                            {loadingMore && <><Loader2 size={16} className="animate-spin"/> Loading more...</>}
+                        </div>
+                    )}
                 </div>
                 
                 <p className="text-center text-slate-400 text-xs mt-8 mb-4">